@@ -1,24 +1,61 @@
 import os
+import sys
+import json
 import time
+import uuid
+import inspect
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-from langchain_google_genai import ChatGoogleGenerativeAI
-from agent_tool import run_agent_with_refine_prompt
+from agent_tool import faq_stats, run_agent_with_refine_prompt
+from llm_cache import LLM_CACHE_MODE, LLM_CACHE_MODES, LLM_CACHE_PATH, build_chat_model, get_llm_store
+from eval_cache import EVAL_CACHE_PATH, EvalCache, case_key, combine_fingerprints, grade_key
+from rate_limiter import RateLimitedChatModel, TokenBucket
+from ticket_store import current_session
+from tracing import llm_tracer, new_trace, span, stage_summary
 from dotenv import load_dotenv
 load_dotenv()
 # Configuration
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+DEFAULT_WORKERS = 4
+DEFAULT_REQUESTS_PER_MINUTE = 15
+AGENT_MODEL = "gemini-2.0-flash"
+GRADER_MODEL = "gemini-2.0-flash"
+
+# What each category's answers depend on; incremental runs only re-run categories whose inputs changed.
+# Unknown categories depend on everything.
+CATEGORY_DEPENDENCIES = {
+    "RAG_Policy": ("agent", "index"),
+    "Hybrid_Context": ("agent", "index"),
+    "Tool_Database": ("agent",),
+    "Tool_Action": ("agent",),
+}
+
+GRADER_PROMPT = """
+    You are a technical grader.
+    
+    QUESTION: {question}
+    CORRECT ANSWER: {correct_answer}
+    STUDENT ANSWER: {predicted_answer}
+    
+    Grade the Student Answer from 1 to 5 based on accuracy.
+    1 = Incorrect. 5 = Correct.
+    Return only the integer number.
+    """
 
 # Test Data Definitions
 test_dataset = [
     {
         "category": "RAG_Policy",
         "question": "What are the core hours for Ciklum employees?",
-        "ground_truth": "Teams typically overlap for 4 Core Hours daily, usually 11:00 AM – 3:00 PM local time."
+        "ground_truth": "Teams typically overlap for 4 Core Hours daily, usually 11:00 AM – 3:00 PM local time.",
+        "expected_snippets": ["overlap 11:00 AM"]
     },
     {
         "category": "RAG_Policy",
         "question": "Can I work from Bali?",
-        "ground_truth": "Yes, under the Nomad Policy, employees can work from a different country for up to 30 days per year."
+        "ground_truth": "Yes, under the Nomad Policy, employees can work from a different country for up to 30 days per year.",
+        "expected_snippets": ["different country allowed for up to 30 days"]
     },
     {
         "category": "Tool_Database",
@@ -33,7 +70,8 @@ test_dataset = [
     {
         "category": "Hybrid_Context",
         "question": "What is the policy for FCPA?",
-        "ground_truth": "Ciklum strictly adheres to the UK Bribery Act and FCPA. No employee may offer or accept gifts to influence decisions."
+        "ground_truth": "Ciklum strictly adheres to the UK Bribery Act and FCPA. No employee may offer or accept gifts to influence decisions.",
+        "expected_snippets": ["UK Bribery Act and FCPA"]
     },
     {
         "category": "Tool_Action",
@@ -42,25 +80,42 @@ test_dataset = [
     }
 ]
 
+def load_dataset(path):
+    """
+    Loads test cases from a .json (list), .jsonl or .csv file.
+    Each case needs 'category', 'question' and 'ground_truth'. Policy cases may add
+    'expected_snippets' and/or 'expected_chunks' (chunk ids) for --retrieval-only runs.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            cases = [json.loads(line) for line in f if line.strip()]
+    elif extension == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            cases = json.load(f)
+    elif extension == ".csv":
+        cases = pd.read_csv(path).to_dict(orient="records")
+    else:
+        raise ValueError(f"Unsupported dataset format: {path}")
+
+    for i, case in enumerate(cases):
+        missing = {"category", "question", "ground_truth"} - set(case)
+        if missing:
+            raise ValueError(f"Test case {i} is missing fields: {sorted(missing)}")
+    return cases
+
+
 def evaluate_answer(grader_llm, question, predicted_answer, correct_answer):
     """
     Grades the provided answer against the ground truth using an LLM.
     Returns an integer score from 1 (Incorrect) to 5 (Correct).
     """
-    prompt = f"""
-    You are a technical grader.
-    
-    QUESTION: {question}
-    CORRECT ANSWER: {correct_answer}
-    STUDENT ANSWER: {predicted_answer}
-    
-    Grade the Student Answer from 1 to 5 based on accuracy.
-    1 = Incorrect. 5 = Correct.
-    Return only the integer number.
-    """
+    prompt = GRADER_PROMPT.format(
+        question=question, correct_answer=correct_answer, predicted_answer=predicted_answer
+    )
     
     try:
-        response = grader_llm.invoke(prompt)
+        response = grader_llm.invoke(prompt, {"callbacks": [llm_tracer]})
         score = response.content.strip()
         if score.isdigit():
             return int(score)
@@ -69,66 +124,286 @@ def evaluate_answer(grader_llm, question, predicted_answer, correct_answer):
         print(f"Grading error: {e}")
         return 0
 
-if __name__ == "__main__":
-    print("Starting evaluation pipeline...")
-    
-    
-    agent_executor = run_agent_with_refine_prompt()
-    
-    
-    grader = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash", 
-        google_api_key=GOOGLE_API_KEY, 
-        temperature=0
-    )
-    
-    results = []
-    print(f"Running {len(test_dataset)} test cases...\n")
-
-    for i, test in enumerate(test_dataset):
-        print(f"Test {i+1}: {test['category']}")
-        print(f"Question: {test['question']}")
-        
-        agent_output = ""
+def run_agent_case(agent_executor, test):
+    """
+    Runs one test question through the agent. Returns (answer, latency_seconds).
+    """
+    start = time.perf_counter()
+    # Each case is its own conversation, so ticket idempotency never matches a ticket created by
+    # another case or an earlier run and the answer does not depend on what ran before.
+    session = current_session.set(f"grade-{uuid.uuid4().hex}")
+    with new_trace(), span("agent.invoke", category=test['category']):
         try:
-            
-            response = agent_executor.invoke({
-                "input": test['question'], 
-                "chat_history": [] 
-            })
+            # Pacing and rate-limit retries happen per model request (RateLimitedChatModel), so a
+            # 429 never re-runs the tools of this case.
+            response = agent_executor.invoke(
+                {"input": test['question'], "chat_history": []}, {"callbacks": [llm_tracer]}
+            )
             agent_output = response['output']
-            print(f"Answer: {agent_output}")
         except Exception as e:
             agent_output = f"Error: {str(e)}"
-            print(agent_output)
+        finally:
+            current_session.reset(session)
+    return agent_output, time.perf_counter() - start
+
+
+def grade_case(grader, test, agent_output, cache=None, grader_fingerprint=""):
+    """
+    Grades one agent answer, reusing a cached score for the same (question, answer, ground truth).
+    Returns (score, latency_seconds).
+    """
+    start = time.perf_counter()
+    key = grade_key(test['question'], agent_output, test['ground_truth'], grader_fingerprint)
+    score = cache.get_grade(key) if cache is not None else None
+    if score is None:
+        with new_trace(), span("eval.grade", category=test['category']):
+            score = evaluate_answer(grader, test['question'], agent_output, test['ground_truth'])
+        # 0 means the grading call failed; retry it next run.
+        if cache is not None and score > 0:
+            cache.put_grade(key, score)
+    return score, time.perf_counter() - start
+
+
+def component_fingerprints(agent_model):
+    """
+    Fingerprints of the inputs an answer depends on: 'agent' (system prompt, tool definitions and
+    code, model) and 'index' (knowledge-base files, chunking settings and the FAQ index entries).
+    """
+    from agent_tool import CHROMA_PATH, DATA_PATH, REFINED_SYSTEM_PROMPT, my_tools
+    from faq_index import FAQ_INDEX_DIR_NAME, faq_index_fingerprint
+    from document_loader import DIRECTORY_PATH, kb_fingerprint
+    from ingest_manifest import CHROMA_PATH as DEFAULT_CHROMA_PATH
+
+    tool_parts = []
+    for t in my_tools:
+        try:
+            source = inspect.getsource(t.func)
+        except (OSError, TypeError):
+            source = ""
+        tool_parts.append(f"{t.name}\0{t.description}\0{source}")
+    return {
+        "agent": combine_fingerprints(REFINED_SYSTEM_PROMPT, agent_model, *tool_parts),
+        "index": combine_fingerprints(
+            kb_fingerprint(DATA_PATH or DIRECTORY_PATH),
+            faq_index_fingerprint(os.path.join(CHROMA_PATH or DEFAULT_CHROMA_PATH, FAQ_INDEX_DIR_NAME)),
+        ),
+    }
+
+
+def category_fingerprint(category, components, grader_fingerprint):
+    dependencies = CATEGORY_DEPENDENCIES.get(category, tuple(sorted(components)))
+    return combine_fingerprints(grader_fingerprint, *(f"{d}={components[d]}" for d in dependencies))
 
-        
-        score = evaluate_answer(grader, test['question'], agent_output, test['ground_truth'])
-        print(f"Score: {score}/5\n")
-        
+
+def _as_list(value):
+    # CSV datasets carry lists as '|'-separated strings.
+    if isinstance(value, str):
+        return [v.strip() for v in value.split("|") if v.strip()]
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return []
+
+
+def run_retrieval_checks(dataset):
+    """
+    Checks, without any LLM call, whether the policy retriever behind lookup_policy returns the
+    expected chunks (by chunk id) or snippets (case-insensitive) for every case that lists them.
+    """
+    from agent_tool import get_global_retriever
+    from chunking import build_context
+    from tokens import count_tokens
+
+    retriever = get_global_retriever()
+    results = []
+    for test in dataset:
+        expected_chunks = _as_list(test.get("expected_chunks"))
+        snippets = _as_list(test.get("expected_snippets"))
+        if not expected_chunks and not snippets:
+            continue
+        start = time.perf_counter()
+        with new_trace(), span("eval.retrieval", category=test['category']):
+            docs = retriever.invoke(test['question'])
+        latency = time.perf_counter() - start
+
+        chunk_ids = [d.metadata.get("chunk_id", "") for d in docs]
+        texts = [" ".join(d.page_content.lower().split()) for d in docs]
+        missing = [c for c in expected_chunks if c not in chunk_ids]
+        missing += [s for s in snippets if not any(" ".join(s.lower().split()) in t for t in texts)]
+        # What lookup_policy actually hands to the LLM after merging and the token budget.
+        context = build_context(docs)
+        normalized_context = " ".join(context.lower().split())
+        context_hit = all(" ".join(s.lower().split()) in normalized_context for s in snippets)
+        print(f"{test['category']} | {'HIT ' if not missing else 'MISS'} | {test['question']}")
         results.append({
             "Category": test['category'],
             "Question": test['question'],
-            "Agent_Answer": agent_output,
-            "Ground_Truth": test['ground_truth'],
-            "Score": score
+            "Retrieval_Hit": not missing,
+            "Missing": " | ".join(missing),
+            "Retrieved_Chunks": ", ".join(chunk_ids),
+            "Context_Hit": context_hit,
+            "Raw_Context_Tokens": count_tokens("\n\n".join(d.page_content for d in docs)),
+            "Context_Tokens": count_tokens(context),
+            "Retrieval_Latency_s": round(latency, 4),
         })
-        
-        time.sleep(10)
+    return results
+
+
+def run_evaluation(agent_executor, grader, dataset, workers=DEFAULT_WORKERS, cache=None, grader_fingerprint=""):
+    """
+    Evaluates the dataset concurrently. Agent calls and grading calls run in separate pools,
+    so a case is graded as soon as its answer arrives while other agent calls are in flight.
+    Returns one result row per case, in dataset order.
+    """
+    results = [None] * len(dataset)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent") as agent_pool, \
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="grader") as grade_pool:
+        agent_futures = {
+            agent_pool.submit(run_agent_case, agent_executor, test): i
+            for i, test in enumerate(dataset)
+        }
+        grade_futures = {}
+
+        for future in as_completed(agent_futures):
+            i = agent_futures[future]
+            agent_output, agent_latency = future.result()
+            grade_future = grade_pool.submit(
+                grade_case, grader, dataset[i], agent_output, cache, grader_fingerprint
+            )
+            grade_futures[grade_future] = (i, agent_output, agent_latency)
+
+        for future in as_completed(grade_futures):
+            i, agent_output, agent_latency = grade_futures[future]
+            score, grade_latency = future.result()
+            test = dataset[i]
+            print(f"Test {i+1}: {test['category']} | Score: {score}/5 | Agent: {agent_latency:.2f}s")
+            results[i] = {
+                "Category": test['category'],
+                "Question": test['question'],
+                "Agent_Answer": agent_output,
+                "Ground_Truth": test['ground_truth'],
+                "Score": score,
+                "Agent_Latency_s": round(agent_latency, 3),
+                "Grade_Latency_s": round(grade_latency, 3),
+            }
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the HR agent against a labeled dataset.")
+    parser.add_argument("--dataset", help="Path to a .json, .jsonl or .csv dataset (defaults to the built-in cases).")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Concurrent agent and grader calls.")
+    parser.add_argument("--rpm", type=float, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help="LLM requests per minute across all workers (0 disables the limiter).")
+    parser.add_argument("--output", default="evaluation_results.csv")
+    parser.add_argument("--offline", action="store_true", help="Use a fake LLM for both agent and grader (no network).")
+    parser.add_argument("--retrieval-only", action="store_true",
+                        help="Only check that the policy retriever returns the expected chunks (no LLM calls).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-run only categories whose prompt, tools or index changed since the last run.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the evaluation cache.")
+    parser.add_argument("--cache-path", default=EVAL_CACHE_PATH)
+    parser.add_argument("--llm-cache", choices=LLM_CACHE_MODES, default=LLM_CACHE_MODE,
+                        help="record stores every agent and grader LLM response; replay serves them with no network.")
+    parser.add_argument("--llm-cache-path", default=None, help="LLM record/replay store (default: LLM_CACHE_PATH).")
+    args = parser.parse_args()
+
+    print("Starting evaluation pipeline...")
+    dataset = load_dataset(args.dataset) if args.dataset else test_dataset
+
+    if args.retrieval_only:
+        results = run_retrieval_checks(dataset)
+        if not results:
+            print("No cases define expected_snippets or expected_chunks.")
+            sys.exit(1)
+        df = pd.DataFrame(results)
+        hit_rate = df['Retrieval_Hit'].mean()
+        print("-" * 30)
+        print(f"Retrieval hit rate: {hit_rate:.2%} over {len(df)} cases")
+        print(f"Context hit rate: {df['Context_Hit'].mean():.2%}")
+        print(
+            f"Context tokens per answer: {df['Context_Tokens'].mean():.0f} "
+            f"(raw top-k: {df['Raw_Context_Tokens'].mean():.0f})"
+        )
+        print(f"Status: {'PASSED' if hit_rate == 1.0 else 'FAILED'}")
+        df.to_csv(args.output, index=False)
+        print(f"Detailed results saved to {args.output}")
+        sys.exit(0)
+
+    cache = None if args.no_cache else EvalCache(args.cache_path)
+
+    if args.offline:
+        from fake_llm import FakeChatModel
+
+        agent_model, grader_model = "fake-chat", "fake-chat"
+        agent_executor = run_agent_with_refine_prompt(llm=FakeChatModel())
+        grader = FakeChatModel(responses=["5"])
+    else:
+        agent_model, grader_model = AGENT_MODEL, GRADER_MODEL
+        agent_llm = build_chat_model(AGENT_MODEL, mode=args.llm_cache, path=args.llm_cache_path)
+        grader = build_chat_model(GRADER_MODEL, mode=args.llm_cache, path=args.llm_cache_path)
+        # Replayed calls never reach the API, so there is no quota to pace.
+        if args.rpm > 0 and args.llm_cache != "replay":
+            # One bucket shared by every agent and grader model request.
+            limiter = TokenBucket.per_minute(args.rpm)
+            agent_llm = RateLimitedChatModel(llm=agent_llm, limiter=limiter)
+            grader = RateLimitedChatModel(llm=grader, limiter=limiter)
+        agent_executor = run_agent_with_refine_prompt(llm=agent_llm)
+
+    grader_fingerprint = combine_fingerprints(GRADER_PROMPT, grader_model)
+    components = component_fingerprints(agent_model)
+    fingerprints = [category_fingerprint(test['category'], components, grader_fingerprint) for test in dataset]
+
+    results = [None] * len(dataset)
+    if args.incremental and cache is not None:
+        for i, test in enumerate(dataset):
+            row = cache.get_result(case_key(test), fingerprints[i])
+            if row is not None:
+                results[i] = {**row, "Reused": True}
+    pending = [i for i, row in enumerate(results) if row is None]
+    reused_categories = sorted({dataset[i]['category'] for i, row in enumerate(results) if row is not None})
+    if reused_categories:
+        print(f"Reusing unchanged results for: {', '.join(reused_categories)}")
+    print(f"Running {len(pending)} of {len(dataset)} test cases with {args.workers} workers...\n")
+
+    wall_start = time.perf_counter()
+    fresh = run_evaluation(
+        agent_executor, grader, [dataset[i] for i in pending], workers=args.workers,
+        cache=cache, grader_fingerprint=grader_fingerprint,
+    )
+    wall_clock = time.perf_counter() - wall_start
+    for i, row in zip(pending, fresh):
+        results[i] = {**row, "Reused": False}
+        # Failed agent or grading calls are not stored, so the next incremental run retries them.
+        if cache is not None and row['Score'] > 0 and not str(row['Agent_Answer']).startswith("Error:"):
+            cache.put_result(case_key(dataset[i]), fingerprints[i], row)
+    if cache is not None:
+        print(f"Evaluation cache: {cache.stats}")
+    if args.llm_cache != "passthrough" and not args.offline:
+        print(f"LLM {args.llm_cache} store: {get_llm_store(args.llm_cache_path or LLM_CACHE_PATH).stats}")
+    if faq_stats() is not None:
+        print(f"FAQ index: {faq_stats()}")
 
-    
     df = pd.DataFrame(results)
     
     print("Final Evaluation Report")
     print("-" * 30)
-    print(df[['Category', 'Question', 'Score']])
+    print(df[['Category', 'Question', 'Score', 'Agent_Latency_s', 'Grade_Latency_s', 'Reused']])
     print("-" * 30)
     
     avg_score = df['Score'].mean()
     print(f"Average Accuracy: {avg_score:.2f} / 5.0")
+    print(f"Total wall-clock time: {wall_clock:.2f}s")
     
     status = "PASSED" if avg_score > 3.0 else "FAILED"
     print(f"Status: {status}")
 
-    df.to_csv("evaluation_results.csv", index=False)
-    print("Detailed results saved to evaluation_results.csv")
\ No newline at end of file
+    df.to_csv(args.output, index=False)
+    print(f"Detailed results saved to {args.output}")
+
+    latency_path = f"{os.path.splitext(args.output)[0]}_latency.csv"
+    latency_df = pd.DataFrame.from_dict(stage_summary(), orient="index")
+    latency_df.index.name = "Stage"
+    latency_df.to_csv(latency_path)
+    print(f"Per-stage latency summary (p50/p95/p99) saved to {latency_path}")
@@ -1,120 +1,326 @@
 import os
 import shutil
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
+import argparse
 from langchain_chroma import Chroma
+from langchain_core.documents import Document
 from logger import setup_logger
+from ingest_manifest import CHROMA_PATH, empty_manifest, file_sha256, indexed_fingerprint, load_manifest, save_manifest
+from chunking import CHUNKING_SIGNATURE, chunk_documents
+from document_loader import DIRECTORY_PATH, discover_files, iter_documents, kb_fingerprint
+from embeddings import (
+    EMBEDDING_BACKEND,
+    EMBEDDING_BACKENDS,
+    EMBEDDING_MODEL_NAME,
+    CachedEmbeddings,
+    EmbeddingCache,
+    embedding_model_id,
+    load_embedding_model,
+)
+from flat_vector_store import (
+    VECTOR_INDEX_DIR_NAME,
+    VECTOR_INDEX_DTYPE,
+    VECTOR_INDEX_DTYPES,
+    export_from_chroma,
+    save_flat_vector_index,
+)
+from faq_index import FAQ_GENERATORS, FAQ_INDEX_DIR_NAME, build_faq_index, load_faq_index, save_faq_index
+from keyword_index import INDEX_DIR_NAME, build_keyword_index, save_keyword_index
 
 logger = setup_logger(__name__)
 
-DIRECTORY_PATH = "./Knowledge-base" 
-CHROMA_PATH = "./chroma_db"
+UPSERT_BATCH_SIZE = 256
 
 
-def load_document():
+def build_ingest_embeddings(batch_size=64, num_threads=None, processes=1, use_cache=True, backend=None):
     """
-    Loads text documents from the defined directory.
+    Builds the ingest-time embedding stage: batched model plus the persistent vector cache.
     """
-    try:
-        logger.info(f"Starting document loading from: {DIRECTORY_PATH}")
-        
-        if not os.path.exists(DIRECTORY_PATH):
-            logger.error(f"Directory path does not exist: {DIRECTORY_PATH}")
-            return None
-
-        loader = DirectoryLoader(DIRECTORY_PATH, glob="**/*.md", loader_cls=TextLoader)
-        documents = loader.load()
-
-        if not documents:
-            logger.warning("No documents were found in the specified directory.")
-            return None
-            
-        logger.info(f"Successfully loaded {len(documents)} documents.")
-        return documents
+    backend = backend or EMBEDDING_BACKEND
+    logger.info(
+        f"Initializing {backend} embeddings model (batch_size={batch_size}, "
+        f"threads={num_threads or 'default'}, processes={processes}, cache={use_cache})."
+    )
+    base = load_embedding_model(
+        batch_size=batch_size, num_threads=num_threads, multi_process=processes > 1, backend=backend
+    )
+    cache = EmbeddingCache() if use_cache else None
+    return CachedEmbeddings(base, model_name=embedding_model_id(backend), cache=cache, backend=backend)
+
 
+def create_keyword_index(chunks):
+    """
+    Builds the BM25 keyword index and saves it next to the vector database.
+    """
+    try:
+        logger.info("Building BM25 keyword index.")
+        index = build_keyword_index(chunks, fingerprint=kb_fingerprint())
+        save_keyword_index(index, os.path.join(CHROMA_PATH, INDEX_DIR_NAME))
+        return index
     except Exception as e:
-        logger.error(f"Failed to load documents. Error: {str(e)}", exc_info=True)
+        logger.error(f"Failed to build keyword index. Error: {str(e)}", exc_info=True)
         return None
 
 
-def chunk_documents(documents):
+def create_vector_index(db, embedding_model, dtype=VECTOR_INDEX_DTYPE):
     """
-    Splits loaded documents into smaller chunks.
+    Exports the stored vectors to the memory-mapped flat vector index (VECTOR_STORE=flat) next to
+    the vector database, as a float32 or float16 matrix.
     """
     try:
-        if not documents:
-            logger.warning("Skipping chunking process because no documents were provided.")
-            return []
-
-        logger.info("Starting text splitting process.")
-        
-        text_split = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
+        logger.info("Exporting flat vector index.")
+        index = export_from_chroma(
+            db,
+            fingerprint=indexed_fingerprint(CHROMA_PATH),
+            embedding_model=getattr(embedding_model, "model_name", EMBEDDING_MODEL_NAME),
+            dtype=dtype,
         )
+        save_flat_vector_index(index, os.path.join(CHROMA_PATH, VECTOR_INDEX_DIR_NAME))
+        return index
+    except Exception as e:
+        logger.error(f"Failed to export flat vector index. Error: {str(e)}", exc_info=True)
+        return None
+
+
+def create_faq_index(chunks, embedding_model, generator=None):
+    """
+    Refreshes the precomputed FAQ index next to the vector database. Only chunks that are new or
+    changed since the last build go through the generator (headings, or the recordable LLM) and the
+    embedding model. Without a generator, an existing index is refreshed with the one it was built
+    with, and nothing happens if there is none. Returns (index, stats) or (None, None).
+    """
+    index_path = os.path.join(CHROMA_PATH, FAQ_INDEX_DIR_NAME)
+    try:
+        previous = load_faq_index(index_path)
+        generator = generator or (previous.meta.get("generator") if previous is not None else None)
+        if generator is None:
+            return None, None
 
-        chunks = text_split.split_documents(documents)
-        logger.info(f"Split {len(documents)} documents into {len(chunks)} chunks.")
-        return chunks
+        logger.info(f"Building FAQ index ({generator}).")
+        llm = None
+        if generator == "llm":
+            from llm_cache import build_chat_model
 
+            llm = build_chat_model("gemini-2.0-flash", temperature=0)
+        index, stats = build_faq_index(
+            chunks,
+            embedding_model,
+            generator=generator,
+            llm=llm,
+            previous=previous,
+            fingerprint=kb_fingerprint(),
+            model_id=getattr(embedding_model, "model_name", EMBEDDING_MODEL_NAME),
+        )
+        save_faq_index(index, index_path)
+        return index, stats
     except Exception as e:
-        logger.error(f"Failed to chunk documents. Error: {str(e)}", exc_info=True)
-        return []
+        logger.error(f"Failed to build FAQ index. Error: {str(e)}", exc_info=True)
+        return None, None
 
 
-def create_vector_db(chunks):
-    
+def documents_from_store(db):
+    """
+    Reads every chunk back from the vector database, ordered by chunk id.
+    """
+    data = db.get(include=["documents", "metadatas"])
+    chunks = [
+        Document(page_content=text, metadata=metadata or {})
+        for text, metadata in zip(data["documents"], data["metadatas"])
+    ]
+    chunks.sort(key=lambda c: c.metadata.get("chunk_id", ""))
+    return chunks
+
+
+def sync_vector_db(embedding_model=None, directory_path=DIRECTORY_PATH, workers=None,
+                   upsert_batch_size=UPSERT_BATCH_SIZE):
+    """
+    Incrementally brings the vector database in line with the knowledge base.
+
+    Files whose content hash matches the manifest are skipped without being parsed. Changed
+    files are parsed in a process pool and streamed file by file through chunking and embedding,
+    so only new or changed chunks are embedded and memory stays bounded. Chunks whose source
+    disappeared are deleted. A changed embedding backend rebuilds the database. Returns the
+    database handle and a dict with added/updated/skipped/removed/failed counts.
+    """
+    stats = {"added": 0, "updated": 0, "skipped": 0, "removed": 0, "failed": 0}
+
     try:
-        if not chunks:
-            logger.warning("Skipping database creation because no chunks are available.")
-            return None
+        if embedding_model is None:
+            embedding_model = build_ingest_embeddings()
+        embedding_info = {
+            "backend": getattr(embedding_model, "backend", "torch"),
+            "model": getattr(embedding_model, "model_name", EMBEDDING_MODEL_NAME),
+        }
 
-        if os.path.exists(CHROMA_PATH):
-            logger.info(f"Removing existing database at {CHROMA_PATH}")
-            shutil.rmtree(CHROMA_PATH)
-        
-        logger.info("Initializing HuggingFace embeddings model.")
-        embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-        logger.info("Creating Chroma database from documents.")
-        db = Chroma.from_documents(
-            documents=chunks,
-            embedding=embedding_model,
-            persist_directory=CHROMA_PATH
+        manifest = load_manifest(CHROMA_PATH)
+        if manifest is None:
+            manifest = empty_manifest()
+            if os.path.exists(CHROMA_PATH):
+                logger.info(f"No usable manifest found; removing untracked database at {CHROMA_PATH}")
+                shutil.rmtree(CHROMA_PATH)
+        elif manifest["files"]:
+            # Indexes from before backends were recorded were built with the torch model.
+            recorded = manifest.get("embedding", {"backend": "torch", "model": EMBEDDING_MODEL_NAME})
+            if recorded != embedding_info:
+                logger.info(f"Embedding backend changed from {recorded} to {embedding_info}; rebuilding {CHROMA_PATH}")
+                shutil.rmtree(CHROMA_PATH)
+                manifest = empty_manifest()
+
+        db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_model)
+
+        old_files = manifest["files"]
+        # A chunking change invalidates every file's chunks, even if the file itself is unchanged.
+        same_chunking = manifest.get("chunking") == CHUNKING_SIGNATURE
+        if old_files and not same_chunking:
+            logger.info("Chunking settings changed; re-chunking every file.")
+        new_files = {}
+        changed_paths = []
+        fingerprint = kb_fingerprint(directory_path)
+
+        for path in discover_files(directory_path):
+            file_hash = file_sha256(path)
+            old_entry = old_files.get(path)
+            if old_entry and old_entry["hash"] == file_hash and same_chunking:
+                new_files[path] = old_entry
+                stats["skipped"] += len(old_entry["chunks"])
+            else:
+                changed_paths.append((path, file_hash))
+
+        logger.info(f"{len(new_files)} files unchanged, {len(changed_paths)} new or changed.")
+
+        pending = []
+
+        def flush():
+            if pending:
+                db.add_documents(pending, ids=[c.metadata["chunk_id"] for c in pending])
+                pending.clear()
+
+        file_hashes = dict(changed_paths)
+        for path, documents, error in iter_documents(file_hashes, workers):
+            old_chunks = old_files.get(path, {}).get("chunks", {})
+            # A file with no text left is chunked to nothing, so its old chunks are deleted below.
+            chunks = chunk_documents(documents) if documents else []
+            if error or (documents and not chunks):
+                # Keep what we had for files that failed to parse or chunk rather than deleting it.
+                stats["failed"] += 1
+                if path in old_files:
+                    new_files[path] = old_files[path]
+                continue
+
+            new_chunks = {c.metadata["chunk_id"]: c.metadata["chunk_hash"] for c in chunks}
+            for chunk in chunks:
+                old_hash = old_chunks.get(chunk.metadata["chunk_id"])
+                if old_hash == chunk.metadata["chunk_hash"]:
+                    stats["skipped"] += 1
+                    continue
+                stats["added" if old_hash is None else "updated"] += 1
+                pending.append(chunk)
+                if len(pending) >= upsert_batch_size:
+                    flush()
+
+            stale = [chunk_id for chunk_id in old_chunks if chunk_id not in new_chunks]
+            if stale:
+                db.delete(ids=stale)
+                stats["removed"] += len(stale)
+            new_files[path] = {"hash": file_hashes[path], "chunks": new_chunks}
+        flush()
+
+        for path, old_entry in old_files.items():
+            if path not in new_files:
+                logger.info(f"Source removed from knowledge base: {path}")
+                if old_entry["chunks"]:
+                    db.delete(ids=list(old_entry["chunks"]))
+                stats["removed"] += len(old_entry["chunks"])
+
+        manifest["files"] = new_files
+        manifest["chunking"] = CHUNKING_SIGNATURE
+        manifest["embedding"] = embedding_info
+        # Kept chunks of files that failed to parse are not the current content.
+        manifest["fingerprint"] = fingerprint if not stats["failed"] else None
+        save_manifest(CHROMA_PATH, manifest)
+
+        logger.info(
+            f"Incremental ingest complete: {stats['added']} added, {stats['updated']} updated, "
+            f"{stats['skipped']} skipped, {stats['removed']} removed, {stats['failed']} files failed."
         )
-        
-        logger.info(f"Database successfully saved to {CHROMA_PATH}")
-        return db
+        return db, stats
 
     except Exception as e:
-        logger.error(f"Failed to create vector database. Error: {str(e)}", exc_info=True)
-        return None
+        logger.error(f"Failed to sync vector database. Error: {str(e)}", exc_info=True)
+        return None, stats
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the Knowledge-base into the vector database.")
+    parser.add_argument("--full-rebuild", action="store_true",
+                        help="Drop the database and re-embed every chunk instead of syncing incrementally.")
+    parser.add_argument("--batch-size", type=int, default=64, help="Embedding batch size.")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads for embedding (torch or onnxruntime).")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Embedding worker processes; >1 starts a sentence-transformers process pool.")
+    parser.add_argument("--no-embedding-cache", action="store_true",
+                        help="Do not read or write the on-disk embedding cache.")
+    parser.add_argument("--parse-workers", type=int, default=None,
+                        help="Processes used to parse documents (defaults to all cores).")
+    parser.add_argument("--embedding-backend", choices=EMBEDDING_BACKENDS, default=EMBEDDING_BACKEND,
+                        help="torch (sentence-transformers) or onnx (int8 export from export_onnx_model.py).")
+    parser.add_argument("--vector-dtype", choices=VECTOR_INDEX_DTYPES, default=VECTOR_INDEX_DTYPE,
+                        help="Element type of the flat vector index; float16 halves its size.")
+    parser.add_argument("--faq-index", choices=FAQ_GENERATORS, default=None,
+                        help="Also build the precomputed FAQ index (an existing one is refreshed without this flag).")
+    args = parser.parse_args()
+
     logger.info("--- Pipeline Execution Started ---")
-    
-    my_doc = load_document()
-    
-    if my_doc:
-        my_chunk = chunk_documents(my_doc)
-        
-        if my_chunk:
-            vector_db = create_vector_db(my_chunk)
-
-            if vector_db:
-                logger.info("Executing Test Query: 'What are the core hours?'")
-                try:
-                    query = "What are the core hours?"
-                    results = vector_db.similarity_search(query, k=1)
+
+    if not os.path.exists(DIRECTORY_PATH):
+        logger.error(f"Directory path does not exist: {DIRECTORY_PATH}")
+    else:
+        if args.full_rebuild and os.path.exists(CHROMA_PATH):
+            logger.info(f"Removing existing database at {CHROMA_PATH}")
+            shutil.rmtree(CHROMA_PATH)
+
+        embedding_model = build_ingest_embeddings(
+            batch_size=args.batch_size,
+            num_threads=args.threads,
+            processes=args.processes,
+            use_cache=not args.no_embedding_cache,
+            backend=args.embedding_backend,
+        )
+        vector_db, stats = sync_vector_db(embedding_model, workers=args.parse_workers)
+        print(
+            f"Chunks added: {stats['added']}, updated: {stats['updated']}, "
+            f"skipped: {stats['skipped']}, removed: {stats['removed']}, files failed: {stats['failed']}"
+        )
+
+        if vector_db:
+            chunks = documents_from_store(vector_db)
+            keyword_index = create_keyword_index(chunks)
+            if keyword_index is not None:
+                print(f"Keyword index: {len(keyword_index)} chunks, {keyword_index.meta['num_terms']} terms.")
+            vector_index = create_vector_index(vector_db, embedding_model, dtype=args.vector_dtype)
+            if vector_index is not None:
+                print(
+                    f"Flat vector index: {len(vector_index)} vectors x {vector_index.meta['dim']} dims "
+                    f"({vector_index.meta['dtype']})."
+                )
+            faq_index, faq_stats = create_faq_index(chunks, embedding_model, generator=args.faq_index)
+            if faq_index is not None:
+                print(
+                    f"FAQ index: {faq_stats['entries']} entries, {faq_stats['questions']} questions "
+                    f"({faq_stats['generated']} chunks generated, {faq_stats['reused']} reused, "
+                    f"{faq_stats['removed']} removed)."
+                )
+
+            logger.info("Executing Test Query: 'What are the core hours?'")
+            try:
+                query = "What are the core hours?"
+                results = vector_db.similarity_search(query, k=1)
+                
+                if results:
+                    logger.info(f"Query Result: {results[0].page_content[:100]}...")
+                else:
+                    logger.warning("Query returned no results.")
                     
-                    if results:
-                        logger.info(f"Query Result: {results[0].page_content[:100]}...")
-                    else:
-                        logger.warning("Query returned no results.")
-                        
-                except Exception as e:
-                    logger.error(f"Test query failed. Error: {str(e)}", exc_info=True)
+            except Exception as e:
+                logger.error(f"Test query failed. Error: {str(e)}", exc_info=True)
     
-    logger.info("--- Pipeline Execution Finished ---")
\ No newline at end of file
+    logger.info("--- Pipeline Execution Finished ---")
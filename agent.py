@@ -1,21 +1,19 @@
 import os
+import argparse
 from dotenv import load_dotenv
-from langchain_community.retrievers import BM25Retriever
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 try:
-    from langchain.retrievers import EnsembleRetriever
     from langchain.chains import RetrievalQA
 except ImportError:
-    from langchain_classic.retrievers import EnsembleRetriever
     from langchain_classic.chains import RetrievalQA
 
 from langchain_core.prompts import PromptTemplate
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
+from llm_cache import build_chat_model
 from logger import setup_logger
+from keyword_index import get_keyword_retriever
+from embeddings import load_query_embedding_model
+from flat_vector_store import open_vector_store
+from hybrid_retriever import FusedHybridRetriever
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -26,38 +24,28 @@ CHROMA_PATH = os.getenv("CHROMA_PATH")
 DATA_PATH = os.getenv("DATA_PATH")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-def setup_hybrid_chain():
+def setup_hybrid_chain(llm=None):
     try:
         logger.info("Initializing Hybrid Search Engine.")
 
-        embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        vector_db = Chroma(
-            persist_directory=CHROMA_PATH, 
-            embedding_function=embedding_model
-        )
-        vector_retriever = vector_db.as_retriever(search_kwargs={"k": 5})
+        embedding_model = load_query_embedding_model(CHROMA_PATH)
+        # VECTOR_STORE selects Chroma or the memory-mapped flat index written at ingest.
+        vector_db = open_vector_store(DATA_PATH, CHROMA_PATH, embedding_model)
         logger.info("Vector store loaded successfully.")
 
-        logger.info("Building BM25 Keyword Index.")
-        loader = DirectoryLoader(DATA_PATH, glob="**/*.md", loader_cls=TextLoader)
-        docs = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = text_splitter.split_documents(docs)
-        
-        bm25_retriever = BM25Retriever.from_documents(chunks)
-        bm25_retriever.k = 5
-        logger.info("Keyword index built successfully.")
+        logger.info("Loading BM25 Keyword Index.")
+        bm25_retriever = get_keyword_retriever(DATA_PATH, CHROMA_PATH, k=5)
+        logger.info("Keyword index loaded successfully.")
 
-        ensemble_retriever = EnsembleRetriever(
-            retrievers=[bm25_retriever, vector_retriever],
+        hybrid_retriever = FusedHybridRetriever(
+            keyword_retriever=bm25_retriever,
+            vector_store=vector_db,
+            k=5,
             weights=[0.5, 0.5]
         )
 
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash", 
-            google_api_key=GOOGLE_API_KEY, 
-            temperature=0
-        )
+        if llm is None:
+            llm = build_chat_model("gemini-2.0-flash", temperature=0)
 
         prompt_template = """
         You are a helpful Ciklum HR Assistant. 
@@ -78,7 +66,7 @@ def setup_hybrid_chain():
 
         qa_chain = RetrievalQA.from_chain_type(
             llm=llm,
-            retriever=ensemble_retriever,
+            retriever=hybrid_retriever,
             return_source_documents=True,
             chain_type_kwargs={"prompt": PROMPT}
         )
@@ -89,12 +77,50 @@ def setup_hybrid_chain():
         logger.error(f"Failed to setup hybrid chain: {e}", exc_info=True)
         return None
 
+def stream_hybrid_answer(chain, query, handler):
+    """
+    Answers a query with the chain's retriever, prompt and LLM, streaming tokens to the handler.
+    Returns a dict shaped like chain.invoke(): {'query', 'result', 'source_documents'}.
+    """
+    handler.start_turn()
+    handler.on_tool_start({"name": "lookup_policy"}, query)
+    docs = chain.retriever.invoke(query)
+
+    llm_chain = chain.combine_documents_chain.llm_chain
+    context = "\n\n".join(doc.page_content for doc in docs)
+    prompt_value = llm_chain.prompt.format_prompt(context=context, question=query)
+
+    tokens = []
+    for chunk in llm_chain.llm.stream(prompt_value):
+        handler.on_llm_new_token(chunk.content)
+        tokens.append(chunk.content)
+
+    result = "".join(tokens)
+    handler.finish_turn(result)
+    return {"query": query, "result": result, "source_documents": docs}
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interactive hybrid RAG agent.")
+    parser.add_argument("--stream", action="store_true", help="Print answer tokens as they are generated.")
+    parser.add_argument("--offline", action="store_true", help="Use a fake streaming LLM instead of Gemini.")
+    args = parser.parse_args()
+
     try:
-        chain = setup_hybrid_chain()
+        llm = None
+        if args.offline:
+            from fake_llm import FakeChatModel
+
+            llm = FakeChatModel(latency=0.3, token_delay=0.03)
+        chain = setup_hybrid_chain(llm=llm)
         
         if chain:
             print("\nCiklum Hybrid Agent is Ready! (Type 'exit' to stop)")
+            stream_handler = None
+            if args.stream:
+                from streaming import StreamingConsoleHandler
+
+                stream_handler = StreamingConsoleHandler()
             
             while True:
                 query = input("\nUser: ")
@@ -103,9 +129,11 @@ if __name__ == "__main__":
                     
                 try:
                     logger.info(f"Received query: {query}")
-                    response = chain.invoke({"query": query})
-                    
-                    print(f"Agent: {response['result']}")
+                    if stream_handler:
+                        response = stream_hybrid_answer(chain, query, stream_handler)
+                    else:
+                        response = chain.invoke({"query": query})
+                        print(f"Agent: {response['result']}")
                     logger.info(f"Agent Response: {response['result']}")
                     
                     print("\n[Sources Found:]")
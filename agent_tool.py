@@ -1,24 +1,21 @@
 import os
-import random
-from langchain_community.retrievers import BM25Retriever
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-try:
-    from langchain.retrievers import EnsembleRetriever
-    from langchain.agents import AgentExecutor, create_tool_calling_agent
-except ImportError:
-    from langchain_classic.retrievers import EnsembleRetriever
-    from langchain_classic.agents import AgentExecutor, create_tool_calling_agent
-
-from langchain_chroma import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_google_genai import ChatGoogleGenerativeAI
+import uuid
+import argparse
+import threading
+import time
+
 from langchain_core.tools import tool
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
 from dotenv import load_dotenv
 from logger import setup_logger
+from keyword_index import get_keyword_retriever
+from ingest_manifest import index_version
+from leave_store import get_leave_store, parse_employee_id
+from chunking import build_context
+from conversation_memory import ConversationMemory
+from tokens import count_message_tokens, count_tokens
+from ticket_store import current_session, get_ticket_store
+from tracing import llm_tracer, log_stage_summary, new_trace, span
 
 load_dotenv()
 logger = setup_logger(__name__)
@@ -27,80 +24,222 @@ CHROMA_PATH = os.getenv("CHROMA_PATH")
 DATA_PATH = os.getenv("DATA_PATH")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-def get_retriever():
+# Heavy resources are built on first use (or by warm_up) so importing this module stays cheap.
+_init_lock = threading.RLock()
+_embedding_model = None
+_global_retriever = None
+_faq_answerer = None
+_faq_loaded = False
+
+
+def get_embedding_model(num_threads=None):
+    """
+    Returns the shared sentence-transformers embedding model, loading it on first use.
+    num_threads only applies to the call that loads it.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _init_lock:
+            if _embedding_model is None:
+                from embeddings import load_query_embedding_model
+
+                start = time.perf_counter()
+                # Same backend the index was built with (recorded in the ingest manifest).
+                _embedding_model = load_query_embedding_model(CHROMA_PATH, num_threads=num_threads)
+                logger.info(f"Startup timing: embedding_model={time.perf_counter() - start:.3f}s")
+    return _embedding_model
+
+
+def get_retriever(vector_store=None):
+    """
+    Builds the hybrid retriever over the BM25 index and the vector store (VECTOR_STORE by default).
+    """
     try:
+        from flat_vector_store import open_vector_store
+        from hybrid_retriever import FusedHybridRetriever
+
         logger.info("Initializing knowledge base retriever.")
-        embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-        vector_db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_model)
-        vector_retriever = vector_db.as_retriever(search_kwargs={"k": 3})
+        timings = {}
+
+        start = time.perf_counter()
+        embedding_model = get_embedding_model()
+        timings["embedding_model"] = time.perf_counter() - start
 
-        loader = DirectoryLoader(DATA_PATH, glob="**/*.md", loader_cls=TextLoader)
-        docs = loader.load()
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = text_splitter.split_documents(docs)
+        start = time.perf_counter()
+        vector_db = open_vector_store(DATA_PATH, CHROMA_PATH, embedding_model, kind=vector_store)
+        timings["vector_store"] = time.perf_counter() - start
 
-        bm25_retriever = BM25Retriever.from_documents(chunks)
-        bm25_retriever.k = 3
+        start = time.perf_counter()
+        bm25_retriever = get_keyword_retriever(DATA_PATH, CHROMA_PATH, k=3)
+        timings["keyword_index"] = time.perf_counter() - start
         
-        ensemble_retriever = EnsembleRetriever(
-            retrievers=[bm25_retriever, vector_retriever],
+        hybrid_retriever = FusedHybridRetriever(
+            keyword_retriever=bm25_retriever,
+            vector_store=vector_db,
+            k=3,
             weights=[0.5, 0.5]
         )
-        return ensemble_retriever
+        logger.info("Startup timing: " + ", ".join(f"{name}={sec:.3f}s" for name, sec in timings.items()))
+        return hybrid_retriever
     except Exception as e:
         logger.error(f"Failed to initialize retriever: {e}", exc_info=True)
         raise
 
-global_retriever = get_retriever()
+
+def get_global_retriever(vector_store=None):
+    """
+    Thread-safe accessor for the shared retriever; builds it on first call.
+    """
+    global _global_retriever
+    if _global_retriever is None:
+        with _init_lock:
+            if _global_retriever is None:
+                _global_retriever = get_retriever(vector_store)
+    return _global_retriever
+
+
+def get_faq_answerer():
+    """
+    Returns the shared FAQAnswerer over the precomputed FAQ index, or None when FAQ_ANSWERS=0 or
+    there is no up-to-date index (built by Load_And_DBCreation.py --faq-index). Loaded on first call.
+    """
+    global _faq_answerer, _faq_loaded
+    if not _faq_loaded:
+        with _init_lock:
+            if not _faq_loaded:
+                if os.getenv("FAQ_ANSWERS", "1") == "1":
+                    from embeddings import EMBEDDING_BACKEND, embedding_model_id, index_embedding_backend
+                    from faq_index import FAQ_INDEX_DIR_NAME, FAQ_MIN_SCORE, FAQAnswerer, load_faq_index
+                    from document_loader import kb_fingerprint
+
+                    index = load_faq_index(
+                        os.path.join(CHROMA_PATH, FAQ_INDEX_DIR_NAME),
+                        expected_fingerprint=kb_fingerprint(DATA_PATH),
+                        expected_model=embedding_model_id(index_embedding_backend(CHROMA_PATH) or EMBEDDING_BACKEND),
+                    )
+                    if index is not None and len(index):
+                        embedding_model = get_embedding_model()
+                        _faq_answerer = FAQAnswerer(index, embedding_model.embed_query, min_score=FAQ_MIN_SCORE)
+                        logger.info(f"FAQ index loaded: {len(index)} entries, {index.meta['num_questions']} questions.")
+                _faq_loaded = True
+    return _faq_answerer
+
+
+def faq_stats():
+    """
+    Hit rate and latency saved by the FAQ index so far, or None if it was never loaded.
+    """
+    return _faq_answerer.stats() if _faq_answerer is not None else None
+
+
+def warm_up(probe_query="What are the core hours?"):
+    """
+    Builds the retriever and runs one probe query so the first real request does not pay
+    for model loading, index mapping or first-call overheads. Call before accepting traffic.
+    Returns the timing breakdown in seconds.
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    retriever = get_global_retriever()
+    timings["retriever_init"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    get_faq_answerer()
+    timings["faq_index"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    retriever.invoke(probe_query)
+    timings["probe_query"] = time.perf_counter() - start
+
+    logger.info("Warm-up complete: " + ", ".join(f"{name}={sec:.3f}s" for name, sec in timings.items()))
+    return timings
+
+
+def build_llm():
+    # Plain Gemini client, or the record/replay wrapper when LLM_CACHE_MODE is record or replay.
+    from llm_cache import build_chat_model
+
+    return build_chat_model("gemini-2.0-flash", temperature=0)
+
 
 @tool
 def lookup_policy(query: str) -> str:
     """Useful for answering questions about HR rules, remote work, holidays, and company policies.
     Input should be a specific question."""
-    try:
-        logger.info(f"Tool triggered: lookup_policy with query: {query}")
-        docs = global_retriever.invoke(query)
-        results = "\n\n".join([d.page_content for d in docs])
-        return results
-    except Exception as e:
-        logger.error(f"Error in lookup_policy: {e}", exc_info=True)
-        return "Error retrieving policy."
+    with span("tool.lookup_policy"):
+        try:
+            logger.info(f"Tool triggered: lookup_policy with query: {query}")
+            start = time.perf_counter()
+            faq = get_faq_answerer()
+            hit = faq.lookup(query) if faq is not None else None
+            if hit is not None:
+                from faq_index import format_faq_answer
+
+                faq.record("lookup_policy", True, time.perf_counter() - start)
+                return format_faq_answer(hit)
+            docs = get_global_retriever().invoke(query)
+            # Overlapping/adjacent hits are merged and the context is capped at LOOKUP_CONTEXT_TOKENS.
+            results = build_context(docs)
+            if faq is not None:
+                faq.record("lookup_policy", False, time.perf_counter() - start)
+            return results
+        except Exception as e:
+            logger.error(f"Error in lookup_policy: {e}", exc_info=True)
+            return "Error retrieving policy."
 
 @tool
 def check_leave_balance(employee_id: str) -> str:
     """Useful for checking how many vacation or sick days an employee has left.
     Input should be the Employee ID (e.g., 'EMP-123')."""
-    try:
-        logger.info(f"Tool triggered: check_leave_balance for ID: {employee_id}")
-        clean_id = employee_id.replace("EMP", "").replace("-", "").strip()
+    with span("tool.check_leave_balance"):
+        try:
+            logger.info(f"Tool triggered: check_leave_balance for ID: {employee_id}")
+            clean_id = parse_employee_id(employee_id)
+            balance = get_leave_store().get_balance(clean_id) if clean_id is not None else None
         
-        if clean_id == "123":
-            return "You have 15 days of Annual Leave and 3 Sick Days remaining."
-        elif clean_id == "999":
-            return "You have 0 days remaining. Time to work!"
-        else:
-            return "Employee ID not found."
-    except Exception as e:
-        logger.error(f"Error in check_leave_balance: {e}", exc_info=True)
-        return "Error checking leave balance."
+            if balance is None:
+                return "Employee ID not found."
+            elif balance["annual_leave"] == 0 and balance["sick_days"] == 0:
+                return "You have 0 days remaining. Time to work!"
+            else:
+                return (
+                    f"You have {balance['annual_leave']} days of Annual Leave and "
+                    f"{balance['sick_days']} Sick Days remaining."
+                )
+        except Exception as e:
+            logger.error(f"Error in check_leave_balance: {e}", exc_info=True)
+            return "Error checking leave balance."
 
 @tool
 def create_support_ticket(issue_description: str) -> str:
     """Useful for reporting IT problems, broken hardware, password resets, or access issues.
     Input should be a clear description of the problem."""
-    try:
-        logger.info(f"Tool triggered: create_support_ticket for issue: {issue_description}")
-        ticket_id = f"INC-{random.randint(1000, 9999)}"
-        return f"Success! Ticket #{ticket_id} has been created. IT Support will contact you within 24 hours."
-    except Exception as e:
-        logger.error(f"Error in create_support_ticket: {e}", exc_info=True)
-        return "Error creating ticket."
+    with span("tool.create_support_ticket"):
+        try:
+            logger.info(f"Tool triggered: create_support_ticket for issue: {issue_description}")
+            ticket_id, created = get_ticket_store().create_ticket(issue_description)
+            if not created:
+                return f"Ticket #{ticket_id} already exists for this issue. IT Support will contact you within 24 hours."
+            return f"Success! Ticket #{ticket_id} has been created. IT Support will contact you within 24 hours."
+        except Exception as e:
+            logger.error(f"Error in create_support_ticket: {e}", exc_info=True)
+            return "Error creating ticket."
 
 my_tools = [lookup_policy, check_leave_balance, create_support_ticket]
 
+def _agent_api():
+    # langchain.agents costs most of this module's import time, so it is only loaded by the builders.
+    try:
+        from langchain.agents import AgentExecutor, create_tool_calling_agent
+    except ImportError:
+        from langchain_classic.agents import AgentExecutor, create_tool_calling_agent
+    return AgentExecutor, create_tool_calling_agent
+
 def run_agent():
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=GOOGLE_API_KEY, temperature=0)
+        AgentExecutor, create_tool_calling_agent = _agent_api()
+        llm = build_llm()
         prompt = ChatPromptTemplate.from_messages([
             ("system", "You are a helpful HR Assistant."),
             ("human", "{input}"),
@@ -114,7 +253,8 @@ def run_agent():
 
 def run_agent_with_memory():
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key=GOOGLE_API_KEY, temperature=0)
+        AgentExecutor, create_tool_calling_agent = _agent_api()
+        llm = build_llm()
         prompt = ChatPromptTemplate.from_messages([
             ("system", "You are a helpful HR Assistant."),
             MessagesPlaceholder(variable_name="chat_history"),
@@ -127,17 +267,7 @@ def run_agent_with_memory():
         logger.error(f"Error building run_agent_with_memory: {e}", exc_info=True)
         return None
 
-def run_agent_with_refine_prompt():
-    try:
-        logger.info("Building agent with refined prompt.")
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash", 
-            google_api_key=GOOGLE_API_KEY, 
-            temperature=0
-        )
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a smart Ciklum HR Assistant.
+REFINED_SYSTEM_PROMPT = """You are a smart Ciklum HR Assistant.
             
             YOUR GOAL: Help with HR policies AND Leave Balances.
             
@@ -154,7 +284,23 @@ def run_agent_with_refine_prompt():
                Ask user if user wants to create a IT ticket. If he acknowledge .Create the ticket
                - Call `create_support_ticket` with the details.  
             4. GENERAL: Be helpful and concise.
-            """),
+            """
+
+
+def run_agent_with_refine_prompt(llm=None, concurrent_tools=None):
+    """
+    Builds the tool-calling agent. With concurrent_tools (AGENT_CONCURRENT_TOOLS=1, off by default)
+    several tool calls from one model step run in parallel; AGENT_SERIAL_TOOLS lists the tools that
+    must still run one at a time and AGENT_TOOL_TIMEOUT bounds each call.
+    """
+    try:
+        logger.info("Building agent with refined prompt.")
+        AgentExecutor, create_tool_calling_agent = _agent_api()
+        if llm is None:
+            llm = build_llm()
+
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", REFINED_SYSTEM_PROMPT),
             
             MessagesPlaceholder(variable_name="chat_history"),
             ("human", "{input}"),
@@ -162,20 +308,98 @@ def run_agent_with_refine_prompt():
         ])
 
         agent = create_tool_calling_agent(llm, my_tools, prompt)
-        agent_executor = AgentExecutor(agent=agent, tools=my_tools, verbose=False)
+        if concurrent_tools is None:
+            concurrent_tools = os.getenv("AGENT_CONCURRENT_TOOLS", "0") == "1"
+        if concurrent_tools:
+            from concurrent_tools import ConcurrentToolAgentExecutor
+
+            serial_tools = os.getenv("AGENT_SERIAL_TOOLS", "create_support_ticket")
+            return ConcurrentToolAgentExecutor(
+                agent=agent, tools=my_tools, verbose=False, return_intermediate_steps=True,
+                tool_timeout=float(os.getenv("AGENT_TOOL_TIMEOUT", "30")),
+                serial_tools=[name.strip() for name in serial_tools.split(",") if name.strip()],
+            )
+        agent_executor = AgentExecutor(
+            agent=agent, tools=my_tools, verbose=False, return_intermediate_steps=True
+        )
         return agent_executor
     except Exception as e:
         logger.error(f"Error building agent: {e}", exc_info=True)
         return None
 
+def build_answer_cache():
+    """
+    Builds the opt-in semantic answer cache (ANSWER_CACHE=1) on top of the shared embedding model.
+    """
+    from semantic_cache import SemanticAnswerCache
+
+    return SemanticAnswerCache(
+        embed_fn=lambda text: get_embedding_model().embed_query(text),
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92")),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512")),
+        ttl_seconds=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+        version_fn=lambda: index_version(CHROMA_PATH),
+    )
+
+def build_intent_router(executor, llm):
+    """
+    Puts the deterministic fast-path router (INTENT_ROUTER=1, off by default) in front of the agent.
+    """
+    from intent_router import IntentClassifier, RoutedAgent
+
+    return RoutedAgent(
+        executor,
+        llm,
+        IntentClassifier(get_embedding_model()),
+        get_global_retriever,
+        check_leave_balance,
+        faq_fn=get_faq_answerer,
+        min_score=float(os.getenv("ROUTER_MIN_SCORE", "0.5")),
+        min_margin=float(os.getenv("ROUTER_MIN_MARGIN", "0.05")),
+        min_relevance=float(os.getenv("ROUTER_MIN_RELEVANCE", "0.5")),
+    )
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interactive Ciklum HR agent.")
+    parser.add_argument("--stream", action="store_true", help="Print answer tokens as they are generated.")
+    parser.add_argument("--offline", action="store_true", help="Use a fake streaming LLM instead of Gemini.")
+    args = parser.parse_args()
+
     try:
         logger.info("Application starting.")
-        bot = run_agent_with_refine_prompt()
+        warm_up()
+        if args.offline:
+            from fake_llm import FakeChatModel
+
+            llm = FakeChatModel(latency=0.3, token_delay=0.03)
+        else:
+            llm = build_llm()
+        bot = run_agent_with_refine_prompt(llm=llm)
+        router = None
+        if bot and os.getenv("INTENT_ROUTER", "0") == "1":
+            router = bot = build_intent_router(bot, llm)
+        answer_cache = None
+        if bot and os.getenv("ANSWER_CACHE") == "1":
+            from semantic_cache import CachedAgentExecutor
+
+            answer_cache = build_answer_cache()
+            bot = CachedAgentExecutor(bot, answer_cache)
+            logger.info("Semantic answer cache enabled.")
         
         if bot:
             print("\nCiklum Agent is Ready! (Type 'exit' to stop)")
-            chat_history = []
+            memory = ConversationMemory(
+                token_budget=int(os.getenv("MEMORY_TOKEN_BUDGET", "1500")),
+                keep_recent_turns=int(os.getenv("MEMORY_RECENT_TURNS", "3")),
+                summarizer_llm=llm,
+            )
+            system_prompt_tokens = count_tokens(REFINED_SYSTEM_PROMPT)
+            current_session.set(uuid.uuid4().hex)
+            stream_handler = None
+            if args.stream:
+                from streaming import StreamingConsoleHandler, stream_agent_turn
+
+                stream_handler = StreamingConsoleHandler()
 
             while True:
                 user_input = input("\nUser: ")
@@ -184,22 +408,42 @@ if __name__ == "__main__":
                 
                 try:
                     logger.info(f"User Input: {user_input}")
-                    response = bot.invoke({
+                    chat_history = memory.messages()
+                    inputs = {
                         "input": user_input,
                         "chat_history": chat_history
-                    })
-                    
-                    output_text = response['output']
-                    print(f"Agent: {output_text}")
+                    }
+                    history_tokens = count_message_tokens(chat_history)
+                    input_tokens = count_tokens(user_input)
+                    logger.info(
+                        f"Prompt tokens this turn: total={system_prompt_tokens + history_tokens + input_tokens} "
+                        f"(system={system_prompt_tokens}, history={history_tokens}, input={input_tokens})"
+                    )
+                    with new_trace() as trace_id:
+                        logger.info(f"Trace id: {trace_id}")
+                        if stream_handler:
+                            response = stream_agent_turn(bot, inputs, stream_handler, callbacks=[llm_tracer])
+                            output_text = response['output']
+                        else:
+                            response = bot.invoke(inputs, {"callbacks": [llm_tracer]})
+                            output_text = response['output']
+                            print(f"Agent: {output_text}")
                     logger.info(f"Agent Response: {output_text}")
 
-                    chat_history.append(HumanMessage(content=user_input))
-                    chat_history.append(AIMessage(content=output_text))
+                    memory.add_turn(user_input, output_text)
                     
                 except Exception as e:
                     error_msg = f"Interaction error: {e}"
                     print(error_msg)
                     logger.error(error_msg, exc_info=True)
+
+            log_stage_summary()
+            if router is not None:
+                logger.info(f"Intent router stats: {router.stats()}")
+            if faq_stats() is not None:
+                logger.info(f"FAQ index stats: {faq_stats()}")
+            if answer_cache is not None:
+                logger.info(f"Answer cache stats: {answer_cache.stats()}")
         else:
             logger.error("Failed to initialize agent bot.")
             print("System Error: Agent could not be initialized.")
@@ -0,0 +1,103 @@
+"""
+Accuracy/latency comparison of the torch and int8 ONNX embedding backends.
+
+    python export_onnx_model.py            # once
+    python -m benchmarks.embeddings --threads 4
+
+Embeds the chunked Knowledge-base and the labeled queries from benchmarks/retrieval_queries.json
+with both backends, then reports model load time, document throughput, single-query latency,
+cosine agreement between the two backends' vectors, overlap of their top-k neighbours and
+recall@k against the labels (exact cosine search, no vector store involved).
+"""
+import argparse
+import json
+import time
+import numpy as np
+from benchmarks.retrieval import QUERIES_PATH, normalize
+from embeddings import load_embedding_model
+from tracing import percentile
+
+
+def measure(backend, chunks, queries, batch_size, threads):
+    start = time.perf_counter()
+    model = load_embedding_model(batch_size=batch_size, num_threads=threads, backend=backend)
+    load_s = time.perf_counter() - start
+
+    model.embed_documents(chunks[:batch_size])  # warm-up
+    start = time.perf_counter()
+    doc_vectors = np.asarray(model.embed_documents(chunks), dtype=np.float32)
+    docs_per_s = len(chunks) / (time.perf_counter() - start)
+
+    latencies = []
+    query_vectors = []
+    model.embed_query(queries[0])
+    for query in queries * 5:
+        t0 = time.perf_counter()
+        vector = model.embed_query(query)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        if len(query_vectors) < len(queries):
+            query_vectors.append(vector)
+    latencies.sort()
+    return {
+        "load_s": load_s,
+        "docs_per_s": docs_per_s,
+        "query_p50_ms": percentile(latencies, 50),
+        "query_p99_ms": percentile(latencies, 99),
+        "doc_vectors": doc_vectors,
+        "query_vectors": np.asarray(query_vectors, dtype=np.float32),
+    }
+
+
+def top_k(query_vectors, doc_vectors, k):
+    return np.argsort(-(query_vectors @ doc_vectors.T), axis=1)[:, :k]
+
+
+def recall(cases, chunks, neighbours):
+    hits = 0
+    for case, row in zip(cases, neighbours):
+        texts = [normalize(chunks[i]) for i in row]
+        if any(normalize(snippet) in text for snippet in case["expected"] for text in texts):
+            hits += 1
+    return hits / len(cases)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the torch and ONNX embedding backends.")
+    parser.add_argument("--data-path", default="./Knowledge-base")
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    from chunking import chunk_documents
+    from document_loader import load_document
+
+    chunks = [c.page_content for c in chunk_documents(load_document(args.data_path) or [])]
+    with open(args.queries, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    queries = [case["query"] for case in cases]
+
+    results = {backend: measure(backend, chunks, queries, args.batch_size, args.threads) for backend in ("torch", "onnx")}
+
+    print(f"{len(chunks)} chunks, {len(queries)} queries, k={args.k}")
+    for backend, r in results.items():
+        neighbours = top_k(r["query_vectors"], r["doc_vectors"], args.k)
+        print(
+            f"{backend:<6} load={r['load_s']:6.2f}s  {r['docs_per_s']:8.1f} docs/s  "
+            f"query p50={r['query_p50_ms']:6.2f}ms p99={r['query_p99_ms']:6.2f}ms  "
+            f"recall@{args.k}={recall(cases, chunks, neighbours):.3f}"
+        )
+
+    torch_r, onnx_r = results["torch"], results["onnx"]
+    cosines = np.sum(torch_r["doc_vectors"] * onnx_r["doc_vectors"], axis=1) / (
+        np.linalg.norm(torch_r["doc_vectors"], axis=1) * np.linalg.norm(onnx_r["doc_vectors"], axis=1)
+    )
+    torch_top = top_k(torch_r["query_vectors"], torch_r["doc_vectors"], args.k)
+    onnx_top = top_k(onnx_r["query_vectors"], onnx_r["doc_vectors"], args.k)
+    overlap = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(torch_top, onnx_top)])
+    print(f"torch vs onnx: doc cosine mean={cosines.mean():.4f} min={cosines.min():.4f}, top-{args.k} overlap={overlap:.3f}")
+    print(
+        f"speedup: {onnx_r['docs_per_s'] / torch_r['docs_per_s']:.2f}x ingest, "
+        f"{torch_r['query_p50_ms'] / onnx_r['query_p50_ms']:.2f}x query p50"
+    )
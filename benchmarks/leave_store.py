@@ -0,0 +1,71 @@
+"""
+Leave store lookup benchmark.
+
+    python -m benchmarks.leave_store --employees 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from leave_store import LeaveStore, seed_employees
+from tracing import percentile
+
+
+def time_calls(fn, args_list):
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(args)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+    return sorted(latencies)
+
+
+def report(label, latencies, items_per_call=1):
+    total_s = sum(latencies) / 1000.0
+    print(
+        f"{label:<28} n={len(latencies):<6} p50={percentile(latencies, 50):8.3f}ms "
+        f"p99={percentile(latencies, 99):8.3f}ms  {len(latencies) * items_per_call / total_s:12.0f} lookups/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark single and batch leave-balance lookups.")
+    parser.add_argument("--employees", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--path", help="Existing/target database (defaults to a temporary file).")
+    args = parser.parse_args()
+
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix="leave_bench_"), "leave.db")
+    store = LeaveStore(path)
+    if store.count() < args.employees:
+        print(f"Seeding {args.employees} employees into {path} ...")
+        print(f"Seed time: {seed_employees(store, args.employees):.2f}s")
+
+    rng = random.Random(7)
+    ids = [rng.randint(1, args.employees) for _ in range(args.lookups)]
+
+    report("single (1 thread)", time_calls(store.get_balance, ids))
+
+    chunks = [ids[i::args.threads] for i in range(args.threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda chunk: time_calls(store.get_balance, chunk), chunks))
+    wall = time.perf_counter() - start
+    merged = sorted(l for r in results for l in r)
+    print(
+        f"{f'single ({args.threads} threads)':<28} n={len(merged):<6} p50={percentile(merged, 50):8.3f}ms "
+        f"p99={percentile(merged, 99):8.3f}ms  {len(merged) / wall:12.0f} lookups/s (wall)"
+    )
+
+    for batch_size in (100, 1_000, 10_000):
+        batches = [ids[i:i + batch_size] for i in range(0, min(len(ids), batch_size * 50), batch_size)]
+        batches = [b for b in batches if len(b) == batch_size]
+        if not batches:
+            print(f"batch of {batch_size}: skipped (needs --lookups >= {batch_size})")
+            continue
+        report(f"batch of {batch_size}", time_calls(store.get_balances, batches), batch_size)
+
+    store.close()
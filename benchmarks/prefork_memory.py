@@ -0,0 +1,75 @@
+"""
+Memory cost of pre-fork serving: how much each extra worker adds on top of the shared state.
+
+    python -m benchmarks.prefork_memory --workers 1,2,4,8 --vector-store flat
+
+For every worker count, a fresh process loads the shared state (embedding model, BM25 index,
+vector store), forks the workers, drives offline chat traffic through them so every worker has
+touched the model and both indexes, then reads RSS/PSS from /proc. Needs an ingested index.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+from types import SimpleNamespace
+from benchmarks.server_load import client
+from flat_vector_store import VECTOR_STORES
+
+
+def measure(worker_count, args):
+    from prefork_server import PreforkServer, bind_socket, load_shared_state, memory_report, read_process_memory
+
+    load_shared_state(args.vector_store)
+    baseline = read_process_memory(os.getpid())
+
+    sock = bind_socket("127.0.0.1", 0)
+    port = sock.getsockname()[1]
+    options = SimpleNamespace(workers=worker_count, offline=True, max_concurrency=8, max_queue=1000, timeout=60.0)
+    prefork = PreforkServer(options, sock)
+    prefork.start()
+    try:
+        time.sleep(args.startup_wait)
+        latencies, errors = [], {}
+
+        async def drive():
+            await asyncio.gather(*(client(port, i, args.turns, latencies, errors) for i in range(args.sessions)))
+
+        asyncio.run(drive())
+        report = memory_report(os.getpid(), sorted(prefork.workers))
+    finally:
+        prefork.stop()
+
+    workers = [m for name, m in report["processes"].items() if name != "parent" and m]
+    return {
+        "workers": worker_count,
+        "single_process_rss_mb": baseline["rss_mb"],
+        "total_pss_mb": report["total_pss_mb"],
+        "total_rss_mb": report["total_rss_mb"],
+        "worker_private_mb": sum(m["private_mb"] or 0.0 for m in workers) / max(len(workers), 1),
+        "completed": len(latencies),
+        "errors": errors,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure memory of the pre-fork server per worker count.")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--vector-store", choices=VECTOR_STORES, default="flat")
+    parser.add_argument("--sessions", type=int, default=32)
+    parser.add_argument("--turns", type=int, default=2)
+    parser.add_argument("--startup-wait", type=float, default=2.0, help="Seconds to let workers build their agents.")
+    args = parser.parse_args()
+
+    # Each worker count is measured in a fresh process so earlier runs do not inflate the numbers.
+    context = multiprocessing.get_context("spawn")
+    for count in (int(n) for n in args.workers.split(",")):
+        with context.Pool(1) as pool:
+            r = pool.apply(measure, (count, args))
+        naive = r["single_process_rss_mb"] * (r["workers"] + 1)
+        total_pss = "n/a" if r["total_pss_mb"] is None else f"{r['total_pss_mb']:.1f}MB"
+        print(
+            f"workers={r['workers']:<3} total_pss={total_pss} total_rss={r['total_rss_mb']:.1f}MB "
+            f"private/worker={r['worker_private_mb']:.1f}MB  unshared estimate={naive:.1f}MB  "
+            f"completed={r['completed']} errors={r['errors'] or 0}"
+        )
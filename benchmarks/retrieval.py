@@ -0,0 +1,228 @@
+"""
+Retrieval benchmark: BM25 leg, Chroma leg and the fused hybrid retriever over a synthetic HR corpus.
+
+    python -m benchmarks.retrieval --scales 1,100 --output benchmarks_retrieval.jsonl
+
+The corpus is the chunked Knowledge-base plus (scale - 1) seeded distractor copies of every chunk
+(sentences shuffled, a share of the words swapped for corpus vocabulary), so it keeps the HR
+vocabulary while the labeled answers stay in the original chunks. Each scale runs in a fresh
+process so peak RSS is per scale. No LLM is used; with the same seed, queries and Knowledge-base
+the results are comparable across commits (the commit hash is recorded in every result line).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain_core.documents import Document
+from tracing import percentile
+
+QUERIES_PATH = os.path.join(os.path.dirname(__file__), "retrieval_queries.json")
+LEGS = ("keyword", "vector", "hybrid")
+
+
+def normalize(text):
+    return " ".join(text.lower().split())
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def synthesize_corpus(base_chunks, scale, seed=13, replace_rate=0.3):
+    """
+    Returns the base chunks followed by (scale - 1) distractor copies of each.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = np.array([w for c in base_chunks for w in c.page_content.split()], dtype=object)
+    corpus = list(base_chunks)
+    for copy in range(1, scale):
+        for chunk in base_chunks:
+            sentences = re.split(r"(?<=[.!?])\s+", chunk.page_content)
+            rng.shuffle(sentences)
+            words = np.array(" ".join(sentences).split(), dtype=object)
+            mask = rng.random(len(words)) < replace_rate
+            words[mask] = vocab[rng.integers(0, len(vocab), int(mask.sum()))]
+            metadata = dict(chunk.metadata)
+            metadata["source"] = f"synthetic/{copy}/{metadata.get('source', '')}"
+            metadata["chunk_id"] = f"syn{copy}-{metadata.get('chunk_id', '')}"
+            corpus.append(Document(page_content=" ".join(words), metadata=metadata))
+    return corpus
+
+
+def time_queries(search, queries, repeat):
+    """
+    Runs every query `repeat` times after one warm-up pass. Returns (latencies_ms, qps, last results).
+    """
+    for query in queries:
+        search(query)
+    latencies = []
+    results = {}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            t0 = time.perf_counter()
+            results[query] = search(query)
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+    wall = time.perf_counter() - start
+    return sorted(latencies), len(latencies) / wall, results
+
+
+def recall_at_k(cases, results, k):
+    """
+    Share of queries with an expected answer snippet in one of the top-k chunks.
+    """
+    hits = 0
+    for case in cases:
+        texts = [normalize(doc.page_content) for doc in results[case["query"]][:k]]
+        if any(normalize(snippet) in text for snippet in case["expected"] for text in texts):
+            hits += 1
+    return hits / len(cases)
+
+
+def run_scale(options, scale):
+    from chunking import chunk_documents
+    from document_loader import kb_fingerprint, load_document
+    from keyword_index import PersistedBM25Retriever, build_keyword_index, load_keyword_index, save_keyword_index
+
+    with open(options["queries"], "r", encoding="utf-8") as f:
+        cases = json.load(f)
+    queries = [case["query"] for case in cases]
+    k = options["k"]
+
+    base_chunks = chunk_documents(load_document(options["data_path"]) or [])
+    if not base_chunks:
+        raise RuntimeError(f"No chunks loaded from {options['data_path']}")
+    start = time.perf_counter()
+    corpus = synthesize_corpus(base_chunks, scale, seed=options["seed"])
+    result = {
+        "commit": git_commit(),
+        "scale": scale,
+        "seed": options["seed"],
+        "kb_fingerprint": kb_fingerprint(options["data_path"])[:16],
+        "base_chunks": len(base_chunks),
+        "chunks": len(corpus),
+        "k": k,
+        "queries": len(queries),
+        "repeat": options["repeat"],
+        "synthesis_s": round(time.perf_counter() - start, 3),
+        "legs": {},
+    }
+    work_dir = tempfile.mkdtemp(prefix="retrieval_bench_")
+    try:
+        retrievers = {}
+        build_times = {}
+
+        start = time.perf_counter()
+        index_path = os.path.join(work_dir, "keyword_index")
+        save_keyword_index(build_keyword_index(corpus), index_path)
+        keyword = PersistedBM25Retriever(index=load_keyword_index(index_path), k=k)
+        build_times["keyword"] = time.perf_counter() - start
+        retrievers["keyword"] = lambda q: [doc for doc, _ in keyword.search_with_scores(q)]
+        result["rss_after_keyword_build_mb"] = round(peak_rss_mb(), 1)
+
+        vector_store = None
+        if "vector" in options["legs"] or "hybrid" in options["legs"]:
+            if len(corpus) > options["max_vector_chunks"]:
+                print(f"scale {scale}: {len(corpus)} chunks > --max-vector-chunks; skipping vector and hybrid legs")
+            else:
+                from langchain_chroma import Chroma
+                from Load_And_DBCreation import UPSERT_BATCH_SIZE, build_ingest_embeddings
+
+                start = time.perf_counter()
+                embeddings = build_ingest_embeddings(use_cache=options["embedding_cache"])
+                vector_store = Chroma(persist_directory=os.path.join(work_dir, "chroma"), embedding_function=embeddings)
+                for i in range(0, len(corpus), UPSERT_BATCH_SIZE):
+                    batch = corpus[i:i + UPSERT_BATCH_SIZE]
+                    vector_store.add_documents(batch, ids=[c.metadata["chunk_id"] for c in batch])
+                build_times["vector"] = time.perf_counter() - start
+                retrievers["vector"] = lambda q: vector_store.similarity_search(q, k=k)
+
+        if vector_store is not None:
+            from hybrid_retriever import FusedHybridRetriever
+
+            hybrid = FusedHybridRetriever(keyword_retriever=keyword, vector_store=vector_store, k=k, weights=[0.5, 0.5])
+            retrievers["hybrid"] = hybrid.invoke
+            build_times["hybrid"] = build_times["keyword"] + build_times["vector"]
+
+        for leg in options["legs"]:
+            if leg not in retrievers:
+                continue
+            latencies, qps, results = time_queries(retrievers[leg], queries, options["repeat"])
+            result["legs"][leg] = {
+                "build_s": round(build_times.get(leg, 0.0), 3),
+                "p50_ms": round(percentile(latencies, 50), 3),
+                "p99_ms": round(percentile(latencies, 99), 3),
+                "qps": round(qps, 1),
+                f"recall@{k}": round(recall_at_k(cases, results, k), 3),
+            }
+        result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+def print_result(result):
+    k = result["k"]
+    print(
+        f"\nscale={result['scale']}x chunks={result['chunks']} commit={result['commit']} "
+        f"peak_rss={result['peak_rss_mb']}MB synthesis={result['synthesis_s']}s"
+    )
+    for leg, stats in result["legs"].items():
+        print(
+            f"  {leg:<8} build={stats['build_s']:8.2f}s p50={stats['p50_ms']:9.2f}ms p99={stats['p99_ms']:9.2f}ms "
+            f"qps={stats['qps']:9.1f} recall@{k}={stats[f'recall@{k}']:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency, throughput, memory and recall.")
+    parser.add_argument("--scales", default="1,100", help="Comma-separated corpus multipliers, e.g. 1,100,10000.")
+    parser.add_argument("--legs", default=",".join(LEGS), help="Subset of keyword,vector,hybrid.")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--data-path", default="./Knowledge-base")
+    parser.add_argument("--queries", default=QUERIES_PATH)
+    parser.add_argument("--max-vector-chunks", type=int, default=50_000,
+                        help="Skip the embedding-based legs above this corpus size.")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="Reuse the on-disk embedding cache (makes vector build times depend on cache state).")
+    parser.add_argument("--output", help="Append one JSON line per scale to this file.")
+    args = parser.parse_args()
+
+    options = {
+        "legs": [leg for leg in args.legs.split(",") if leg],
+        "k": args.k,
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "data_path": args.data_path,
+        "queries": args.queries,
+        "max_vector_chunks": args.max_vector_chunks,
+        "embedding_cache": args.embedding_cache,
+    }
+    context = multiprocessing.get_context("spawn")
+    for scale in (int(s) for s in args.scales.split(",")):
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_scale, options, scale).result()
+        print_result(result)
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result) + "\n")
@@ -0,0 +1,76 @@
+"""
+Load test for the async agent server against the fake LLM (no API key or network needed).
+
+    python -m benchmarks.server_load --sessions 50 --turns 5 --llm-latency 0.5 --max-concurrency 8
+"""
+import argparse
+import asyncio
+import time
+from server import AgentServer, build_agent, send_chat
+from tracing import percentile
+
+
+async def client(port, session_index, turns, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for turn in range(turns):
+            start = time.perf_counter()
+            reply = await send_chat(reader, writer, {
+                "session_id": f"load-{session_index}",
+                "message": f"Question {turn} from session {session_index}: what are the core hours?",
+            })
+            if "error" in reply:
+                errors[reply["error"]] = errors.get(reply["error"], 0) + 1
+            else:
+                latencies.append((time.perf_counter() - start) * 1000.0)
+    finally:
+        writer.close()
+
+
+async def run(args):
+    agent, memory_factory = build_agent(offline=True, llm_latency=args.llm_latency, router=args.router)
+    server = AgentServer(
+        agent,
+        memory_factory=memory_factory,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        request_timeout=args.timeout,
+    )
+    tcp_server = await server.serve("127.0.0.1", 0)
+    port = tcp_server.sockets[0].getsockname()[1]
+
+    latencies, errors = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, i, args.turns, latencies, errors) for i in range(args.sessions)))
+    wall = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    metrics = await send_chat(reader, writer, {"command": "metrics"})
+    writer.close()
+    await server.stop()
+
+    latencies.sort()
+    print(
+        f"sessions={args.sessions} turns={args.turns} concurrency={args.max_concurrency} "
+        f"llm_latency={args.llm_latency}s"
+    )
+    print(
+        f"completed={len(latencies)} in {wall:.2f}s -> {len(latencies) / wall:.1f} req/s  "
+        f"p50={percentile(latencies, 50):.0f}ms p99={percentile(latencies, 99):.0f}ms"
+    )
+    print(
+        f"errors={errors or 0} max_queue_depth={metrics['max_queue_depth']} "
+        f"rejected={metrics['rejected']} timeouts={metrics['timeouts']} sessions={metrics['sessions']}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the async agent server with a fake LLM.")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--router", action="store_true", help="Put the intent router in front (needs the local index).")
+    asyncio.run(run(parser.parse_args()))
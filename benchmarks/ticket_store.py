@@ -0,0 +1,52 @@
+"""
+Ticket store throughput benchmark under concurrent callers.
+
+    python -m benchmarks.ticket_store --callers 32 --tickets 200
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ticket_store import TicketStore
+from tracing import percentile
+
+
+def run(callers, tickets_per_caller, max_batch):
+    path = os.path.join(tempfile.mkdtemp(prefix="ticket_bench_"), "tickets.db")
+    store = TicketStore(path, max_batch=max_batch)
+
+    def caller(caller_index):
+        latencies = []
+        for i in range(tickets_per_caller):
+            start = time.perf_counter()
+            store.create_ticket(f"Laptop {caller_index}-{i} does not boot", session_id=f"session-{caller_index}")
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        latencies = sorted(l for result in pool.map(caller, range(callers)) for l in result)
+    wall = time.perf_counter() - start
+
+    # A retry of an existing ticket must not create a new one.
+    retry_id, created = store.create_ticket("Laptop 0-0 does not boot!", session_id="session-0")
+    assert not created, "idempotency check failed"
+    store.close()
+
+    total = callers * tickets_per_caller
+    print(
+        f"max_batch={max_batch:<4} tickets={total:<6} {total / wall:10.0f} tickets/s  "
+        f"p50={percentile(latencies, 50):7.2f}ms p99={percentile(latencies, 99):7.2f}ms  "
+        f"commits={store.stats['commits']} (dedup check ok: {retry_id})"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent ticket creation.")
+    parser.add_argument("--callers", type=int, default=32)
+    parser.add_argument("--tickets", type=int, default=200, help="Tickets per caller.")
+    args = parser.parse_args()
+
+    run(args.callers, args.tickets, max_batch=1)
+    run(args.callers, args.tickets, max_batch=256)
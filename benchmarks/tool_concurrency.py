@@ -0,0 +1,78 @@
+"""
+Step latency of one agent turn whose model step emits several tool calls, run sequentially by the
+stock AgentExecutor and concurrently by ConcurrentToolAgentExecutor.
+
+    python -m benchmarks.tool_concurrency --tools 3 --tool-latency 0.2 --turns 5
+
+Uses the fake chat model and sleeping stand-in tools, so no API key or index is needed. Also checks
+that both executors return the same observations in the same order.
+"""
+import argparse
+import time
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import StructuredTool
+from concurrent_tools import ConcurrentToolAgentExecutor
+from fake_llm import FakeChatModel
+from tracing import percentile
+
+try:
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+except ImportError:
+    from langchain_classic.agents import AgentExecutor, create_tool_calling_agent
+
+
+def make_tool(index, latency):
+    def run(query: str) -> str:
+        time.sleep(latency)
+        return f"result {index} for {query}"
+
+    return StructuredTool.from_function(run, name=f"tool_{index}", description=f"Stand-in tool number {index}.")
+
+
+def make_responder(tool_count):
+    def respond(messages):
+        if isinstance(messages[-1], ToolMessage):
+            observations = [m.content for m in messages if isinstance(m, ToolMessage)]
+            return AIMessage(content=" | ".join(observations))
+        return AIMessage(content="", tool_calls=[
+            {"name": f"tool_{i}", "args": {"query": f"q{i}"}, "id": f"call-{i}"} for i in range(tool_count)
+        ])
+
+    return respond
+
+
+def run_turns(executor, turns):
+    latencies, outputs = [], []
+    for _ in range(turns):
+        start = time.perf_counter()
+        result = executor.invoke({"input": "question"})
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        outputs.append(result["output"])
+    latencies.sort()
+    return latencies, outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sequential and concurrent tool execution.")
+    parser.add_argument("--tools", type=int, default=3, help="Tool calls emitted in one model step.")
+    parser.add_argument("--tool-latency", type=float, default=0.2)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    tools = [make_tool(i, args.tool_latency) for i in range(args.tools)]
+    llm = FakeChatModel(responder=make_responder(args.tools))
+    prompt = ChatPromptTemplate.from_messages([("human", "{input}"), ("placeholder", "{agent_scratchpad}")])
+    agent = create_tool_calling_agent(llm, tools, prompt)
+
+    results = {}
+    for name, executor in (
+        ("sequential", AgentExecutor(agent=agent, tools=tools)),
+        ("concurrent", ConcurrentToolAgentExecutor(agent=agent, tools=tools, tool_timeout=10.0)),
+    ):
+        latencies, outputs = run_turns(executor, args.turns)
+        results[name] = outputs
+        print(f"{name:<11} p50={percentile(latencies, 50):7.1f}ms p99={percentile(latencies, 99):7.1f}ms")
+
+    print(f"ideal concurrent step: {args.tool_latency * 1000:.0f}ms, sequential: {args.tool_latency * args.tools * 1000:.0f}ms")
+    print(f"same observations in the same order: {results['sequential'] == results['concurrent']}")
@@ -0,0 +1,180 @@
+"""
+Vector-store benchmark: Chroma against the flat NumPy index (float32 and float16).
+
+    python -m benchmarks.vector_store --scales 10000,50000 --dim 384
+
+Stores seeded random unit vectors (no embedding model involved) in every backend, then queries
+them with noisy copies of stored vectors. For each backend it reports open time, on-disk size,
+RSS/PSS growth after opening and querying, single-query p50/p99, batched queries per second,
+p50 of source-filtered queries and recall@k against exact float32 search. Each backend is
+measured in a fresh process so memory numbers do not leak between them.
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from tracing import percentile
+
+BACKENDS = ("chroma", "flat-float32", "flat-float16")
+SOURCES = 50
+CHROMA_ADD_BATCH = 5000
+
+
+class LookupEmbeddings(Embeddings):
+    """
+    Returns the precomputed vector of each synthetic chunk, so Chroma ingests the same vectors.
+    """
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        return [self.vectors[int(text.rsplit(" ", 1)[1])].tolist() for text in texts]
+
+    def embed_query(self, text):
+        raise NotImplementedError("benchmark queries go by vector")
+
+
+def synthesize(n, dim, queries, seed=13):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    targets = rng.integers(0, n, size=queries)
+    query_vectors = vectors[targets] + 0.5 * rng.standard_normal((queries, dim)).astype(np.float32) / np.sqrt(dim)
+    return vectors, query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+
+
+def build_stores(work_dir, vectors):
+    from langchain_chroma import Chroma
+    from flat_vector_store import build_flat_vector_index, save_flat_vector_index
+
+    texts = [f"synthetic chunk {i}" for i in range(len(vectors))]
+    metadatas = [{"source": f"policy-{i % SOURCES}.md", "chunk_id": f"{i:08d}"} for i in range(len(vectors))]
+    timings = {}
+
+    for dtype in ("float32", "float16"):
+        start = time.perf_counter()
+        index = build_flat_vector_index(texts, vectors, metadatas, dtype=dtype)
+        save_flat_vector_index(index, os.path.join(work_dir, f"flat-{dtype}"))
+        timings[f"flat-{dtype}"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    db = Chroma(persist_directory=os.path.join(work_dir, "chroma"), embedding_function=LookupEmbeddings(vectors))
+    for i in range(0, len(texts), CHROMA_ADD_BATCH):
+        db.add_texts(texts[i:i + CHROMA_ADD_BATCH], metadatas[i:i + CHROMA_ADD_BATCH],
+                     ids=[m["chunk_id"] for m in metadatas[i:i + CHROMA_ADD_BATCH]])
+    timings["chroma"] = time.perf_counter() - start
+    return timings
+
+
+def directory_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 1e6
+
+
+def measure(backend, work_dir, query_vectors, exact_top, k, batch_size):
+    from prefork_server import read_process_memory
+
+    before = read_process_memory(os.getpid())
+    start = time.perf_counter()
+    if backend == "chroma":
+        from langchain_chroma import Chroma
+
+        store = Chroma(persist_directory=os.path.join(work_dir, "chroma"), embedding_function=LookupEmbeddings(None))
+        collection = store._collection
+
+        def search(vector, source_filter=None):
+            hits = store.similarity_search_by_vector_with_relevance_scores(vector.tolist(), k=k, filter=source_filter)
+            return [int(doc.page_content.rsplit(" ", 1)[1]) for doc, _ in hits]
+
+        def search_batch(vectors):
+            collection.query(query_embeddings=vectors.tolist(), n_results=k)
+    else:
+        from flat_vector_store import load_flat_vector_index
+
+        store = load_flat_vector_index(os.path.join(work_dir, backend))
+
+        def search(vector, source_filter=None):
+            return [row for row, _ in store.search_by_vector(vector, k, filter=source_filter)]
+
+        def search_batch(vectors):
+            store.search_by_vectors(vectors, k)
+    open_s = time.perf_counter() - start
+
+    latencies = []
+    recalls = []
+    for vector, exact in zip(query_vectors, exact_top):
+        t0 = time.perf_counter()
+        found = search(vector)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        recalls.append(len(set(found) & set(exact)) / k)
+    latencies.sort()
+
+    start = time.perf_counter()
+    for i in range(0, len(query_vectors), batch_size):
+        search_batch(query_vectors[i:i + batch_size])
+    batch_qps = len(query_vectors) / (time.perf_counter() - start)
+
+    filtered = []
+    for i, vector in enumerate(query_vectors):
+        t0 = time.perf_counter()
+        search(vector, {"source": f"policy-{i % SOURCES}.md"})
+        filtered.append((time.perf_counter() - t0) * 1000.0)
+    filtered.sort()
+
+    after = read_process_memory(os.getpid())
+    return {
+        "backend": backend,
+        "open_s": open_s,
+        "disk_mb": directory_mb(os.path.join(work_dir, backend)),
+        "rss_delta_mb": after["rss_mb"] - before["rss_mb"],
+        "pss_delta_mb": None if after["pss_mb"] is None else after["pss_mb"] - before["pss_mb"],
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "batch_qps": batch_qps,
+        "filtered_p50_ms": percentile(filtered, 50),
+        "recall": float(np.mean(recalls)),
+    }
+
+
+def run_scale(scale, args):
+    vectors, query_vectors = synthesize(scale, args.dim, args.queries)
+    exact_top = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :args.k]
+    work_dir = tempfile.mkdtemp(prefix="vector_store_bench_")
+    try:
+        build = build_stores(work_dir, vectors)
+        del vectors
+        context = multiprocessing.get_context("spawn")
+        print(f"\n{scale} vectors x {args.dim} dims, {args.queries} queries, k={args.k}")
+        for backend in BACKENDS:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                r = pool.submit(measure, backend, work_dir, query_vectors, exact_top, args.k, args.batch_size).result()
+            pss = "n/a" if r["pss_delta_mb"] is None else f"{r['pss_delta_mb']:.1f}MB"
+            print(
+                f"{backend:<13} build={build[backend]:6.2f}s open={r['open_s']:6.3f}s disk={r['disk_mb']:7.1f}MB "
+                f"rss+={r['rss_delta_mb']:7.1f}MB pss+={pss}  p50={r['p50_ms']:6.2f}ms p99={r['p99_ms']:6.2f}ms "
+                f"batch={r['batch_qps']:8.1f} q/s  filtered p50={r['filtered_p50_ms']:6.2f}ms  "
+                f"recall@{args.k}={r['recall']:.3f}"
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare Chroma and the flat NumPy vector index.")
+    parser.add_argument("--scales", default="10000,50000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    for scale in (int(s) for s in args.scales.split(",")):
+        run_scale(scale, args)
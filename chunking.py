@@ -0,0 +1,306 @@
+import os
+import re
+from langchain_core.documents import Document
+from tokens import count_tokens
+from ingest_manifest import hash_text, make_chunk_id
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Budget in cl100k tokens, heading prefix included. MiniLM truncates at 256 WordPiece tokens
+# ([CLS]/[SEP] included) and WordPiece splits policy text more finely than cl100k, so chunks keep
+# headroom to be embedded in full.
+CHUNK_TOKENS = 200
+# Only applied when an oversized section has to be split; section boundaries never overlap.
+CHUNK_OVERLAP_TOKENS = 32
+CHUNKING_SIGNATURE = f"markdown-sections/{CHUNK_TOKENS}/{CHUNK_OVERLAP_TOKENS}"
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("LOOKUP_CONTEXT_TOKENS", "600"))
+# Consecutive chunks are separated only by whitespace, so hits this close in the source are joined.
+MERGE_GAP_CHARS = 8
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+# Coarse to fine; the last resort is a hard cut.
+SEPARATORS = [r"\n[ \t]*\n", r"\n", r"(?<=[.!?;:])[ \t]+", r"[ \t]+"]
+
+
+def split_sections(text):
+    """
+    Returns (heading_path, start, end) for each heading-delimited section, including any
+    preamble before the first heading. Text without Markdown headings is one section.
+    """
+    sections = []
+    headings = list(HEADING_PATTERN.finditer(text))
+    if not headings or headings[0].start() > 0:
+        sections.append(("", 0, headings[0].start() if headings else len(text)))
+
+    path = []
+    for i, match in enumerate(headings):
+        level = len(match.group(1))
+        path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, match.group(2).strip())]
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(text)
+        sections.append((" > ".join(title for _, title in path), match.start(), end))
+    return sections
+
+
+def _split_span(text, start, end, max_tokens, level=0):
+    """
+    Splits text[start:end] into consecutive spans of at most max_tokens, preferring paragraph,
+    then line, then sentence, then word boundaries.
+    """
+    if count_tokens(text[start:end]) <= max_tokens:
+        return [(start, end)]
+    if level >= len(SEPARATORS):
+        step = max(1, max_tokens * 4)
+        return [(s, min(s + step, end)) for s in range(start, end, step)]
+
+    spans = []
+    cursor = start
+    for match in re.compile(SEPARATORS[level]).finditer(text, start, end):
+        if match.end() > cursor:
+            spans.append((cursor, match.end()))
+            cursor = match.end()
+    if cursor < end:
+        spans.append((cursor, end))
+
+    result = []
+    for s, e in spans:
+        result.extend(_split_span(text, s, e, max_tokens, level + 1))
+    return result
+
+
+def _strip_span(text, start, end):
+    segment = text[start:end]
+    start += len(segment) - len(segment.lstrip())
+    end -= len(segment) - len(segment.rstrip())
+    return start, end
+
+
+def _pack(text, units, max_tokens, overlap_tokens):
+    """
+    Greedily packs consecutive unit spans into chunk spans of at most max_tokens,
+    repeating up to overlap_tokens of trailing units at the start of the next chunk.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in units:
+        tokens = count_tokens(text[unit[0]:unit[1]])
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append((current[0][0], current[-1][1]))
+            carried = []
+            carried_tokens = 0
+            for prev in reversed(current):
+                prev_tokens = count_tokens(text[prev[0]:prev[1]])
+                if carried_tokens + prev_tokens > overlap_tokens:
+                    break
+                carried.insert(0, prev)
+                carried_tokens += prev_tokens
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += tokens
+    if current:
+        chunks.append((current[0][0], current[-1][1]))
+    return chunks
+
+
+def chunk_text(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Returns (start, end, section, prefix) chunk specs for one document's text.
+
+    Consecutive small sections are packed together up to max_tokens; a section is only split
+    when it alone exceeds the budget, and continuation chunks of a split section are prefixed
+    with its heading path so they stay findable.
+    """
+    specs = []
+    pending = None  # [start, end, section, tokens] of sections being packed together
+
+    for section, start, end in split_sections(text):
+        start, end = _strip_span(text, start, end)
+        if start >= end:
+            continue
+        tokens = count_tokens(text[start:end])
+        if tokens <= max_tokens:
+            if pending and pending[3] + tokens <= max_tokens:
+                pending[1], pending[3] = end, pending[3] + tokens
+            else:
+                if pending:
+                    specs.append((pending[0], pending[1], pending[2], ""))
+                pending = [start, end, section, tokens]
+            continue
+
+        if pending:
+            specs.append((pending[0], pending[1], pending[2], ""))
+            pending = None
+        prefix = f"{section}\n" if section else ""
+        budget = max(1, max_tokens - count_tokens(prefix))
+        units = [_strip_span(text, s, e) for s, e in _split_span(text, start, end, budget)]
+        units = [(s, e) for s, e in units if s < e]
+        for i, (s, e) in enumerate(_pack(text, units, budget, overlap_tokens)):
+            specs.append((s, e, section, prefix if i else ""))
+    if pending:
+        specs.append((pending[0], pending[1], pending[2], ""))
+    return specs
+
+
+def split_documents(documents, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Heading-aware, token-sized replacement for RecursiveCharacterTextSplitter.split_documents.
+    Each chunk records its character span in the source (start_index/end_index) and its section.
+    """
+    chunks = []
+    for document in documents:
+        text = document.page_content
+        for start, end, section, prefix in chunk_text(text, max_tokens, overlap_tokens):
+            metadata = dict(document.metadata)
+            metadata.update({"start_index": start, "end_index": end, "section": section})
+            if prefix:
+                metadata["prefix_len"] = len(prefix)
+            chunks.append(Document(page_content=prefix + text[start:end], metadata=metadata))
+    return chunks
+
+
+def chunk_documents(documents):
+    """
+    Splits loaded documents into heading-aware, token-sized chunks and stamps their chunk ids.
+    """
+    try:
+        if not documents:
+            logger.warning("Skipping chunking process because no documents were provided.")
+            return []
+
+        logger.info("Starting text splitting process.")
+        
+        chunks = split_documents(documents)
+        assign_chunk_ids(chunks)
+        logger.info(f"Split {len(documents)} documents into {len(chunks)} chunks.")
+        return chunks
+
+    except Exception as e:
+        logger.error(f"Failed to chunk documents. Error: {str(e)}", exc_info=True)
+        return []
+
+
+def assign_chunk_ids(chunks):
+    """
+    Stamps every chunk with a stable chunk_id and a content chunk_hash in its metadata.
+    """
+    positions = {}
+    for chunk in chunks:
+        source = chunk.metadata.get("source", "")
+        index = positions.get(source, 0)
+        positions[source] = index + 1
+        chunk.metadata["chunk_id"] = make_chunk_id(source, index)
+        chunk.metadata["chunk_hash"] = hash_text(chunk.page_content)
+    return chunks
+
+
+def _text_overlap(left, right, min_chars=40, max_chars=400):
+    for n in range(min(len(left), len(right), max_chars), min_chars - 1, -1):
+        if left.endswith(right[:n]):
+            return n
+    return 0
+
+
+def merge_hits(docs):
+    """
+    Collapses retrieved chunks into non-redundant blocks: duplicates are dropped and hits that
+    overlap or touch in the same document are joined. Blocks keep the rank of their best hit.
+    Offsets count from the start of each loaded document (a PDF page, for instance), so hits are
+    grouped by source and page before their offsets are compared.
+    Chunks without offsets (older indexes) are joined when their texts overlap.
+    """
+    by_document = {}
+    legacy = []
+    seen = set()
+    for rank, doc in enumerate(docs):
+        key = doc.metadata.get("chunk_id") or hash_text(doc.page_content)
+        if key in seen:
+            continue
+        seen.add(key)
+        if doc.metadata.get("start_index") is not None and doc.metadata.get("end_index") is not None:
+            document_key = (doc.metadata.get("source", ""), doc.metadata.get("page"))
+            by_document.setdefault(document_key, []).append((rank, doc))
+        else:
+            legacy.append((rank, doc))
+
+    blocks = []
+    for (source, _), hits in by_document.items():
+        hits.sort(key=lambda hit: hit[1].metadata["start_index"])
+        current = None
+        for rank, doc in hits:
+            start, end = doc.metadata["start_index"], doc.metadata["end_index"]
+            body = doc.page_content[doc.metadata.get("prefix_len", 0):]
+            if current and start <= current["end"] + MERGE_GAP_CHARS:
+                if end > current["end"]:
+                    cut = current["end"] - start
+                    current["text"] += body[cut:] if cut >= 0 else "\n" + body
+                    current["end"] = end
+                current["rank"] = min(current["rank"], rank)
+                current["chunks"] += 1
+            else:
+                if current:
+                    blocks.append(current)
+                current = {"rank": rank, "text": doc.page_content, "end": end, "source": source,
+                           "section": doc.metadata.get("section", ""), "chunks": 1}
+        if current:
+            blocks.append(current)
+
+    legacy_blocks = []
+    for rank, doc in legacy:
+        source = doc.metadata.get("source", "")
+        for block in legacy_blocks:
+            if block["source"] != source:
+                continue
+            overlap = _text_overlap(block["text"], doc.page_content)
+            if overlap:
+                block["text"] += doc.page_content[overlap:]
+            else:
+                overlap = _text_overlap(doc.page_content, block["text"])
+                if not overlap:
+                    continue
+                block["text"] = doc.page_content + block["text"][overlap:]
+            block["chunks"] += 1
+            break
+        else:
+            legacy_blocks.append({"rank": rank, "text": doc.page_content, "source": source,
+                                  "section": doc.metadata.get("section", ""), "chunks": 1})
+
+    blocks.extend(legacy_blocks)
+    blocks.sort(key=lambda block: block["rank"])
+    return [
+        Document(page_content=b["text"], metadata={"source": b["source"], "section": b["section"], "merged_chunks": b["chunks"]})
+        for b in blocks
+    ]
+
+
+def trim_to_tokens(text, max_tokens):
+    """
+    Cuts text at a word boundary so it fits in max_tokens (marked with a trailing ellipsis).
+    """
+    if max_tokens <= 0:
+        return ""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    cut = int(len(text) * max_tokens / tokens)
+    while cut > 0 and count_tokens(text[:cut]) >= max_tokens:
+        cut = int(cut * 0.9)
+    trimmed = text[:cut].rsplit(None, 1)[0] if " " in text[:cut] else text[:cut]
+    return f"{trimmed}…" if trimmed else ""
+
+
+def build_context(docs, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Merges retrieved chunks and packs them, best first, into at most token_budget tokens.
+    """
+    parts = []
+    used = 0
+    for block in merge_hits(docs):
+        remaining = token_budget - used
+        text = trim_to_tokens(block.page_content, remaining)
+        if not text:
+            break
+        parts.append(text)
+        used += count_tokens(text)
+    return "\n\n".join(parts)
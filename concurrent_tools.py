@@ -0,0 +1,200 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+try:
+    from langchain.agents import AgentExecutor
+except ImportError:
+    from langchain_classic.agents import AgentExecutor
+
+from langchain_core.agents import AgentAction, AgentStep
+from pydantic import PrivateAttr
+from logger import setup_logger
+from tracing import span
+
+logger = setup_logger(__name__)
+
+TOOL_POOL_WORKERS = int(os.getenv("AGENT_TOOL_WORKERS", "8"))
+
+_pool_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+# Actions of the agent step currently being executed (set by _iter_next_step).
+_current_batch = contextvars.ContextVar("tool_batch", default=None)
+
+
+def _tool_pool():
+    """
+    Shared bounded pool for tool calls, recreated after a fork so children never inherit dead threads.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=TOOL_POOL_WORKERS, thread_name_prefix="agent-tool")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+class _ToolBatch:
+    def __init__(self):
+        self.actions = []
+        self.results = None
+        self.served = 0
+
+
+class ConcurrentToolAgentExecutor(AgentExecutor):
+    """
+    AgentExecutor that runs all tool calls the model emits in one step concurrently, so a step
+    takes as long as its slowest tool rather than the sum of all of them.
+
+    Calls go to a bounded shared thread pool and observations come back in the order the model
+    emitted the calls. Tools listed in `serial_tools` (side effects, e.g. ticket creation) run one
+    after another in call order, alongside the parallel ones; on the async path they are serialized
+    across all steps of this executor. A call still unfinished when its timeout (`tool_timeouts[name]`,
+    else `tool_timeout`) expires is abandoned: its observation becomes an error message the model can
+    react to, and a call that has not started yet is cancelled. Side-effecting tools never overlap:
+    serial calls after a timed-out serial call in the same step are not started, and on the async
+    path the serial lock is held until a timed-out call has really finished.
+    """
+
+    tool_timeout: Optional[float] = None
+    tool_timeouts: Dict[str, float] = {}
+    serial_tools: List[str] = []
+
+    _async_serial_lock: Any = PrivateAttr(default=None)
+
+    def _timeout_for(self, tool_name):
+        return self.tool_timeouts.get(tool_name, self.tool_timeout)
+
+    def _timed_out(self, agent_action, timeout):
+        logger.warning(f"Tool {agent_action.tool} timed out after {timeout}s; returning an error observation.")
+        return AgentStep(action=agent_action, observation=f"Error: {agent_action.tool} timed out after {timeout}s.")
+
+    def _skipped(self, agent_action, running_tool):
+        logger.warning(f"Not running {agent_action.tool}: serial tool {running_tool} is still running after its timeout.")
+        return AgentStep(
+            action=agent_action,
+            observation=f"Error: {agent_action.tool} was not run because {running_tool} timed out and may still be running.",
+        )
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        # The base class yields every action of the step before it performs the first one, so by
+        # the time _perform_agent_action is called the batch below holds the whole step.
+        batch = _ToolBatch()
+        token = _current_batch.set(batch)
+        try:
+            for item in super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager):
+                if isinstance(item, AgentAction):
+                    batch.actions.append(item)
+                yield item
+        finally:
+            _current_batch.reset(token)
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        batch = _current_batch.get()
+        if batch is None or batch.served >= len(batch.actions) or batch.actions[batch.served] is not agent_action:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        if batch.results is None:
+            batch.results = self._run_batch(name_to_tool_map, color_mapping, batch.actions, run_manager)
+        batch.served += 1
+        return batch.results[batch.served - 1]
+
+    def _run_batch(self, name_to_tool_map, color_mapping, actions, run_manager):
+        """
+        Runs the step's actions and returns their AgentSteps in call order.
+        """
+        perform = super()._perform_agent_action
+        pool = _tool_pool()
+
+        def submit(action):
+            return pool.submit(
+                contextvars.copy_context().run, perform, name_to_tool_map, color_mapping, action, run_manager
+            )
+
+        def collect(action, future, deadline):
+            timeout = self._timeout_for(action.tool)
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                return future.result(timeout=remaining)
+            except FutureTimeoutError:
+                future.cancel()
+                return self._timed_out(action, timeout)
+
+        start = time.perf_counter()
+        results = [None] * len(actions)
+        with span("agent.tool_batch", tools=[a.tool for a in actions]):
+            parallel = {}
+            try:
+                for i, action in enumerate(actions):
+                    if action.tool not in self.serial_tools:
+                        timeout = self._timeout_for(action.tool)
+                        parallel[i] = (submit(action), None if timeout is None else time.monotonic() + timeout)
+
+                # Serial tools run here, in call order, while the parallel ones are in flight. A timed-out
+                # call cannot be stopped once it runs, so the serial calls after it are not started.
+                stuck = None
+                for i, action in enumerate(actions):
+                    if action.tool not in self.serial_tools:
+                        continue
+                    if stuck is not None:
+                        results[i] = self._skipped(action, stuck)
+                        continue
+                    timeout = self._timeout_for(action.tool)
+                    future = submit(action)
+                    results[i] = collect(action, future, None if timeout is None else time.monotonic() + timeout)
+                    if not future.done():
+                        stuck = action.tool
+
+                for i, (future, deadline) in parallel.items():
+                    results[i] = collect(actions[i], future, deadline)
+            except BaseException:
+                for future, _ in parallel.values():
+                    future.cancel()
+                raise
+
+        if len(actions) > 1:
+            logger.info(
+                f"Ran {len(actions)} tool calls in one step in {(time.perf_counter() - start) * 1000:.1f}ms "
+                f"({', '.join(a.tool for a in actions)})"
+            )
+        return results
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        # The async base class already gathers a step's calls concurrently; add timeouts and serial tools.
+        timeout = self._timeout_for(agent_action.tool)
+        call = super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        if agent_action.tool not in self.serial_tools:
+            try:
+                return await asyncio.wait_for(call, timeout)
+            except asyncio.TimeoutError:
+                return self._timed_out(agent_action, timeout)
+
+        loop = asyncio.get_running_loop()
+        # asyncio locks belong to one event loop; keep one per loop.
+        if self._async_serial_lock is None or self._async_serial_lock[0] is not loop:
+            self._async_serial_lock = (loop, asyncio.Lock())
+        lock = self._async_serial_lock[1]
+        deadline = None if timeout is None else loop.time() + timeout
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            call.close()
+            return self._timed_out(agent_action, timeout)
+        task = asyncio.ensure_future(call)
+        try:
+            remaining = None if deadline is None else max(0.0, deadline - loop.time())
+            return await asyncio.wait_for(asyncio.shield(task), remaining)
+        except asyncio.TimeoutError:
+            # A sync tool keeps running in its thread; hold the lock until it really finishes so
+            # the next serial call cannot overlap it.
+            return self._timed_out(agent_action, timeout)
+        finally:
+            if task.done():
+                lock.release()
+            else:
+                task.add_done_callback(lambda _: lock.release())
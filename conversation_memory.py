@@ -0,0 +1,132 @@
+import re
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from logger import setup_logger
+from tokens import count_message_tokens, count_tokens
+
+logger = setup_logger(__name__)
+
+EMPLOYEE_ID_PATTERNS = [
+    re.compile(r"\bEMP[-\s]?(\d+)\b", re.IGNORECASE),
+    re.compile(r"\bemployee\s*(?:id|number|#)?\s*(?:is|:)?\s*(\d{2,})\b", re.IGNORECASE),
+    re.compile(r"\bmy\s+id\s*(?:is|:)?\s*(\d{2,})\b", re.IGNORECASE),
+]
+
+# Pronouns and "what about" lean on earlier turns; such a question means something else in another conversation.
+FOLLOW_UP_PATTERN = re.compile(r"\b(it|that|this|those|them|they|what about)\b", re.IGNORECASE)
+
+SUMMARY_PROMPT = """Update the running summary of an HR support conversation.
+Keep decisions, policy facts already given, open requests and ticket numbers. Be brief (max 120 words).
+
+CURRENT SUMMARY:
+{summary}
+
+NEW TURNS:
+{turns}
+
+UPDATED SUMMARY:"""
+
+
+def is_follow_up(query, chat_history):
+    """
+    True when the query probably refers back to earlier turns of a non-empty history.
+    """
+    return bool(chat_history) and bool(FOLLOW_UP_PATTERN.search(query))
+
+
+def extract_facts(text):
+    """
+    Pulls facts worth pinning for the whole session out of a message (currently the employee ID).
+    """
+    facts = {}
+    for pattern in EMPLOYEE_ID_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            facts["employee_id"] = f"EMP-{match.group(1)}"
+            break
+    return facts
+
+
+class ConversationMemory:
+    """
+    Chat history held within a token budget.
+
+    The most recent turns are kept verbatim. When the history exceeds `token_budget`, older
+    turns are folded into a running summary, written by `summarizer_llm` if given or built
+    extractively otherwise. Facts such as the employee ID are pinned and re-sent every turn,
+    so the agent can still "look for an ID in past messages" after those messages are compacted.
+    """
+
+    def __init__(self, token_budget=1500, keep_recent_turns=3, summarizer_llm=None, max_summary_tokens=300):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.summarizer_llm = summarizer_llm
+        self.max_summary_tokens = max_summary_tokens
+        self.turns = []
+        self.summary = ""
+        self.facts = {}
+
+    def add_turn(self, user_input, output_text):
+        self.facts.update(extract_facts(user_input))
+        self.turns.append((user_input, output_text))
+        self._compact()
+
+    def messages(self):
+        """
+        History to pass as chat_history: one pinned system message, then the recent turns.
+        """
+        messages = []
+        pinned = []
+        if self.facts:
+            pinned.append("Known facts: " + "; ".join(f"{k}={v}" for k, v in sorted(self.facts.items())))
+        if self.summary:
+            pinned.append(f"Earlier conversation summary: {self.summary}")
+        if pinned:
+            messages.append(SystemMessage(content="\n".join(pinned)))
+        for user_input, output_text in self.turns:
+            messages.append(HumanMessage(content=user_input))
+            messages.append(AIMessage(content=output_text))
+        return messages
+
+    def token_count(self):
+        return count_message_tokens(self.messages())
+
+    def _compact(self):
+        if self.token_count() <= self.token_budget:
+            return
+
+        # Fold everything older than the recent window in one summarization call.
+        keep = max(1, min(self.keep_recent_turns, len(self.turns)))
+        old_turns, self.turns = self.turns[:-keep], self.turns[-keep:]
+        if old_turns:
+            self.summary = self._summarize(old_turns)
+
+        # Long recent turns can still overflow; fold them one by one, always keeping the latest.
+        while self.token_count() > self.token_budget and len(self.turns) > 1:
+            self.summary = self._summarize([self.turns.pop(0)])
+
+        logger.info(
+            f"Compacted conversation memory: {len(self.turns)} verbatim turns, "
+            f"{count_tokens(self.summary)} summary tokens, {self.token_count()} total tokens."
+        )
+
+    def _summarize(self, turns):
+        rendered = "\n".join(f"User: {u}\nAssistant: {a}" for u, a in turns)
+        if self.summarizer_llm is not None:
+            try:
+                response = self.summarizer_llm.invoke(
+                    SUMMARY_PROMPT.format(summary=self.summary or "(none)", turns=rendered)
+                )
+                return self._clip(str(response.content).strip())
+            except Exception as e:
+                logger.warning(f"Summarizer failed, falling back to extractive summary: {e}")
+
+        lines = [self.summary] if self.summary else []
+        for user_input, output_text in turns:
+            lines.append(f"User asked: {user_input[:160]} / Assistant: {output_text[:200]}")
+        return self._clip(" | ".join(lines))
+
+    def _clip(self, summary):
+        # Keep the most recent part of the summary when it outgrows its own budget.
+        while count_tokens(summary) > self.max_summary_tokens and len(summary) > 40:
+            summary = "…" + summary[len(summary) // 4:]
+        return summary
@@ -0,0 +1,141 @@
+import glob
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from langchain_core.documents import Document
+from chunking import CHUNKING_SIGNATURE
+from ingest_manifest import corpus_fingerprint
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+DIRECTORY_PATH = "./Knowledge-base"
+SUPPORTED_PATTERNS = ["**/*.md", "**/*.txt", "**/*.pdf", "**/*.docx"]
+
+
+def _load_text(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [Document(page_content=f.read(), metadata={"source": path})]
+
+
+def _load_pdf(path):
+    from langchain_community.document_loaders import PyPDFLoader
+
+    return PyPDFLoader(path).load()
+
+
+def _load_docx(path):
+    from langchain_community.document_loaders import Docx2txtLoader
+
+    return Docx2txtLoader(path).load()
+
+
+LOADERS = {
+    ".md": _load_text,
+    ".txt": _load_text,
+    ".pdf": _load_pdf,
+    ".docx": _load_docx,
+}
+
+
+def discover_files(directory_path, patterns=SUPPORTED_PATTERNS):
+    """
+    Returns the sorted list of supported knowledge-base files under directory_path.
+    """
+    paths = set()
+    for pattern in patterns:
+        paths.update(glob.glob(os.path.join(directory_path, pattern), recursive=True))
+    return sorted(os.path.normpath(p) for p in paths if os.path.isfile(p))
+
+
+def parse_file(path):
+    """
+    Parses one file with the loader for its extension.
+    Returns (path, documents, seconds, error); runs inside worker processes.
+    """
+    start = time.perf_counter()
+    try:
+        loader = LOADERS.get(os.path.splitext(path)[1].lower())
+        if loader is None:
+            raise ValueError(f"Unsupported file type: {path}")
+        documents = [d for d in loader(path) if d.page_content.strip()]
+        for document in documents:
+            document.metadata["source"] = path
+        return path, documents, time.perf_counter() - start, None
+    except Exception as e:
+        return path, [], time.perf_counter() - start, f"{type(e).__name__}: {e}"
+
+
+def iter_documents(paths, workers=None):
+    """
+    Yields (path, documents, error) per file as soon as it is parsed.
+    With more than one worker, files are parsed in a process pool with at most 2 * workers
+    files in flight, so memory stays bounded regardless of corpus size. Failed files are
+    logged and yielded with an error message and no documents; a file that parsed but has no
+    text comes back with error None and no documents.
+    """
+    workers = workers or os.cpu_count() or 1
+    paths = list(paths)
+
+    def report(result):
+        path, documents, elapsed, error = result
+        if error:
+            logger.error(f"Failed to parse {path} after {elapsed:.2f}s: {error}")
+        else:
+            logger.info(f"Parsed {path}: {len(documents)} documents in {elapsed:.2f}s")
+        return path, documents, error
+
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield report(parse_file(path))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        remaining = iter(paths)
+        for path in remaining:
+            pending.add(pool.submit(parse_file, path))
+            if len(pending) >= 2 * workers:
+                break
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield report(future.result())
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    pending.add(pool.submit(parse_file, next_path))
+
+
+def kb_fingerprint(directory_path=DIRECTORY_PATH):
+    """
+    Fingerprint of the knowledge-base files and chunking settings, used to detect stale indexes.
+    """
+    return corpus_fingerprint(directory_path, SUPPORTED_PATTERNS, extra=CHUNKING_SIGNATURE)
+
+
+def load_document(directory_path=DIRECTORY_PATH, workers=None):
+    """
+    Loads all supported documents (Markdown, text, PDF, DOCX) from the defined directory.
+    """
+    try:
+        logger.info(f"Starting document loading from: {directory_path}")
+        
+        if not os.path.exists(directory_path):
+            logger.error(f"Directory path does not exist: {directory_path}")
+            return None
+
+        documents = []
+        for _, file_documents, _ in iter_documents(discover_files(directory_path), workers):
+            documents.extend(file_documents)
+
+        if not documents:
+            logger.warning("No documents were found in the specified directory.")
+            return None
+            
+        logger.info(f"Successfully loaded {len(documents)} documents.")
+        return documents
+
+    except Exception as e:
+        logger.error(f"Failed to load documents. Error: {str(e)}", exc_info=True)
+        return None
@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from ingest_manifest import hash_text, load_manifest
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_CACHE_PATH = "./embedding_cache/embeddings.sqlite"
+# torch: sentence-transformers on PyTorch; onnx: int8-quantized ONNX export (onnx_embeddings.py).
+EMBEDDING_BACKENDS = ("torch", "onnx")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+
+def embedding_model_id(backend=EMBEDDING_BACKEND):
+    """
+    Identity of the vectors a backend produces; used as the cache key and recorded in the manifest.
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return EMBEDDING_MODEL_NAME if backend == "torch" else f"{EMBEDDING_MODEL_NAME}:onnx-int8"
+
+
+def index_embedding_backend(db_path):
+    """
+    Backend the vector index at db_path was built with (indexes built before backends existed are torch).
+    Returns None if there is no index yet.
+    """
+    manifest = load_manifest(db_path) if db_path else None
+    if manifest is None:
+        return None
+    return manifest.get("embedding", {}).get("backend", "torch")
+
+
+def load_embedding_model(batch_size=32, num_threads=None, multi_process=False, device="cpu", backend=None):
+    """
+    Builds the embedding model for the selected backend (EMBEDDING_BACKEND by default) with explicit
+    batch size and thread settings. multi_process spreads torch encoding over a sentence-transformers
+    process pool (large corpora only); the ONNX backend ignores it and never imports torch.
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "onnx":
+        from onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings(batch_size=batch_size, num_threads=num_threads)
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    if num_threads:
+        import torch
+
+        torch.set_num_threads(num_threads)
+        logger.info(f"Torch intra-op threads set to {num_threads}")
+
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        model_kwargs={"device": device},
+        encode_kwargs={"batch_size": batch_size},
+        multi_process=multi_process,
+    )
+
+
+def load_query_embedding_model(db_path, **kwargs):
+    """
+    Loads the embedding model matching the backend recorded in the index at db_path, so queries are
+    always embedded like the stored chunks. Falls back to EMBEDDING_BACKEND when there is no index.
+    """
+    backend = index_embedding_backend(db_path) or EMBEDDING_BACKEND
+    if backend != EMBEDDING_BACKEND:
+        logger.warning(
+            f"EMBEDDING_BACKEND={EMBEDDING_BACKEND} but the index at {db_path} was built with "
+            f"'{backend}'; using '{backend}'. Re-ingest to switch backends."
+        )
+    return load_embedding_model(backend=backend, **kwargs)
+
+
+class EmbeddingCache:
+    """
+    Persistent vector cache in SQLite, keyed by (model name, text hash).
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model, text_hashes):
+        found = {}
+        unique = list(dict.fromkeys(text_hashes))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                )
+                for text_hash, blob in rows:
+                    found[text_hash] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model, items):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, text_hash, np.asarray(vector, dtype=np.float32).tobytes()) for text_hash, vector in items],
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document vectors from an EmbeddingCache and only
+    sends unseen texts to the underlying model. Logs throughput for each call.
+    """
+
+    def __init__(self, base, model_name=EMBEDDING_MODEL_NAME, cache=None, backend="torch"):
+        self.base = base
+        self.model_name = model_name
+        self.cache = cache
+        self.backend = backend
+
+    def embed_documents(self, texts):
+        start = time.perf_counter()
+        hashes = [hash_text(text) for text in texts]
+        cached = self.cache.get_many(self.model_name, hashes) if self.cache else {}
+
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        if missing:
+            vectors = self.base.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            if self.cache:
+                self.cache.put_many(self.model_name, computed.items())
+            cached.update(computed)
+
+        elapsed = time.perf_counter() - start
+        rate = len(texts) / elapsed if elapsed > 0 else float("inf")
+        logger.info(
+            f"Embedded {len(texts)} chunks ({len(texts) - len(missing)} from cache, "
+            f"{len(missing)} computed) in {elapsed:.2f}s ({rate:.1f} chunks/s)"
+        )
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
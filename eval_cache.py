@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from ingest_manifest import hash_text
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+EVAL_CACHE_PATH = os.getenv("EVAL_CACHE_PATH", "./data/eval_cache.db")
+
+
+def combine_fingerprints(*parts):
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+
+def grade_key(question, answer, ground_truth, grader_fingerprint):
+    """
+    Cache key of one grading call: question, answer hash, ground truth and the grader prompt/model.
+    """
+    return combine_fingerprints(question, hash_text(answer), ground_truth, grader_fingerprint)
+
+
+def case_key(case):
+    return combine_fingerprints(case["category"], case["question"], case["ground_truth"])
+
+
+class EvalCache:
+    """
+    SQLite store for evaluation results.
+
+    `grades` maps a grade_key to a score, so an unchanged answer is never re-graded.
+    `results` keeps the last full result row of every test case together with the fingerprint
+    of what produced it (prompt, index, ...); incremental runs reuse rows whose fingerprint
+    still matches.
+    """
+
+    def __init__(self, path=EVAL_CACHE_PATH):
+        self.path = path
+        self.stats = {"grade_hits": 0, "grade_misses": 0, "reused_cases": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS grades (key TEXT PRIMARY KEY, score INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "case_key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, row TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_grade(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT score FROM grades WHERE key = ?", (key,)).fetchone()
+            self.stats["grade_hits" if row else "grade_misses"] += 1
+        return row[0] if row else None
+
+    def put_grade(self, key, score):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO grades (key, score, created_at) VALUES (?, ?, ?)", (key, score, time.time())
+            )
+
+    def get_result(self, key, fingerprint):
+        """
+        Returns the stored result row for a case if it was produced under the same fingerprint.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT row FROM results WHERE case_key = ? AND fingerprint = ?", (key, fingerprint)
+            ).fetchone()
+            if row:
+                self.stats["reused_cases"] += 1
+        return json.loads(row[0]) if row else None
+
+    def put_result(self, key, fingerprint, row):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (case_key, fingerprint, row, created_at) VALUES (?, ?, ?, ?)",
+                (key, fingerprint, json.dumps(row), time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,59 @@
+"""
+Exports all-MiniLM-L6-v2 to ONNX and quantizes it to int8 for the "onnx" embedding backend.
+
+    python export_onnx_model.py [--output ./models/all-MiniLM-L6-v2-onnx-int8]
+
+Needs torch, transformers, onnx and onnxruntime at export time only; serving needs just
+onnxruntime and tokenizers.
+"""
+import argparse
+import os
+from embeddings import EMBEDDING_MODEL_NAME
+from logger import setup_logger
+from onnx_embeddings import MAX_SEQ_LENGTH, ONNX_MODEL_DIR, ONNX_MODEL_FILE
+
+logger = setup_logger(__name__)
+
+
+def export(output_dir=ONNX_MODEL_DIR, opset=14):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+    model = AutoModel.from_pretrained(EMBEDDING_MODEL_NAME).eval()
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["example sentence"], padding=True, truncation=True,
+                       max_length=MAX_SEQ_LENGTH, return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    float_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            float_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    quantized_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    quantize_dynamic(float_path, quantized_path, weight_type=QuantType.QInt8)
+    logger.info(
+        f"Exported {EMBEDDING_MODEL_NAME} to {quantized_path} "
+        f"({os.path.getsize(float_path) / 1e6:.1f} MB float32 -> {os.path.getsize(quantized_path) / 1e6:.1f} MB int8)"
+    )
+    return quantized_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the embedding model to int8-quantized ONNX.")
+    parser.add_argument("--output", default=ONNX_MODEL_DIR)
+    args = parser.parse_args()
+    print(f"Quantized model written to {export(args.output)}")
@@ -0,0 +1,75 @@
+import itertools
+import json
+import re
+import threading
+import time
+from typing import Any, Callable, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatGoogleGenerativeAI, used for evaluation, load tests and streaming checks.
+
+    Replies come from `responder(messages)` if given, otherwise the `responses` list is cycled.
+    With neither, a tool result is echoed back as the final answer and anything else gets a canned reply.
+    `latency` simulates the time to first token and `token_delay` the gap between streamed tokens.
+    """
+
+    responses: List[Any] = []
+    responder: Optional[Callable] = None
+    latency: float = 0.0
+    token_delay: float = 0.0
+
+    _cycle: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _respond(self, messages):
+        if self.responder is not None:
+            reply = self.responder(messages)
+        elif self.responses:
+            with self._lock:
+                if self._cycle is None:
+                    self._cycle = itertools.cycle(self.responses)
+                reply = next(self._cycle)
+        elif messages and isinstance(messages[-1], ToolMessage):
+            reply = str(messages[-1].content)
+        else:
+            question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            reply = f"This is an offline answer to: {question}"
+        return reply if isinstance(reply, AIMessage) else AIMessage(content=str(reply))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._respond(messages))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        message = self._respond(messages)
+
+        for token in re.findall(r"\S+\s*|\s+", str(message.content)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            time.sleep(self.token_delay)
+
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": call.get("id"), "index": i}
+                    for i, call in enumerate(message.tool_calls)
+                ],
+            ))
+
@@ -0,0 +1,351 @@
+import json
+import os
+import re
+import shutil
+import threading
+import numpy as np
+from chunking import HEADING_PATTERN
+from flat_vector_store import normalize_rows
+from ingest_manifest import file_sha256
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+FAQ_INDEX_DIR_NAME = "faq_index"
+FAQ_INDEX_FORMAT_VERSION = 1
+# headings: questions templated from Markdown headings and "**Label:** fact" lines (no LLM);
+# llm: questions and answers written by the chat model (honours LLM_CACHE_MODE, so it can be replayed).
+FAQ_GENERATORS = ("headings", "llm")
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.85"))
+FAQ_QUESTIONS_PER_CHUNK = 5
+
+CITATION_MARKUP = re.compile(r"\[cite_start\]|\[cite:[^\]]*\]")
+LABELLED_FACT = re.compile(
+    r"^[ \t]*(?:[*+-]|\d+\.)?[ \t]*\*\*(?P<label>[^*\n]+?)[ \t]*:?[ \t]*\*\*[ \t]*:?[ \t]*(?P<fact>\S[^\n]*)$",
+    re.MULTILINE,
+)
+SECTION_NUMBER = re.compile(r"^\d+(\.\d+)*\.?\s*")
+
+FAQ_PROMPT = """You write FAQ entries for an HR policy knowledge base.
+From the policy excerpt below, write up to {count} questions an employee might ask that the excerpt
+answers completely. Give each a short, self-contained answer that quotes the relevant facts (numbers,
+times, limits) exactly as written. Do not add anything the excerpt does not say.
+Return only a JSON list of objects with "question" and "answer" keys.
+
+SECTION: {section}
+EXCERPT:
+{text}"""
+
+
+def clean_text(text):
+    return re.sub(r"[ \t]+", " ", CITATION_MARKUP.sub("", text)).strip()
+
+
+def _topic(title):
+    return SECTION_NUMBER.sub("", clean_text(title)).strip(" :")
+
+
+def heading_entries(chunk):
+    """
+    FAQ entries extracted from one chunk without an LLM: one per "**Label:** fact" line, asked
+    as templated questions about the label and its enclosing heading.
+    """
+    text = CITATION_MARKUP.sub("", chunk.page_content)
+    section = chunk.metadata.get("section", "")
+    headings = [(m.start(), _topic(m.group(2))) for m in HEADING_PATTERN.finditer(text)]
+    default_topic = _topic(section.split(" > ")[-1]) if section else ""
+
+    entries = []
+    for match in LABELLED_FACT.finditer(text):
+        label = _topic(match.group("label"))
+        fact = clean_text(match.group("fact"))
+        if not label or not fact:
+            continue
+        topic = next((title for start, title in reversed(headings) if start < match.start()), default_topic)
+        subject = label if label.lower().endswith("policy") else f"{label} policy"
+        questions = [f"What is the {subject}?", f"What are the rules for {label.lower()}?"]
+        if topic and topic.lower() != label.lower():
+            questions.append(f"{topic}: {label}?")
+        entries.append({"questions": questions, "answer": f"{label}: {fact}", "section": topic or section})
+    return entries
+
+
+def parse_llm_entries(content, section=""):
+    """
+    Parses the model's JSON list of {"question", "answer"} objects; returns [] if it is unusable.
+    """
+    text = str(content).strip()
+    if text.startswith("```"):
+        text = text.strip("`").split("\n", 1)[-1]
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
+        return []
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return []
+    entries = []
+    for item in items[:FAQ_QUESTIONS_PER_CHUNK]:
+        if isinstance(item, dict) and str(item.get("question", "")).strip() and str(item.get("answer", "")).strip():
+            entries.append({
+                "questions": [str(item["question"]).strip()],
+                "answer": clean_text(str(item["answer"])),
+                "section": section,
+            })
+    return entries
+
+
+def llm_entries(chunk, llm):
+    """
+    FAQ entries written by the chat model; falls back to heading extraction if its output is unusable.
+    """
+    section = chunk.metadata.get("section", "")
+    prompt = FAQ_PROMPT.format(count=FAQ_QUESTIONS_PER_CHUNK, section=section, text=clean_text(chunk.page_content))
+    entries = parse_llm_entries(llm.invoke(prompt).content, section)
+    if not entries:
+        logger.warning(f"No usable FAQ entries from the LLM for {chunk.metadata.get('chunk_id')}; using headings.")
+        return heading_entries(chunk)
+    return entries
+
+
+class FAQIndex:
+    """
+    Precomputed question -> answer entries with one L2-normalized embedding per question.
+    Every entry remembers the chunk (id and content hash) it was generated from, so a rebuild only
+    regenerates entries for chunks that changed.
+    """
+
+    def __init__(self, entries, vectors, question_entry, meta):
+        self.entries = entries
+        self.vectors = vectors
+        self.question_entry = question_entry
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def fingerprint(self):
+        return self.meta.get("fingerprint")
+
+    def match(self, vector):
+        """
+        Returns (entry, cosine similarity) of the nearest stored question, or None if the index is empty.
+        """
+        if not len(self.question_entry):
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        similarities = self.vectors @ vector
+        best = int(np.argmax(similarities))
+        return self.entries[int(self.question_entry[best])], float(similarities[best])
+
+
+def build_faq_index(chunks, embedding_model, generator="headings", llm=None, previous=None,
+                    fingerprint=None, model_id=None):
+    """
+    Builds the FAQ index for `chunks` (with chunk_id/chunk_hash metadata). Entries and question
+    vectors of chunks whose hash is unchanged in `previous` (same generator and embedding model)
+    are reused; only the other chunks are sent through the generator and embedded.
+    Returns (index, stats).
+    """
+    if generator not in FAQ_GENERATORS:
+        raise ValueError(f"Unknown FAQ generator: {generator}")
+    if generator == "llm" and llm is None:
+        raise ValueError("The llm FAQ generator needs a chat model.")
+
+    # Chunks already processed by the previous build (including those that yielded no entries).
+    previous_chunks = {}
+    reusable = {}
+    if previous is not None and previous.meta.get("generator") == generator \
+            and previous.meta.get("embedding_model") == model_id:
+        previous_chunks = previous.meta.get("chunks", {})
+        rows_by_entry = {}
+        for row, entry_index in enumerate(previous.question_entry):
+            rows_by_entry.setdefault(int(entry_index), []).append(row)
+        for entry_index, entry in enumerate(previous.entries):
+            reusable.setdefault(entry["chunk_id"], []).append(
+                (entry, np.asarray(previous.vectors[rows_by_entry.get(entry_index, [])]))
+            )
+
+    stats = {"reused": 0, "generated": 0, "removed": 0}
+    entries, vectors, question_entry, pending = [], [], [], []
+    chunk_hashes = {}
+    for chunk in chunks:
+        chunk_id, chunk_hash = chunk.metadata.get("chunk_id"), chunk.metadata.get("chunk_hash")
+        chunk_hashes[chunk_id] = chunk_hash
+        if chunk_id in previous_chunks and previous_chunks[chunk_id] == chunk_hash:
+            stats["reused"] += 1
+            for entry, entry_vectors in reusable.get(chunk_id, []):
+                question_entry.extend([len(entries)] * len(entry["questions"]))
+                vectors.append(entry_vectors)
+                entries.append(entry)
+            continue
+
+        stats["generated"] += 1
+        generated = llm_entries(chunk, llm) if generator == "llm" else heading_entries(chunk)
+        for entry in generated:
+            entry.update({"chunk_id": chunk_id, "chunk_hash": chunk_hash, "source": chunk.metadata.get("source", "")})
+            pending.append((len(vectors), entry))
+            question_entry.extend([len(entries)] * len(entry["questions"]))
+            vectors.append(None)
+            entries.append(entry)
+    stats["removed"] = len(set(previous_chunks) - set(chunk_hashes))
+
+    # New questions are embedded in one batch.
+    questions = [q for _, entry in pending for q in entry["questions"]]
+    if questions:
+        embedded = normalize_rows(np.asarray(embedding_model.embed_documents(questions), dtype=np.float32))
+        offset = 0
+        for slot, entry in pending:
+            vectors[slot] = embedded[offset:offset + len(entry["questions"])]
+            offset += len(entry["questions"])
+
+    blocks = [v for v in vectors if len(v)]
+    matrix = np.vstack(blocks).astype(np.float32) if blocks else np.zeros((0, 0), dtype=np.float32)
+    meta = {
+        "format_version": FAQ_INDEX_FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "embedding_model": model_id,
+        "generator": generator,
+        "num_entries": len(entries),
+        "num_questions": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "chunks": chunk_hashes,
+    }
+    stats["entries"] = len(entries)
+    stats["questions"] = int(matrix.shape[0])
+    return FAQIndex(entries, matrix, np.asarray(question_entry, dtype=np.int32), meta), stats
+
+
+def save_faq_index(index, index_path):
+    """
+    Writes the entries (readable JSON, for review) and the question vectors; replaced atomically.
+    """
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "vectors.npy"), np.ascontiguousarray(index.vectors))
+    np.save(os.path.join(tmp_path, "question_entry.npy"), index.question_entry)
+    with open(os.path.join(tmp_path, "entries.json"), "w", encoding="utf-8") as f:
+        json.dump(index.entries, f, ensure_ascii=False, indent=2)
+    # meta.json is written last: its presence marks a complete index.
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(index.meta, f, indent=2)
+
+    if os.path.exists(index_path):
+        shutil.rmtree(index_path)
+    os.replace(tmp_path, index_path)
+    logger.info(f"FAQ index with {len(index)} entries saved to {index_path}")
+
+
+def load_faq_index(index_path, expected_fingerprint=None, expected_model=None):
+    """
+    Loads a saved FAQIndex (vectors memory-mapped).
+    Returns None if the index is missing, from another format version, stale or built with another model.
+    """
+    meta_path = os.path.join(index_path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format_version") != FAQ_INDEX_FORMAT_VERSION:
+            logger.warning(f"FAQ index format {meta.get('format_version')} is not supported.")
+            return None
+        if expected_fingerprint is not None and meta.get("fingerprint") != expected_fingerprint:
+            logger.warning("FAQ index is stale: knowledge base fingerprint changed. Re-run ingestion to refresh it.")
+            return None
+        if expected_model is not None and meta.get("embedding_model") != expected_model:
+            logger.warning(f"FAQ index was built with {meta.get('embedding_model')}, not {expected_model}.")
+            return None
+
+        with open(os.path.join(index_path, "entries.json"), "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        return FAQIndex(
+            entries=entries,
+            vectors=np.load(os.path.join(index_path, "vectors.npy"), mmap_mode="r"),
+            question_entry=np.load(os.path.join(index_path, "question_entry.npy")),
+            meta=meta,
+        )
+    except Exception as e:
+        logger.error(f"Failed to load FAQ index from {index_path}: {e}", exc_info=True)
+        return None
+
+
+def faq_index_fingerprint(index_path):
+    """
+    Hash of the saved entries plus the answer threshold; "" when there is no index or FAQ_ANSWERS=0.
+    """
+    entries_path = os.path.join(index_path, "entries.json")
+    if os.getenv("FAQ_ANSWERS", "1") != "1" or not os.path.exists(entries_path):
+        return ""
+    return f"{file_sha256(entries_path)}/{FAQ_MIN_SCORE}"
+
+
+def format_faq_answer(entry):
+    """
+    The precomputed answer with its source citation.
+    """
+    citation = os.path.basename(entry.get("source", "")) or "HR policies"
+    if entry.get("section"):
+        citation = f"{citation}, {entry['section']}"
+    return f"{entry['answer']}\n\nSource: {citation}"
+
+
+class FAQAnswerer:
+    """
+    Answers a query from the FAQ index when its nearest question scores at least `min_score`.
+
+    Callers report how long each request took with record(site, hit, seconds); stats() turns that
+    into the hit rate per call site and the latency saved (hits x the difference between the mean
+    miss and mean hit latency at that site).
+    """
+
+    def __init__(self, index, embed_fn, min_score=FAQ_MIN_SCORE):
+        self.index = index
+        self.embed_fn = embed_fn
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._sites = {}
+
+    def lookup(self, query):
+        """
+        Returns the matching entry (with its "score") or None.
+        """
+        match = self.index.match(self.embed_fn(query))
+        if match is None or match[1] < self.min_score:
+            return None
+        entry, score = match
+        logger.info(f"FAQ hit (similarity={score:.3f}, {entry['chunk_id']}) for: {query}")
+        return {**entry, "score": score}
+
+    def record(self, site, hit, seconds):
+        with self._lock:
+            stats = self._sites.setdefault(site, {"hits": 0, "misses": 0, "hit_seconds": 0.0, "miss_seconds": 0.0})
+            stats["hits" if hit else "misses"] += 1
+            stats["hit_seconds" if hit else "miss_seconds"] += seconds
+
+    def stats(self):
+        with self._lock:
+            sites = {site: dict(s) for site, s in self._sites.items()}
+        report = {"entries": len(self.index), "min_score": self.min_score, "sites": {}, "saved_seconds": 0.0}
+        for site, s in sites.items():
+            lookups = s["hits"] + s["misses"]
+            hit_ms = 1000.0 * s["hit_seconds"] / s["hits"] if s["hits"] else None
+            miss_ms = 1000.0 * s["miss_seconds"] / s["misses"] if s["misses"] else None
+            saved = s["hits"] * max(0.0, miss_ms - hit_ms) / 1000.0 if hit_ms is not None and miss_ms is not None else 0.0
+            report["sites"][site] = {
+                "hits": s["hits"],
+                "misses": s["misses"],
+                "hit_rate": s["hits"] / lookups if lookups else 0.0,
+                "hit_ms": hit_ms,
+                "miss_ms": miss_ms,
+                "saved_seconds": saved,
+            }
+            report["saved_seconds"] += saved
+        return report
@@ -0,0 +1,342 @@
+import json
+import math
+import os
+import shutil
+import numpy as np
+from langchain_core.documents import Document
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+VECTOR_INDEX_DIR_NAME = "vector_index"
+VECTOR_INDEX_FORMAT_VERSION = 2
+# chroma: the persistent Chroma collection; flat: the read-only memory-mapped export below.
+VECTOR_STORES = ("chroma", "flat")
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")
+# float16 halves the index size (and page-cache footprint); scores are still computed in float32.
+VECTOR_INDEX_DTYPES = ("float32", "float16")
+VECTOR_INDEX_DTYPE = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+# Rows scored per matrix multiply; bounds the float32 scratch space for float16 indexes.
+SEARCH_BLOCK_ROWS = 16384
+
+
+def chroma_relevance(similarities):
+    """
+    Maps cosine similarities of unit vectors to the relevance score Chroma reports for its default
+    (squared L2) space, so score thresholds tuned on Chroma keep their meaning.
+    """
+    return 1.0 - (2.0 - 2.0 * similarities) / math.sqrt(2)
+
+
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+class FlatVectorStore:
+    """
+    Exact cosine search over a contiguous matrix of L2-normalized embeddings.
+
+    Vectors, chunk texts and their offsets are .npy/.bin files opened with mmap, so processes that
+    open (or fork after opening) the same index share those pages through the page cache instead
+    of each holding a private copy. A batch of queries is scored with one matrix multiply per block
+    of rows, and results can be restricted to chunks from given source files. Exposes the subset of
+    the Chroma vector-store API the retrievers use, including Chroma-style `filter={"source": ...}`.
+    """
+
+    def __init__(self, vectors, source_ids, text_offsets, text_blob, metadatas, meta, embedding_function=None):
+        self.vectors = vectors
+        self.source_ids = source_ids
+        self.text_offsets = text_offsets
+        self.text_blob = text_blob
+        self.metadatas = metadatas
+        self.meta = meta
+        self.embedding_function = embedding_function
+        self._source_index = {source: i for i, source in enumerate(meta.get("sources", []))}
+
+    def __len__(self):
+        return len(self.metadatas)
+
+    @property
+    def fingerprint(self):
+        return self.meta.get("fingerprint")
+
+    def text(self, index):
+        start, end = self.text_offsets[index], self.text_offsets[index + 1]
+        return bytes(self.text_blob[start:end]).decode("utf-8")
+
+    def document(self, index):
+        return Document(page_content=self.text(index), metadata=dict(self.metadatas[index]))
+
+    def _filter_rows(self, filter):
+        """
+        Row indices matching a {"source": path} or {"source": {"$in": [paths]}} filter; None = all rows.
+        """
+        if not filter:
+            return None
+        unsupported = set(filter) - {"source"}
+        if unsupported:
+            raise ValueError(f"FlatVectorStore can only filter on 'source', not {sorted(unsupported)}")
+        wanted = filter["source"]
+        if isinstance(wanted, dict):
+            if set(wanted) != {"$in"}:
+                raise ValueError(f"Unsupported source filter: {wanted}")
+            wanted = wanted["$in"]
+        elif isinstance(wanted, str):
+            wanted = [wanted]
+        ids = [self._source_index[source] for source in wanted if source in self._source_index]
+        return np.flatnonzero(np.isin(self.source_ids, ids))
+
+    def _similarities(self, queries, rows=None):
+        """
+        (n_queries, n_rows) float32 cosine similarities against all rows or the given subset.
+        """
+        n = len(self) if rows is None else len(rows)
+        similarities = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, n)
+            block = self.vectors[start:end] if rows is None else self.vectors[rows[start:end]]
+            similarities[:, start:end] = queries @ block.astype(np.float32, copy=False).T
+        return similarities
+
+    def search_by_vectors(self, vectors, k, filter=None):
+        """
+        Exact top-k for a batch of query vectors. Returns one list of (row, cosine_similarity)
+        pairs per query, best first.
+        """
+        if len(self) == 0 or k <= 0:
+            return [[] for _ in range(len(vectors))]
+        queries = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(-1, self.vectors.shape[1]))
+        rows = self._filter_rows(filter)
+        n = len(self) if rows is None else len(rows)
+        if n == 0:
+            return [[] for _ in range(len(queries))]
+
+        similarities = self._similarities(queries, rows)
+        k = min(k, n)
+        if k < n:
+            candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(n), (len(queries), n))
+        results = []
+        for q, columns in enumerate(candidates):
+            columns = columns[np.argsort(-similarities[q, columns], kind="stable")]
+            ids = columns if rows is None else rows[columns]
+            results.append([(int(i), float(similarities[q, c])) for i, c in zip(ids, columns)])
+        return results
+
+    def search_by_vector(self, vector, k, filter=None):
+        """
+        Returns up to k (row, cosine_similarity) pairs, best first.
+        """
+        return self.search_by_vectors([vector], k, filter)[0]
+
+    def _with_relevance(self, hits):
+        return [(self.document(i), float(chroma_relevance(similarity))) for i, similarity in hits]
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None, **kwargs):
+        return self._with_relevance(self.search_by_vector(embedding, k, filter))
+
+    def similarity_search_with_relevance_scores(self, query, k=4, filter=None, **kwargs):
+        return self._with_relevance(self.search_by_vector(self.embedding_function.embed_query(query), k, filter))
+
+    def batch_similarity_search_with_relevance_scores(self, queries, k=4, filter=None):
+        """
+        Embeds all queries in one call and answers them with one scoring pass.
+        """
+        vectors = self.embedding_function.embed_documents(list(queries))
+        return [self._with_relevance(hits) for hits in self.search_by_vectors(vectors, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_relevance_scores(query, k, filter)]
+
+
+def build_flat_vector_index(texts, vectors, metadatas, fingerprint=None, embedding_model=None,
+                            dtype=VECTOR_INDEX_DTYPE):
+    """
+    Builds an in-memory FlatVectorStore from parallel lists of chunk texts, vectors and metadata.
+    Vectors are re-normalized so search is a plain dot product, then stored as `dtype`.
+    """
+    if dtype not in VECTOR_INDEX_DTYPES:
+        raise ValueError(f"Unsupported vector index dtype: {dtype}")
+    if texts:
+        matrix = normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)).astype(dtype)
+    else:
+        matrix = np.zeros((0, 0), dtype=dtype)
+    metadatas = [dict(m or {}) for m in metadatas]
+
+    sources = {}
+    source_ids = np.fromiter(
+        (sources.setdefault(m.get("source", ""), len(sources)) for m in metadatas), dtype=np.int32, count=len(metadatas)
+    )
+
+    encoded = [text.encode("utf-8") for text in texts]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        text_offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    meta = {
+        "format_version": VECTOR_INDEX_FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "embedding_model": embedding_model,
+        "num_vectors": len(texts),
+        "dim": int(matrix.shape[1]),
+        "dtype": dtype,
+        "sources": list(sources),
+    }
+    return FlatVectorStore(
+        vectors=matrix,
+        source_ids=source_ids,
+        text_offsets=text_offsets,
+        text_blob=b"".join(encoded),
+        metadatas=metadatas,
+        meta=meta,
+    )
+
+
+def export_from_chroma(db, fingerprint=None, embedding_model=None, dtype=VECTOR_INDEX_DTYPE):
+    """
+    Builds a FlatVectorStore from the vectors already stored in a Chroma collection (no re-embedding).
+    Rows are ordered by chunk id, like the keyword index.
+    """
+    data = db.get(include=["documents", "metadatas", "embeddings"])
+    rows = sorted(
+        zip(data["documents"], data["metadatas"], data["embeddings"]),
+        key=lambda row: (row[1] or {}).get("chunk_id", ""),
+    )
+    return build_flat_vector_index(
+        [text for text, _, _ in rows],
+        [vector for _, _, vector in rows],
+        [metadata for _, metadata, _ in rows],
+        fingerprint=fingerprint,
+        embedding_model=embedding_model,
+        dtype=dtype,
+    )
+
+
+def save_flat_vector_index(index, index_path):
+    """
+    Writes the index as .npy arrays plus a raw text blob so it can be memory-mapped on load.
+    The directory is replaced atomically.
+    """
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "vectors.npy"), np.ascontiguousarray(index.vectors))
+    np.save(os.path.join(tmp_path, "source_ids.npy"), index.source_ids)
+    np.save(os.path.join(tmp_path, "text_offsets.npy"), index.text_offsets)
+    with open(os.path.join(tmp_path, "texts.bin"), "wb") as f:
+        f.write(bytes(index.text_blob))
+    with open(os.path.join(tmp_path, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(index.metadatas, f, ensure_ascii=False)
+    # meta.json is written last: its presence marks a complete index.
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(index.meta, f, indent=2)
+
+    if os.path.exists(index_path):
+        shutil.rmtree(index_path)
+    os.replace(tmp_path, index_path)
+    logger.info(f"Flat vector index with {len(index)} vectors saved to {index_path}")
+
+
+def load_flat_vector_index(index_path, expected_fingerprint=None, expected_model=None, embedding_function=None):
+    """
+    Memory-maps a saved FlatVectorStore.
+    Returns None if the index is missing, from another format version, stale or built with another model.
+    """
+    meta_path = os.path.join(index_path, "meta.json")
+    if not os.path.exists(meta_path):
+        logger.info(f"No flat vector index found at {index_path}")
+        return None
+
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format_version") != VECTOR_INDEX_FORMAT_VERSION:
+            logger.warning(f"Flat vector index format {meta.get('format_version')} is not supported.")
+            return None
+        if expected_fingerprint is not None and meta.get("fingerprint") != expected_fingerprint:
+            logger.warning("Flat vector index is stale: knowledge base fingerprint changed.")
+            return None
+        if expected_model is not None and meta.get("embedding_model") != expected_model:
+            logger.warning(f"Flat vector index was built with {meta.get('embedding_model')}, not {expected_model}.")
+            return None
+
+        with open(os.path.join(index_path, "metadata.json"), "r", encoding="utf-8") as f:
+            metadatas = json.load(f)
+
+        blob_path = os.path.join(index_path, "texts.bin")
+        if os.path.getsize(blob_path) > 0:
+            text_blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            text_blob = b""
+
+        return FlatVectorStore(
+            vectors=np.load(os.path.join(index_path, "vectors.npy"), mmap_mode="r"),
+            source_ids=np.load(os.path.join(index_path, "source_ids.npy"), mmap_mode="r"),
+            text_offsets=np.load(os.path.join(index_path, "text_offsets.npy"), mmap_mode="r"),
+            text_blob=text_blob,
+            metadatas=metadatas,
+            meta=meta,
+            embedding_function=embedding_function,
+        )
+    except Exception as e:
+        logger.error(f"Failed to load flat vector index from {index_path}: {e}", exc_info=True)
+        return None
+
+
+def get_flat_vector_store(data_path, db_path, embedding_function):
+    """
+    Loads the flat vector index stored next to the vector database.
+    Falls back to exporting (and saving) it from the Chroma collection when it is missing or stale.
+    The export is stamped with the fingerprint Chroma was last synced from, so vectors from a stale
+    collection are served (with a warning) but never accepted as fresh on a later load.
+    """
+    from langchain_chroma import Chroma
+    from embeddings import EMBEDDING_BACKEND, embedding_model_id, index_embedding_backend
+    from document_loader import kb_fingerprint
+    from ingest_manifest import indexed_fingerprint
+
+    index_path = os.path.join(db_path, VECTOR_INDEX_DIR_NAME)
+    fingerprint = kb_fingerprint(data_path)
+    model = embedding_model_id(index_embedding_backend(db_path) or EMBEDDING_BACKEND)
+    index = load_flat_vector_index(index_path, fingerprint, model, embedding_function)
+
+    if index is None:
+        logger.info("Exporting flat vector index from the Chroma collection.")
+        synced_from = indexed_fingerprint(db_path)
+        if synced_from != fingerprint:
+            logger.warning(
+                f"Chroma collection at {db_path} is not synced with {data_path}; "
+                "run Load_And_DBCreation.py to update it."
+            )
+        db = Chroma(persist_directory=db_path, embedding_function=embedding_function)
+        index = export_from_chroma(db, fingerprint=synced_from, embedding_model=model)
+        index.embedding_function = embedding_function
+        try:
+            save_flat_vector_index(index, index_path)
+            # Re-open the saved copy so it is memory-mapped rather than held on the heap.
+            index = load_flat_vector_index(index_path, embedding_function=embedding_function) or index
+        except OSError as e:
+            logger.warning(f"Could not persist flat vector index: {e}")
+    else:
+        logger.info(f"Loaded flat vector index with {len(index)} vectors from {index_path}")
+    return index
+
+
+def open_vector_store(data_path, db_path, embedding_function, kind=None):
+    """
+    Opens the configured vector-store backend (VECTOR_STORE by default).
+    """
+    kind = kind or VECTOR_STORE
+    if kind == "flat":
+        return get_flat_vector_store(data_path, db_path, embedding_function)
+    if kind != "chroma":
+        raise ValueError(f"Unknown vector store: {kind}")
+
+    from langchain_chroma import Chroma
+
+    return Chroma(persist_directory=db_path, embedding_function=embedding_function)
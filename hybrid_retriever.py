@@ -0,0 +1,165 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from ingest_manifest import hash_text
+from tracing import span
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+LEG_NAMES = ("keyword", "vector")
+
+_pool_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+
+
+def _leg_pool():
+    """
+    Shared pool for retrieval legs, recreated after a fork so children never inherit dead threads.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval-leg")
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def chunk_key(doc):
+    """
+    Identity used for de-duplication: the ingest chunk_id, or a content hash for legacy entries.
+    """
+    return doc.metadata.get("chunk_id") or hash_text(doc.page_content)
+
+
+def fuse_rankings(legs, weights, method="rrf", rrf_c=60):
+    """
+    Fuses per-leg (Document, score) lists. Returns (documents, fused_scores, ranks, scores)
+    where ranks/scores are (n_legs, n_docs) arrays (rank 0 / score NaN = not returned by that leg).
+    Documents are ordered best first; ties keep first-seen order.
+    """
+    keys = {}
+    docs = []
+    for hits in legs:
+        for doc, _ in hits:
+            key = chunk_key(doc)
+            if key not in keys:
+                keys[key] = len(docs)
+                docs.append(doc)
+
+    ranks = np.zeros((len(legs), len(docs)), dtype=np.float64)
+    scores = np.full((len(legs), len(docs)), np.nan, dtype=np.float64)
+    for leg_index, hits in enumerate(legs):
+        for rank, (doc, score) in enumerate(hits, start=1):
+            column = keys[chunk_key(doc)]
+            if ranks[leg_index, column] == 0:
+                ranks[leg_index, column] = rank
+                scores[leg_index, column] = np.nan if score is None else score
+
+    if not docs:
+        return [], np.zeros(0), ranks, scores
+
+    weights = np.asarray(weights, dtype=np.float64)[:, None]
+    present = ranks > 0
+    if method == "rrf":
+        contributions = np.where(present, 1.0 / (rrf_c + np.where(present, ranks, 1.0)), 0.0)
+    elif method == "weighted":
+        valid = present & ~np.isnan(scores)
+        low = np.min(np.where(valid, scores, np.inf), axis=1, keepdims=True)
+        high = np.max(np.where(valid, scores, -np.inf), axis=1, keepdims=True)
+        spread = np.where(high > low, high - low, 1.0)
+        normalized = np.where(high > low, (scores - low) / spread, 1.0)
+        contributions = np.where(valid, normalized, 0.0)
+    else:
+        raise ValueError(f"Unknown fusion method: {method}")
+
+    fused = (weights * contributions).sum(axis=0)
+    order = np.argsort(-fused, kind="stable")
+    return [docs[i] for i in order], fused[order], ranks[:, order], scores[:, order]
+
+
+class FusedHybridRetriever(BaseRetriever):
+    """
+    Hybrid keyword + vector retriever. Both legs run concurrently, results are fused with
+    vectorized reciprocal-rank (default) or min-max weighted-score fusion, de-duplicated by
+    chunk id, and the fused score plus per-leg rank/score are returned in each Document's metadata.
+    Drop-in replacement for EnsembleRetriever([bm25, vector], weights=[0.5, 0.5]).
+    """
+
+    keyword_retriever: Any
+    vector_store: Any
+    k: int = 4
+    weights: List[float] = [0.5, 0.5]
+    fusion: str = "rrf"
+    rrf_c: int = 60
+    top_n: Optional[int] = None
+
+    def _keyword_leg(self, query):
+        if hasattr(self.keyword_retriever, "search_with_scores"):
+            return self.keyword_retriever.search_with_scores(query, self.k)
+        return [(doc, None) for doc in self.keyword_retriever.invoke(query)]
+
+    def _vector_leg(self, query):
+        return self.vector_store.similarity_search_with_relevance_scores(query, k=self.k)
+
+    def _timed(self, name, leg, query):
+        start = time.perf_counter()
+        with span(f"retrieval.{name}", k=self.k):
+            hits = leg(query)
+        return hits, time.perf_counter() - start
+
+    def search_with_scores(self, query):
+        """
+        Returns (Document, fused_score) pairs, best first.
+        """
+        return self.search_with_timings(query)[0]
+
+    def search_with_timings(self, query):
+        """
+        Returns ((Document, fused_score) pairs best first, {stage: seconds}) for this query only.
+        The retriever is shared across requests, so timings travel with the result.
+        """
+        start = time.perf_counter()
+        pool = _leg_pool()
+        futures = [
+            pool.submit(contextvars.copy_context().run, self._timed, name, leg, query)
+            for name, leg in zip(LEG_NAMES, (self._keyword_leg, self._vector_leg))
+        ]
+        legs = []
+        timings = {}
+        for name, future in zip(LEG_NAMES, futures):
+            hits, elapsed = future.result()
+            legs.append(hits)
+            timings[name] = elapsed
+
+        fusion_start = time.perf_counter()
+        with span("retrieval.fusion", method=self.fusion):
+            docs, fused, ranks, scores = fuse_rankings(legs, self.weights, self.fusion, self.rrf_c)
+        if self.top_n is not None:
+            docs, fused = docs[:self.top_n], fused[:self.top_n]
+
+        results = []
+        for column, (doc, fused_score) in enumerate(zip(docs, fused)):
+            metadata = dict(doc.metadata)
+            metadata["fused_score"] = float(fused_score)
+            for leg_index, name in enumerate(LEG_NAMES):
+                rank = int(ranks[leg_index, column])
+                metadata[f"{name}_rank"] = rank or None
+                score = scores[leg_index, column]
+                metadata[f"{name}_score"] = None if np.isnan(score) else float(score)
+            results.append((Document(page_content=doc.page_content, metadata=metadata), float(fused_score)))
+
+        timings["fusion"] = time.perf_counter() - fusion_start
+        timings["total"] = time.perf_counter() - start
+        logger.info("Hybrid retrieval timings: " + ", ".join(f"{n}={t * 1000:.1f}ms" for n, t in timings.items()))
+        return results, timings
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [doc for doc, _ in self.search_with_scores(query)]
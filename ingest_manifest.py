@@ -0,0 +1,117 @@
+import glob
+import hashlib
+import json
+import os
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CHROMA_PATH = "./chroma_db"
+MANIFEST_FILE = "ingest_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def hash_text(text):
+    """
+    Returns the SHA-256 hex digest of a string.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path, block_size=1 << 20):
+    """
+    Returns the SHA-256 hex digest of a file's raw bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_chunk_id(source, index):
+    """
+    Builds a stable chunk id from the source path and the chunk position in that file.
+    The id survives content edits, so a changed chunk is an update, not a new entry.
+    """
+    source_key = hashlib.sha1(os.path.normpath(source).encode("utf-8")).hexdigest()[:12]
+    return f"{source_key}-{index:05d}"
+
+
+def corpus_fingerprint(directory_path, patterns, extra=""):
+    """
+    Hashes the relative path and content of every knowledge-base file matching the patterns.
+    Any added, removed or edited file (or a change to `extra`) yields a new fingerprint.
+    """
+    if isinstance(patterns, str):
+        patterns = [patterns]
+
+    paths = set()
+    for pattern in patterns:
+        paths.update(glob.glob(os.path.join(directory_path, pattern), recursive=True))
+
+    digest = hashlib.sha256(extra.encode("utf-8"))
+    for path in sorted(p for p in paths if os.path.isfile(p)):
+        rel_path = os.path.relpath(path, directory_path).replace(os.sep, "/")
+        digest.update(f"\0{rel_path}\0{file_sha256(path)}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def index_version(db_path):
+    """
+    Cheap version stamp of the persisted indexes: changes whenever an ingest rewrites the manifest.
+    """
+    manifest_path = os.path.join(db_path, MANIFEST_FILE)
+    try:
+        stat = os.stat(manifest_path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+def indexed_fingerprint(db_path):
+    """
+    Knowledge-base fingerprint the vector database was last synced from, or None when unknown
+    (no manifest, an older manifest, or files that failed to parse during the last sync).
+    """
+    manifest = load_manifest(db_path)
+    return manifest.get("fingerprint") if manifest else None
+
+
+def empty_manifest():
+    return {"version": MANIFEST_VERSION, "files": {}}
+
+
+def load_manifest(db_path):
+    """
+    Reads the ingest manifest stored next to the vector database.
+    Returns None when the manifest is missing, unreadable or from another version.
+    """
+    manifest_path = os.path.join(db_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest at {manifest_path}: {e}")
+        return None
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        logger.warning(f"Ignoring manifest with unsupported version: {manifest.get('version')}")
+        return None
+    return manifest
+
+
+def save_manifest(db_path, manifest):
+    """
+    Atomically writes the ingest manifest next to the vector database.
+    """
+    os.makedirs(db_path, exist_ok=True)
+    manifest_path = os.path.join(db_path, MANIFEST_FILE)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    logger.info(f"Ingest manifest saved to {manifest_path}")
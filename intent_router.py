@@ -0,0 +1,267 @@
+import asyncio
+import contextvars
+import re
+import threading
+import time
+from collections import Counter
+import numpy as np
+from langchain_core.agents import AgentAction
+from chunking import build_context
+from conversation_memory import extract_facts, is_follow_up
+from faq_index import format_faq_answer
+from logger import setup_logger
+from tracing import span
+
+logger = setup_logger(__name__)
+
+# Agent round trips an intent costs when it goes through the AgentExecutor (pick tool + phrase result).
+AGENT_LLM_CALLS = 2
+
+INTENT_EXEMPLARS = {
+    "leave_balance": [
+        "Check leave balance for EMP-123",
+        "How many vacation days do I have left?",
+        "What is my remaining annual leave?",
+        "How many sick days are left for employee 123?",
+        "Show my time off balance",
+    ],
+    "policy": [
+        "What is the policy for remote work?",
+        "What are the core working hours?",
+        "Can I carry over unused vacation days to next year?",
+        "How does the parental leave policy work?",
+        "What are the rules for expense reimbursement?",
+        "How many public holidays does the company observe?",
+    ],
+    "it_support": [
+        "My laptop is broken",
+        "My VPN is not working, please create a ticket",
+        "I forgot my password and cannot log in",
+        "I need access to the shared drive",
+        "My monitor does not turn on",
+    ],
+    "other": [
+        "Hello",
+        "Thanks, that's all",
+        "Who are you?",
+        "Can you help me?",
+    ],
+}
+
+LEAVE_BALANCE_PATTERN = re.compile(r"\b(balance|left|remaining)\b", re.IGNORECASE)
+# Anything that hints at an action or a second intent goes to the agent.
+AGENT_ONLY_PATTERN = re.compile(
+    r"\b(ticket|broken|not working|password|vpn|laptop|access|bug|and also|then)\b", re.IGNORECASE
+)
+# A second clause ("... and ...", more text after a question mark, "; ...") may carry a second intent.
+SECOND_CLAUSE_PATTERN = re.compile(r"\band\b|\?\s*\S|;", re.IGNORECASE)
+# Policy wording in a balance question ("... and can I carry it over?") needs the agent's policy lookup too.
+LEAVE_POLICY_PATTERN = re.compile(
+    r"\b(carry(ing)?[\s-]+over|roll(ing)?[\s-]+over|polic(y|ies)|rules?|allowed|entitle(d|ment)|can i|how does)\b",
+    re.IGNORECASE,
+)
+PERSONAL_PATTERN = re.compile(r"\bEMP[-\s]?\d+\b|\b\d{3,}\b|\bmy\s+(leave|balance|days)\b", re.IGNORECASE)
+
+POLICY_ANSWER_PROMPT = """You are a smart Ciklum HR Assistant.
+Answer the question using only the policy excerpts below. Be helpful and concise.
+If the excerpts do not contain the answer, say that you could not find it in the HR policies.
+
+POLICY EXCERPTS:
+{context}
+
+QUESTION: {question}
+
+ANSWER:"""
+
+
+class IntentClassifier:
+    """
+    Nearest-centroid intent classifier on sentence embeddings. Centroids are the normalized
+    mean of each intent's exemplar embeddings and are built on first use.
+    """
+
+    def __init__(self, embedding_model, exemplars=INTENT_EXEMPLARS):
+        self.embedding_model = embedding_model
+        self.exemplars = exemplars
+        self._labels = None
+        self._centroids = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def _build(self):
+        with self._lock:
+            if self._centroids is None:
+                labels = list(self.exemplars)
+                centroids = []
+                for label in labels:
+                    vectors = self._normalize(np.asarray(self.embedding_model.embed_documents(self.exemplars[label])))
+                    centroids.append(vectors.mean(axis=0))
+                self._labels = labels
+                self._centroids = self._normalize(np.vstack(centroids))
+
+    def classify(self, text):
+        """
+        Returns (label, cosine score, margin over the runner-up intent).
+        """
+        if self._centroids is None:
+            self._build()
+        query = self._normalize(np.asarray(self.embedding_model.embed_query(text)))
+        similarities = self._centroids @ query
+        order = np.argsort(-similarities)
+        best, second = order[0], order[1]
+        return self._labels[best], float(similarities[best]), float(similarities[best] - similarities[second])
+
+
+class RoutedAgent:
+    """
+    Deterministic fast path in front of the agent (built with return_intermediate_steps=True).
+
+    - Leave balance the classifier is sure about, with a known employee ID and no policy wording:
+      calls the leave tool directly and returns its answer as is (no LLM call).
+    - Pure policy question the classifier is sure about, with a confident retrieval (top chunk found
+      by both legs and above `min_relevance`): one LLM call answers from the retrieved context.
+    - Pure policy question whose nearest precomputed FAQ question (`faq_fn()`, optional) is close
+      enough: answers with the stored entry and its citation, before retrieval (no LLM call).
+    - Everything else, including any query with a second clause, goes to the agent unchanged.
+
+    Responses keep the agent's shape ({"output", "intermediate_steps", ...}) so it composes with
+    CachedAgentExecutor and the streaming handler.
+    """
+
+    def __init__(self, executor, llm, classifier, retriever_fn, leave_tool,
+                 min_score=0.5, min_margin=0.05, min_relevance=0.5, faq_fn=None):
+        self.executor = executor
+        self.llm = llm
+        self.classifier = classifier
+        self.retriever_fn = retriever_fn
+        self.leave_tool = leave_tool
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.min_relevance = min_relevance
+        self.faq_fn = faq_fn
+        self._lock = threading.Lock()
+        self.routes = Counter()
+        self.llm_calls_saved = 0
+
+    def _record(self, route, saved):
+        with self._lock:
+            self.routes[route] += 1
+            self.llm_calls_saved += saved
+
+    def stats(self):
+        with self._lock:
+            return {"routes": dict(self.routes), "llm_calls_saved": self.llm_calls_saved}
+
+    @staticmethod
+    def _employee_id(query, chat_history):
+        facts = extract_facts(query)
+        if facts:
+            return facts["employee_id"]
+        # Fall back to the history (including the pinned "Known facts" message) only for "my ..." questions.
+        if re.search(r"\b(my|i)\b", query, re.IGNORECASE):
+            for message in reversed(chat_history or []):
+                facts = extract_facts(str(message.content))
+                if facts:
+                    return facts["employee_id"]
+        return None
+
+    def _route(self, inputs):
+        """
+        Returns None (use the agent) or a (route, payload) tuple for the fast path.
+        """
+        query = inputs["input"]
+        if AGENT_ONLY_PATTERN.search(query) or SECOND_CLAUSE_PATTERN.search(query.strip()):
+            return None
+
+        with span("router.classify"):
+            label, score, margin = self.classifier.classify(query)
+        logger.info(f"Router: intent={label} score={score:.3f} margin={margin:.3f}")
+
+        if label == "leave_balance" and score >= self.min_score and margin >= self.min_margin \
+                and LEAVE_BALANCE_PATTERN.search(query) and not LEAVE_POLICY_PATTERN.search(query):
+            employee_id = self._employee_id(query, inputs.get("chat_history"))
+            if employee_id:
+                return "leave_balance", employee_id
+            return None
+
+        if label == "policy" and score >= self.min_score and margin >= self.min_margin \
+                and not PERSONAL_PATTERN.search(query) \
+                and not is_follow_up(query, inputs.get("chat_history")):
+            faq = self.faq_fn() if self.faq_fn else None
+            if faq is not None:
+                with span("router.faq"):
+                    hit = faq.lookup(query)
+                if hit is not None:
+                    return "faq", hit
+            with span("router.retrieve"):
+                hits = self.retriever_fn().search_with_scores(query)
+            if hits:
+                top = hits[0][0].metadata
+                relevance = top.get("vector_score")
+                if top.get("keyword_rank") and relevance is not None and relevance >= self.min_relevance:
+                    return "policy", [doc for doc, _ in hits]
+                logger.info(f"Router: low retrieval confidence (relevance={relevance}); using the agent.")
+        return None
+
+    def _answer(self, route, payload, inputs, config):
+        query = inputs["input"]
+        if route == "leave_balance":
+            with span("router.leave_balance"):
+                output = self.leave_tool.invoke({"employee_id": payload}, config)
+            steps = [(AgentAction(tool=self.leave_tool.name, tool_input=payload, log="intent-router"), output)]
+            self._record(route, AGENT_LLM_CALLS)
+        elif route == "faq":
+            output = format_faq_answer(payload)
+            steps = [(AgentAction(tool="lookup_policy", tool_input=query, log="faq-index"), output)]
+            self._record(route, AGENT_LLM_CALLS)
+        else:
+            context = build_context(payload)
+            with span("router.policy_answer"):
+                # Streamed, so a streaming handler in the config gets tokens as it does on the agent path.
+                prompt = POLICY_ANSWER_PROMPT.format(context=context, question=query)
+                output = "".join(str(chunk.content) for chunk in self.llm.stream(prompt, config))
+            steps = [(AgentAction(tool="lookup_policy", tool_input=query, log="intent-router"), context)]
+            self._record(route, AGENT_LLM_CALLS - 1)
+        return {**inputs, "output": output, "intermediate_steps": steps, "route": route}
+
+    def _record_faq(self, route, seconds):
+        # Policy answers with and without an FAQ hit, timed end to end, give the latency the index saves.
+        faq = self.faq_fn() if self.faq_fn and route in ("faq", "policy") else None
+        if faq is not None:
+            faq.record("router", route == "faq", seconds)
+
+    def invoke(self, inputs, config=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            decision = self._route(inputs)
+        except Exception as e:
+            logger.warning(f"Router failed, falling back to the agent: {e}")
+            decision = None
+        if decision is None:
+            self._record("agent", 0)
+            return self.executor.invoke(inputs, config, **kwargs)
+        response = self._answer(*decision, inputs, config)
+        self._record_faq(decision[0], time.perf_counter() - start)
+        return response
+
+    async def ainvoke(self, inputs, config=None, **kwargs):
+        # Classification, retrieval and the leave lookup are blocking; keep them off the event loop.
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            decision = await loop.run_in_executor(None, contextvars.copy_context().run, self._route, inputs)
+        except Exception as e:
+            logger.warning(f"Router failed, falling back to the agent: {e}")
+            decision = None
+        if decision is None:
+            self._record("agent", 0)
+            return await self.executor.ainvoke(inputs, config, **kwargs)
+        response = await loop.run_in_executor(
+            None, contextvars.copy_context().run, self._answer, *decision, inputs, config
+        )
+        self._record_faq(decision[0], time.perf_counter() - start)
+        return response
@@ -0,0 +1,275 @@
+import json
+import math
+import os
+import shutil
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+INDEX_DIR_NAME = "keyword_index"
+INDEX_FORMAT_VERSION = 1
+
+# Same defaults as rank_bm25.BM25Okapi, which BM25Retriever uses under the hood.
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+
+def default_tokenize(text):
+    """
+    Matches the default preprocessing of langchain's BM25Retriever.
+    """
+    return text.split()
+
+
+class KeywordIndex:
+    """
+    BM25 index stored as CSR postings with precomputed per-posting BM25 weights.
+    Query scoring is a sum over the posting lists of the query terms.
+    """
+
+    def __init__(self, vocab, indptr, doc_ids, weights, text_offsets, text_blob, metadatas, meta):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.text_offsets = text_offsets
+        self.text_blob = text_blob
+        self.metadatas = metadatas
+        self.meta = meta
+
+    def __len__(self):
+        return len(self.metadatas)
+
+    @property
+    def fingerprint(self):
+        return self.meta.get("fingerprint")
+
+    def get_scores(self, query):
+        scores = np.zeros(len(self), dtype=np.float32)
+        for token in default_tokenize(query):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            scores[self.doc_ids[start:end]] += self.weights[start:end]
+        return scores
+
+    def search(self, query, k):
+        """
+        Returns up to k (doc_index, score) pairs, best first.
+        """
+        if len(self) == 0:
+            return []
+        scores = self.get_scores(query)
+        k = min(k, len(scores))
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+        else:
+            top = np.argsort(-scores, kind="stable")
+        return [(int(i), float(scores[i])) for i in top]
+
+    def text(self, doc_index):
+        start, end = self.text_offsets[doc_index], self.text_offsets[doc_index + 1]
+        return bytes(self.text_blob[start:end]).decode("utf-8")
+
+    def document(self, doc_index):
+        return Document(page_content=self.text(doc_index), metadata=dict(self.metadatas[doc_index]))
+
+
+def build_keyword_index(chunks, fingerprint=None):
+    """
+    Builds an in-memory KeywordIndex from chunked Documents.
+    """
+    term_ids = {}
+    postings = []
+    doc_lengths = np.zeros(len(chunks), dtype=np.float32)
+
+    for doc_index, chunk in enumerate(chunks):
+        tokens = default_tokenize(chunk.page_content)
+        doc_lengths[doc_index] = len(tokens)
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, tf in frequencies.items():
+            term_id = term_ids.setdefault(token, len(term_ids))
+            if term_id == len(postings):
+                postings.append([])
+            postings[term_id].append((doc_index, tf))
+
+    corpus_size = len(chunks)
+    avgdl = float(doc_lengths.mean()) if corpus_size else 0.0
+
+    idf = np.zeros(len(postings), dtype=np.float64)
+    for term_id, plist in enumerate(postings):
+        df = len(plist)
+        idf[term_id] = math.log(corpus_size - df + 0.5) - math.log(df + 0.5)
+    if len(idf):
+        eps = BM25_EPSILON * idf.mean()
+        idf[idf < 0] = eps
+
+    indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+    for term_id, plist in enumerate(postings):
+        indptr[term_id + 1] = indptr[term_id] + len(plist)
+
+    doc_ids = np.empty(indptr[-1], dtype=np.int32)
+    weights = np.empty(indptr[-1], dtype=np.float32)
+    for term_id, plist in enumerate(postings):
+        start = indptr[term_id]
+        ids = np.fromiter((d for d, _ in plist), dtype=np.int32, count=len(plist))
+        tf = np.fromiter((t for _, t in plist), dtype=np.float32, count=len(plist))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[ids] / avgdl)
+        doc_ids[start:start + len(plist)] = ids
+        weights[start:start + len(plist)] = idf[term_id] * (tf * (BM25_K1 + 1) / (tf + norm))
+
+    encoded = [c.page_content.encode("utf-8") for c in chunks]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        text_offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    meta = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "num_docs": corpus_size,
+        "num_terms": len(postings),
+        "avgdl": avgdl,
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "epsilon": BM25_EPSILON,
+    }
+    return KeywordIndex(
+        vocab=term_ids,
+        indptr=indptr,
+        doc_ids=doc_ids,
+        weights=weights,
+        text_offsets=text_offsets,
+        text_blob=b"".join(encoded),
+        metadatas=[dict(c.metadata) for c in chunks],
+        meta=meta,
+    )
+
+
+def save_keyword_index(index, index_path):
+    """
+    Writes the index as .npy arrays plus a raw text blob, so it can be memory-mapped on load.
+    The directory is replaced atomically.
+    """
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    np.save(os.path.join(tmp_path, "indptr.npy"), index.indptr)
+    np.save(os.path.join(tmp_path, "doc_ids.npy"), index.doc_ids)
+    np.save(os.path.join(tmp_path, "weights.npy"), index.weights)
+    np.save(os.path.join(tmp_path, "text_offsets.npy"), index.text_offsets)
+    with open(os.path.join(tmp_path, "texts.bin"), "wb") as f:
+        f.write(bytes(index.text_blob))
+    with open(os.path.join(tmp_path, "vocab.json"), "w", encoding="utf-8") as f:
+        json.dump(index.vocab, f, ensure_ascii=False)
+    with open(os.path.join(tmp_path, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(index.metadatas, f, ensure_ascii=False)
+    # meta.json is written last: its presence marks a complete index.
+    with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(index.meta, f, indent=2)
+
+    if os.path.exists(index_path):
+        shutil.rmtree(index_path)
+    os.replace(tmp_path, index_path)
+    logger.info(f"Keyword index with {len(index)} chunks saved to {index_path}")
+
+
+def load_keyword_index(index_path, expected_fingerprint=None):
+    """
+    Memory-maps a saved KeywordIndex.
+    Returns None if the index is missing, from another format version, or stale.
+    """
+    meta_path = os.path.join(index_path, "meta.json")
+    if not os.path.exists(meta_path):
+        logger.info(f"No keyword index found at {index_path}")
+        return None
+
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+
+        if meta.get("format_version") != INDEX_FORMAT_VERSION:
+            logger.warning(f"Keyword index format {meta.get('format_version')} is not supported.")
+            return None
+        if expected_fingerprint is not None and meta.get("fingerprint") != expected_fingerprint:
+            logger.warning("Keyword index is stale: knowledge base fingerprint changed.")
+            return None
+
+        with open(os.path.join(index_path, "vocab.json"), "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(index_path, "metadata.json"), "r", encoding="utf-8") as f:
+            metadatas = json.load(f)
+
+        blob_path = os.path.join(index_path, "texts.bin")
+        if os.path.getsize(blob_path) > 0:
+            text_blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+        else:
+            text_blob = b""
+
+        return KeywordIndex(
+            vocab=vocab,
+            indptr=np.load(os.path.join(index_path, "indptr.npy"), mmap_mode="r"),
+            doc_ids=np.load(os.path.join(index_path, "doc_ids.npy"), mmap_mode="r"),
+            weights=np.load(os.path.join(index_path, "weights.npy"), mmap_mode="r"),
+            text_offsets=np.load(os.path.join(index_path, "text_offsets.npy"), mmap_mode="r"),
+            text_blob=text_blob,
+            metadatas=metadatas,
+            meta=meta,
+        )
+    except Exception as e:
+        logger.error(f"Failed to load keyword index from {index_path}: {e}", exc_info=True)
+        return None
+
+
+class PersistedBM25Retriever(BaseRetriever):
+    """
+    BM25 retriever backed by a KeywordIndex; a drop-in for BM25Retriever.
+    """
+
+    index: KeywordIndex
+    k: int = 4
+
+    def search_with_scores(self, query, k=None):
+        """
+        Returns (Document, bm25_score) pairs, best first.
+        """
+        hits = self.index.search(query, self.k if k is None else k)
+        return [(self.index.document(i), score) for i, score in hits]
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [doc for doc, _ in self.search_with_scores(query)]
+
+
+def get_keyword_retriever(data_path, db_path, k=4):
+    """
+    Loads the persisted keyword index stored next to the vector database.
+    Falls back to rebuilding (and re-saving) it from the knowledge base when it is missing or stale.
+    """
+    from chunking import chunk_documents
+    from document_loader import kb_fingerprint, load_document
+
+    index_path = os.path.join(db_path, INDEX_DIR_NAME)
+    fingerprint = kb_fingerprint(data_path)
+    index = load_keyword_index(index_path, expected_fingerprint=fingerprint)
+
+    if index is None:
+        logger.info("Rebuilding keyword index from the knowledge base.")
+        chunks = chunk_documents(load_document(data_path) or [])
+        index = build_keyword_index(chunks, fingerprint=fingerprint)
+        try:
+            save_keyword_index(index, index_path)
+        except OSError as e:
+            logger.warning(f"Could not persist rebuilt keyword index: {e}")
+    else:
+        logger.info(f"Loaded keyword index with {len(index)} chunks from {index_path}")
+
+    return PersistedBM25Retriever(index=index, k=k)
@@ -0,0 +1,191 @@
+import argparse
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+LEAVE_DB_PATH = os.getenv("LEAVE_DB_PATH", "./data/leave.db")
+# Stay under SQLite's default host-parameter limit for IN (...) batches.
+MAX_BATCH_PARAMS = 900
+
+DEMO_EMPLOYEES = [
+    (123, "Demo Employee 123", 15, 3),
+    (999, "Demo Employee 999", 0, 0),
+]
+
+SELECT_ONE = "SELECT employee_id, annual_leave, sick_days FROM employees WHERE employee_id = ?"
+UPSERT = (
+    "INSERT INTO employees (employee_id, name, annual_leave, sick_days) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT(employee_id) DO UPDATE SET name = excluded.name, "
+    "annual_leave = excluded.annual_leave, sick_days = excluded.sick_days"
+)
+
+
+def parse_employee_id(employee_id):
+    """
+    Extracts the numeric id from inputs like 'EMP-123', 'emp 123' or '123'. Returns None if absent.
+    """
+    match = re.search(r"\d+", str(employee_id))
+    return int(match.group()) if match else None
+
+
+class LeaveStore:
+    """
+    SQLite-backed employee leave balances.
+
+    Each thread reuses its own connection (SQLite connections must not be shared across
+    threads), and every query uses fixed SQL text so the per-connection statement cache
+    keeps them prepared. employee_id is the INTEGER PRIMARY KEY, i.e. the table's B-tree key.
+    """
+
+    def __init__(self, path=LEAVE_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS employees ("
+            "employee_id INTEGER PRIMARY KEY, "
+            "name TEXT NOT NULL, "
+            "annual_leave INTEGER NOT NULL, "
+            "sick_days INTEGER NOT NULL)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM employees").fetchone()[0]
+
+    def get_balance(self, employee_id):
+        """
+        Returns {'employee_id', 'annual_leave', 'sick_days'} or None if the employee is unknown.
+        """
+        row = self._connection().execute(SELECT_ONE, (employee_id,)).fetchone()
+        if row is None:
+            return None
+        return {"employee_id": row[0], "annual_leave": row[1], "sick_days": row[2]}
+
+    def get_balances(self, employee_ids):
+        """
+        Batch lookup for reports. Returns {employee_id: balance dict}; unknown ids are omitted.
+        """
+        unique_ids = list(dict.fromkeys(employee_ids))
+        conn = self._connection()
+        balances = {}
+        full_batch_sql = None
+        for start in range(0, len(unique_ids), MAX_BATCH_PARAMS):
+            batch = unique_ids[start:start + MAX_BATCH_PARAMS]
+            if len(batch) == MAX_BATCH_PARAMS:
+                # Same SQL text for every full batch, so it stays in the statement cache.
+                if full_batch_sql is None:
+                    full_batch_sql = self._batch_sql(MAX_BATCH_PARAMS)
+                sql = full_batch_sql
+            else:
+                sql = self._batch_sql(len(batch))
+            for employee_id, annual_leave, sick_days in conn.execute(sql, batch):
+                balances[employee_id] = {
+                    "employee_id": employee_id, "annual_leave": annual_leave, "sick_days": sick_days,
+                }
+        return balances
+
+    @staticmethod
+    def _batch_sql(size):
+        placeholders = ",".join("?" * size)
+        return (
+            "SELECT employee_id, annual_leave, sick_days FROM employees "
+            f"WHERE employee_id IN ({placeholders})"
+        )
+
+    def upsert_employees(self, rows):
+        """
+        Inserts or updates (employee_id, name, annual_leave, sick_days) rows in one transaction.
+        """
+        conn = self._connection()
+        with conn:
+            conn.executemany(UPSERT, rows)
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def seed_employees(store, count, batch_size=50000, seed=42):
+    """
+    Fills the store with `count` synthetic employees (ids 1..count). The demo employees
+    123 and 999 always keep their documented balances. Returns the elapsed seconds.
+    """
+    rng = random.Random(seed)
+    demo = {row[0]: row for row in DEMO_EMPLOYEES}
+    start = time.perf_counter()
+
+    for batch_start in range(1, count + 1, batch_size):
+        batch_end = min(batch_start + batch_size, count + 1)
+        rows = [
+            demo.get(employee_id) or (employee_id, f"Employee {employee_id}", rng.randint(0, 30), rng.randint(0, 10))
+            for employee_id in range(batch_start, batch_end)
+        ]
+        store.upsert_employees(rows)
+
+    store.upsert_employees(DEMO_EMPLOYEES)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Seeded {count} employees into {store.path} in {elapsed:.2f}s")
+    return elapsed
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_leave_store():
+    """
+    Process-wide LeaveStore; an empty database is seeded with the demo employees.
+    Reopened after a fork, since SQLite connections must not be used across processes.
+    """
+    global _store, _store_pid
+    if _store is None or _store_pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store_pid != os.getpid():
+                store = LeaveStore()
+                if store.count() == 0:
+                    logger.info("Leave store is empty; seeding demo employees.")
+                    store.upsert_employees(DEMO_EMPLOYEES)
+                _store = store
+                _store_pid = os.getpid()
+    return _store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local employee leave store.")
+    parser.add_argument("--seed", type=int, default=0, help="Number of synthetic employees to generate.")
+    parser.add_argument("--path", default=LEAVE_DB_PATH)
+    args = parser.parse_args()
+
+    store = LeaveStore(args.path)
+    if args.seed:
+        elapsed = seed_employees(store, args.seed)
+        print(f"Seeded {args.seed} employees in {elapsed:.2f}s")
+    else:
+        store.upsert_employees(DEMO_EMPLOYEES)
+    print(f"{store.count()} employees in {args.path}")
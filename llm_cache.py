@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, message_chunk_to_message, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# passthrough: call the model; record: call it and store every response; replay: serve stored
+# responses only, never touching the network.
+LLM_CACHE_MODES = ("passthrough", "record", "replay")
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "passthrough")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./data/llm_cache.db")
+DEFAULT_MODEL = "gemini-2.0-flash"
+
+# Values that legitimately differ between a recording and its replay; masked in request keys.
+VOLATILE_PATTERNS = [
+    (re.compile(r"\bINC-\d+\b"), "INC-#"),  # ticket ids from the ticket store
+]
+
+
+class LLMCacheMiss(KeyError):
+    """
+    Raised in replay mode when a request was never recorded.
+    """
+
+
+def canonical_message(message):
+    """
+    The parts of a message that determine the model's answer (message and tool-call ids are
+    random per run, so they are left out).
+    """
+    entry = {"type": message.type, "content": message.content}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        entry["tool_calls"] = [{"name": call["name"], "args": call["args"]} for call in tool_calls]
+    if getattr(message, "name", None):
+        entry["name"] = message.name
+    return entry
+
+
+def request_key(model_id, messages, tools=None, stop=None, **kwargs):
+    """
+    Hash of everything that goes into one chat-model call.
+    """
+    payload = json.dumps(
+        {
+            "model": model_id,
+            "messages": [canonical_message(m) for m in messages],
+            "tools": tools or [],
+            "stop": stop,
+            "kwargs": kwargs,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    for pattern, replacement in VOLATILE_PATTERNS:
+        payload = pattern.sub(replacement, payload)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def message_to_chunk(message):
+    """
+    A recorded response message as one streamable chunk, tool calls included.
+    """
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=getattr(message, "usage_metadata", None),
+        id=message.id,
+        tool_call_chunks=[
+            {"name": call["name"], "args": json.dumps(call["args"]), "id": call.get("id"), "index": i}
+            for i, call in enumerate(getattr(message, "tool_calls", None) or [])
+        ],
+    )
+
+
+class LLMCallStore:
+    """
+    SQLite map of request key -> zlib-compressed JSON of the model's response message
+    (content, tool calls and metadata). One primary-key lookup per replayed call.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH):
+        self.path = path
+        self.stats = {"hits": 0, "misses": 0, "recorded": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS calls ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, response BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM calls WHERE key = ?", (key,)).fetchone()
+            self.stats["hits" if row else "misses"] += 1
+        if row is None:
+            return None
+        return messages_from_dict([json.loads(zlib.decompress(row[0]))])[0]
+
+    def put(self, key, model_id, message):
+        blob = zlib.compress(json.dumps(message_to_dict(message), ensure_ascii=False).encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO calls (key, model, response, created_at) VALUES (?, ?, ?, ?)",
+                (key, model_id, blob, time.time()),
+            )
+            self.stats["recorded"] += 1
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RecordReplayChatModel(BaseChatModel):
+    """
+    Chat-model wrapper that records responses of the wrapped model, or replays them offline.
+
+    Requests are keyed by model id, messages (including tool calls and tool results), bound tool
+    schemas, stop words and call options. In replay mode `llm` may be None, so no client or API key
+    is needed; a request that was never recorded raises LLMCacheMiss.
+    """
+
+    llm: Any = None
+    store: Any
+    mode: str = "passthrough"
+    model_id: str = DEFAULT_MODEL
+    tools: List[Dict[str, Any]] = []
+    bind_kwargs: Dict[str, Any] = {}
+
+    @property
+    def _llm_type(self):
+        return f"record-replay:{self.model_id}"
+
+    def bind_tools(self, tools, **kwargs):
+        inner = self.llm.bind_tools(tools, **kwargs) if self.llm is not None else None
+        return self.__class__(
+            llm=inner,
+            store=self.store,
+            mode=self.mode,
+            model_id=self.model_id,
+            tools=[convert_to_openai_tool(t) for t in tools],
+            bind_kwargs=kwargs,
+        )
+
+    def _lookup(self, messages, stop, kwargs):
+        # Call-time options override bound ones (e.g. tool_choice), as they do for the wrapped model.
+        key = request_key(self.model_id, messages, self.tools, stop, **{**self.bind_kwargs, **kwargs})
+        if self.mode == "replay":
+            message = self.store.get(key)
+            if message is None:
+                last = str(messages[-1].content)[:80] if messages else ""
+                raise LLMCacheMiss(f"No recorded response for this {self.model_id} request (last message: {last!r})")
+            return key, message
+        return key, None
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key, message = self._lookup(messages, stop, kwargs)
+        if message is None:
+            # No callbacks for the inner call: tracers already see this call through the wrapper.
+            message = self.llm.invoke(messages, stop=stop, **kwargs)
+            if self.mode == "record":
+                self.store.put(key, self.model_id, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        # A stored response is replayed as one chunk; a live one is streamed and stored once complete.
+        key, message = self._lookup(messages, stop, kwargs)
+        if message is not None:
+            chunk = ChatGenerationChunk(message=message_to_chunk(message))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            return
+
+        streamed = None
+        for message_chunk in self.llm.stream(messages, stop=stop, **kwargs):
+            streamed = message_chunk if streamed is None else streamed + message_chunk
+            chunk = ChatGenerationChunk(message=message_chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+        if self.mode == "record" and streamed is not None:
+            self.store.put(key, self.model_id, message_chunk_to_message(streamed))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        key, message = self._lookup(messages, stop, kwargs)
+        if message is None:
+            message = await self.llm.ainvoke(messages, stop=stop, **kwargs)
+            if self.mode == "record":
+                self.store.put(key, self.model_id, message)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+_stores = {}
+_stores_pid = None
+_stores_lock = threading.Lock()
+
+
+def get_llm_store(path=LLM_CACHE_PATH):
+    """
+    Process-wide LLMCallStore per path, reopened after a fork.
+    """
+    global _stores_pid
+    with _stores_lock:
+        if _stores_pid != os.getpid():
+            _stores.clear()
+            _stores_pid = os.getpid()
+        if path not in _stores:
+            _stores[path] = LLMCallStore(path)
+        return _stores[path]
+
+
+def build_chat_model(model=DEFAULT_MODEL, temperature=0, mode=None, path=None):
+    """
+    Builds the Gemini chat model used by every entry point, wrapped for LLM_CACHE_MODE.
+    Passthrough returns the plain client; replay never constructs it.
+    """
+    mode = mode or LLM_CACHE_MODE
+    if mode not in LLM_CACHE_MODES:
+        raise ValueError(f"Unknown LLM cache mode: {mode}")
+
+    llm = None
+    if mode != "replay":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        llm = ChatGoogleGenerativeAI(model=model, google_api_key=os.getenv("GOOGLE_API_KEY"), temperature=temperature)
+        if mode == "passthrough":
+            return llm
+
+    path = path or LLM_CACHE_PATH
+    logger.info(f"LLM calls to {model} in {mode} mode ({path}).")
+    return RecordReplayChatModel(
+        llm=llm, store=get_llm_store(path), mode=mode, model_id=f"{model}/temperature={temperature}"
+    )
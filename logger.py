@@ -1,19 +1,284 @@
+import atexit
+import gzip
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import shutil
 import sys
+import threading
+import time
 
 LOG_DIR = "logs"
 LOG_FILE = "app.log"
 
+# Backend settings, overridable from the environment / .env.
+LOG_ROTATION = os.getenv("LOG_ROTATION", "size")              # size | time | none
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")    # TimedRotatingFileHandler 'when'
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "7"))
+LOG_COMPRESS = os.getenv("LOG_COMPRESS", "1") == "1"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")                  # text | json
+LOG_INFO_SAMPLE_RATE = float(os.getenv("LOG_INFO_SAMPLE_RATE", "1.0"))
+LOG_INFO_RATE_LIMIT = float(os.getenv("LOG_INFO_RATE_LIMIT", "0"))  # INFO lines/sec per logger, 0 = unlimited
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = '%(asctime)s - [%(levelname)s] - %(name)s - %(module)s.%(funcName)s:%(lineno)d - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_backend_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+# Separate raw-line backends (e.g. trace spans): path -> [queue handler, listener].
+_line_backends = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log shippers.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, DATE_FORMAT),
+            "level": record.levelname,
+            "logger": record.name,
+            "location": f"{record.module}.{record.funcName}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class InfoVolumeFilter(logging.Filter):
+    """
+    Samples and rate-limits INFO-and-below records per logger; WARNING and above always pass.
+    The number of suppressed lines is appended to the next line that gets through.
+    """
+
+    def __init__(self, sample_rate=1.0, rate_limit=0.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        # Room for at least one line, so rates below 1 line/s still let a line through now and then.
+        self.capacity = max(1.0, rate_limit)
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._suppressed = {}
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return self._suppress(record.name)
+        if self.rate_limit > 0:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(record.name, (self.capacity, now))
+                tokens = min(self.capacity, tokens + (now - last) * self.rate_limit)
+                if tokens < 1:
+                    self._buckets[record.name] = (tokens, now)
+                    self._suppressed[record.name] = self._suppressed.get(record.name, 0) + 1
+                    return False
+                self._buckets[record.name] = (tokens - 1, now)
+        with self._lock:
+            suppressed = self._suppressed.pop(record.name, 0)
+        if suppressed:
+            record.msg = f"{record.getMessage()} [{suppressed} INFO lines suppressed]"
+            record.args = None
+        return True
+
+    def _suppress(self, name):
+        with self._lock:
+            self._suppressed[name] = self._suppressed.get(name, 0) + 1
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records without formatting them; the listener thread does formatting and disk I/O.
+    When the queue is full the record is dropped instead of blocking the caller; the drop count
+    is written to the log as a WARNING once the queue has room again, and at shutdown.
+    """
+
+    dropped = 0
+    reported = 0
+    label = "log"
+
+    def prepare(self, record):
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self.dropped > self.reported:
+            self.report_dropped(block=False)
+
+    def report_dropped(self, block=False):
+        """
+        Enqueues a WARNING with the number of records dropped since the last report.
+        """
+        count = self.dropped - self.reported
+        if count <= 0:
+            return
+        record = logging.LogRecord(
+            __name__, logging.WARNING, __file__, 0,
+            f"{count} {self.label} records dropped because the {self.label} queue was full ({self.dropped} in total).",
+            None, None, func="enqueue",
+        )
+        report_queue = self.report_queue()
+        if report_queue is None:
+            return
+        try:
+            report_queue.put(record, block=block, timeout=1.0 if block else None)
+        except queue.Full:
+            return
+        self.reported += count
+
+    def report_queue(self):
+        return self.queue
+
+
+class LineQueueHandler(NonBlockingQueueHandler):
+    """
+    Queue handler for a raw-line file (see setup_line_logger); drop counts go to the application
+    log so the line file only ever contains the caller's own lines.
+    """
+
+    def __init__(self, queue, path):
+        super().__init__(queue)
+        self.label = os.path.basename(path)
+
+    def report_queue(self):
+        return _queue_handler.queue if _queue_handler is not None else None
+
+
+def _gzip_namer(name):
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def _build_file_handler(log_path, rotate=True, formatter=None):
+    if not rotate:
+        # Forked workers append to the parent's file and reopen it after the parent rotates it.
+        handler = logging.handlers.WatchedFileHandler(log_path, encoding='utf-8')
+    elif LOG_ROTATION == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(
+            log_path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    elif LOG_ROTATION == "size":
+        handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    else:
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+
+    if rotate and LOG_COMPRESS and LOG_ROTATION in ("size", "time"):
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+
+    if formatter is not None:
+        handler.setFormatter(formatter)
+    elif LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=DATE_FORMAT))
+    handler.setLevel(logging.INFO)
+    return handler
+
+
+def _get_queue_handler(log_path):
+    """
+    Starts the shared queue listener on first use and returns the handler that feeds it.
+    """
+    global _queue_handler, _listener
+    with _backend_lock:
+        if _queue_handler is None:
+            log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+            _listener = logging.handlers.QueueListener(
+                log_queue, _build_file_handler(log_path), respect_handler_level=True
+            )
+            _listener.start()
+            atexit.register(shutdown_logging)
+
+            _queue_handler = NonBlockingQueueHandler(log_queue)
+            _queue_handler.setLevel(logging.INFO)
+            if LOG_INFO_SAMPLE_RATE < 1.0 or LOG_INFO_RATE_LIMIT > 0:
+                _queue_handler.addFilter(InfoVolumeFilter(LOG_INFO_SAMPLE_RATE, LOG_INFO_RATE_LIMIT))
+        return _queue_handler
+
+
+def _restart_after_fork():
+    """
+    The listener thread does not survive fork(): the child gets a fresh queue (the inherited one
+    may have been locked mid-operation) and its own listener. Only the parent rotates the file.
+    """
+    global _backend_lock, _listener
+    _backend_lock = threading.Lock()
+    for path, backend in _line_backends.items():
+        backend[0].queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        backend[1] = logging.handlers.QueueListener(
+            backend[0].queue, _build_file_handler(path, rotate=False, formatter=logging.Formatter("%(message)s")),
+            respect_handler_level=True,
+        )
+        backend[1].start()
+    if _queue_handler is None:
+        return
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(
+        log_queue, _build_file_handler(os.path.join(LOG_DIR, LOG_FILE), rotate=False), respect_handler_level=True
+    )
+    _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def shutdown_logging():
+    """
+    Flushes queued records to disk and stops the listener thread.
+    """
+    global _listener
+    with _backend_lock:
+        for backend in _line_backends.values():
+            if backend[1] is not None:
+                backend[0].report_dropped(block=True)
+                backend[1].stop()
+                backend[1] = None
+        if _listener is not None:
+            if _queue_handler is not None:
+                _queue_handler.report_dropped(block=True)
+            _listener.stop()
+            _listener = None
+
+
 def setup_logger(name=__name__):
     """
     Configures and returns a logger instance that writes strictly to a file.
     No output will appear in the console.
+    Records go through a bounded in-memory queue; a background thread writes them to a
+    rotating (and by default gzip-compressed) log file.
     """
 
     if not os.path.exists(LOG_DIR):
         try:
-            os.makedirs(LOG_DIR)
+            os.makedirs(LOG_DIR, exist_ok=True)
         except OSError as e:
             print(f"Critical Error: Could not create log directory. {e}")
             sys.exit(1)
@@ -24,18 +289,36 @@ def setup_logger(name=__name__):
     logger.setLevel(logging.INFO)
 
     if not logger.handlers:
-        file_handler = logging.FileHandler(log_path, encoding='utf-8')
-        file_handler.setLevel(logging.INFO)
-
-        
-        formatter = logging.Formatter(
-            '%(asctime)s - [%(levelname)s] - %(name)s - %(module)s.%(funcName)s:%(lineno)d - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-        file_handler.setFormatter(formatter)
+        logger.addHandler(_get_queue_handler(log_path))
 
-        logger.addHandler(file_handler)
-        
         logger.propagate = False
 
-    return logger
\ No newline at end of file
+    return logger
+
+
+def setup_line_logger(path):
+    """
+    Returns a logger that writes each message verbatim as one line of its own rotating file,
+    through a separate queue listener and without the INFO sampling / rate limits.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _backend_lock:
+        if path not in _line_backends:
+            log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+            listener = logging.handlers.QueueListener(
+                log_queue, _build_file_handler(path, formatter=logging.Formatter("%(message)s")),
+                respect_handler_level=True,
+            )
+            listener.start()
+            atexit.register(shutdown_logging)
+            handler = LineQueueHandler(log_queue, path)
+            handler.setLevel(logging.INFO)
+            _line_backends[path] = [handler, listener]
+        handler = _line_backends[path][0]
+
+    logger = logging.getLogger(f"lines:{os.path.abspath(path)}")
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
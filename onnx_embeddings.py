@@ -0,0 +1,75 @@
+import os
+import time
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./models/all-MiniLM-L6-v2-onnx-int8")
+ONNX_MODEL_FILE = "model_quantized.onnx"
+# all-MiniLM-L6-v2's sentence-transformers max_seq_length.
+MAX_SEQ_LENGTH = 256
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    all-MiniLM-L6-v2 on onnxruntime (int8-quantized export, see export_onnx_model.py).
+
+    Reproduces the sentence-transformers pipeline (mean pooling over the attention mask,
+    then L2 normalization) with only onnxruntime, tokenizers and NumPy, so torch is never imported.
+    Texts are sorted by length before batching to keep padding small.
+    """
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, batch_size=32, num_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        start = time.perf_counter()
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"{model_path} not found; run export_onnx_model.py first.")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+        self.batch_size = batch_size
+        logger.info(f"Loaded ONNX embedding model from {model_path} in {time.perf_counter() - start:.3f}s")
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return pooled / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch_index = order[start:start + self.batch_size]
+            batch_vectors = self._encode_batch([texts[i] for i in batch_index])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), batch_vectors.shape[1]), dtype=np.float32)
+            vectors[batch_index] = batch_vectors
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode_batch([text])[0].tolist()
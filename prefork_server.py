@@ -0,0 +1,284 @@
+"""
+Pre-fork serving mode: one parent loads the embedding model, the BM25 index and the flat vector
+index once, then forks worker processes that each run the asyncio AgentServer on the same
+listening socket.
+
+    python prefork_server.py --workers 8 --port 8765
+
+The indexes are memory-mapped files and the model weights are loaded before fork(), so workers
+share those pages copy-on-write instead of each holding a private copy. Linux only (fork and
+/proc). The parent restarts workers that die and logs per-worker RSS/PSS plus node memory every
+PREFORK_MEMORY_REPORT_INTERVAL seconds (send SIGUSR1 for an immediate report).
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+import time
+from dotenv import load_dotenv
+from flat_vector_store import VECTOR_STORES
+from logger import setup_logger, shutdown_logging
+from server import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_MAX_QUEUE,
+    DEFAULT_REQUEST_TIMEOUT,
+    AgentServer,
+    build_agent,
+)
+
+load_dotenv()
+logger = setup_logger(__name__)
+
+DEFAULT_WORKERS = int(os.getenv("PREFORK_WORKERS", str(os.cpu_count() or 1)))
+MEMORY_REPORT_INTERVAL = float(os.getenv("PREFORK_MEMORY_REPORT_INTERVAL", "60"))
+# A worker that dies sooner than this after starting is not restarted in a tight loop.
+RESTART_BACKOFF_SECONDS = 1.0
+
+
+def read_process_memory(pid):
+    """
+    Returns {"rss_mb", "pss_mb", "shared_mb", "private_mb"} for a process from /proc.
+    PSS charges each shared page to its sharers proportionally, so PSS values add up to real usage.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) / 1024.0
+    except OSError:
+        # Kernels before 4.14 have no smaps_rollup; fall back to RSS only.
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        fields["Rss"] = int(line.split()[1]) / 1024.0
+        except OSError:
+            return None
+    return {
+        "rss_mb": fields.get("Rss"),
+        "pss_mb": fields.get("Pss"),
+        "shared_mb": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0) if "Pss" in fields else None,
+        "private_mb": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0) if "Pss" in fields else None,
+    }
+
+
+def read_node_memory():
+    """
+    Returns {"total_mb", "available_mb", "used_mb"} from /proc/meminfo.
+    """
+    fields = {}
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                name, value = line.split(":", 1)
+                fields[name] = int(value.split()[0]) / 1024.0
+    except OSError:
+        return None
+    total = fields.get("MemTotal", 0.0)
+    available = fields.get("MemAvailable", fields.get("MemFree", 0.0))
+    return {"total_mb": total, "available_mb": available, "used_mb": total - available}
+
+
+def memory_report(parent_pid, worker_pids):
+    """
+    Memory of the parent and every worker plus their combined RSS and PSS. The combined PSS is
+    what the serving tree really costs; the combined RSS counts shared pages once per process.
+    """
+    processes = {"parent": read_process_memory(parent_pid)}
+    for pid in worker_pids:
+        processes[f"worker-{pid}"] = read_process_memory(pid)
+    alive = [m for m in processes.values() if m]
+    return {
+        "processes": processes,
+        "total_rss_mb": sum(m["rss_mb"] or 0.0 for m in alive),
+        "total_pss_mb": sum(m["pss_mb"] or 0.0 for m in alive) if all(m["pss_mb"] is not None for m in alive) else None,
+        "node": read_node_memory(),
+    }
+
+
+def format_memory_report(report):
+    def mb(value):
+        return "n/a" if value is None else f"{value:.1f}MB"
+
+    lines = []
+    for name, m in report["processes"].items():
+        if m is None:
+            lines.append(f"{name}: gone")
+        else:
+            lines.append(
+                f"{name}: rss={mb(m['rss_mb'])} pss={mb(m['pss_mb'])} "
+                f"shared={mb(m['shared_mb'])} private={mb(m['private_mb'])}"
+            )
+    lines.append(f"total: rss={mb(report['total_rss_mb'])} pss={mb(report['total_pss_mb'])}")
+    node = report["node"]
+    if node:
+        lines.append(f"node: used={mb(node['used_mb'])} available={mb(node['available_mb'])} total={mb(node['total_mb'])}")
+    return "\n".join(lines)
+
+
+def load_shared_state(vector_store="flat"):
+    """
+    Loads everything workers should share and runs the warm-up probe. Call before forking.
+
+    The embedding model runs single-threaded: each worker is one core's worth of parallelism, and
+    neither OpenMP nor onnxruntime thread pools survive fork().
+    """
+    from agent_tool import get_embedding_model, get_global_retriever, warm_up
+
+    os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    get_embedding_model(num_threads=1)
+    get_global_retriever(vector_store=vector_store)
+    timings = warm_up()
+    # Move everything loaded so far out of the collector's reach, so a GC pass in a worker does
+    # not write to (and un-share) the parent's object pages.
+    gc.collect()
+    gc.freeze()
+    return timings
+
+
+async def _serve_worker(sock, options):
+    agent, memory_factory = build_agent(offline=options.offline)
+    server = AgentServer(
+        agent,
+        memory_factory=memory_factory,
+        max_concurrency=options.max_concurrency,
+        max_queue=options.max_queue,
+        request_timeout=options.timeout,
+    )
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    await server.serve(sock=sock)
+    await stopping.wait()
+    await server.stop()
+
+
+class PreforkServer:
+    """
+    Supervises `workers` forked AgentServer processes sharing one listening socket.
+    """
+
+    def __init__(self, options, sock):
+        self.options = options
+        self.sock = sock
+        self.workers = {}  # pid -> started_at
+        self._stopping = False
+        self._report_requested = False
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+                logger.info(f"Worker {os.getpid()} started.")
+                asyncio.run(_serve_worker(self.sock, self.options))
+            except Exception as e:
+                logger.error(f"Worker {os.getpid()} crashed: {e}", exc_info=True)
+                code = 1
+            finally:
+                shutdown_logging()
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def start(self):
+        for _ in range(self.options.workers):
+            self._spawn()
+        logger.info(f"Forked {len(self.workers)} workers: {sorted(self.workers)}")
+
+    def report(self):
+        report = memory_report(os.getpid(), sorted(self.workers))
+        logger.info("Memory report:\n" + format_memory_report(report))
+        return report
+
+    def _reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started_at = self.workers.pop(pid, None)
+            if started_at is None:
+                continue
+            if not self._stopping:
+                logger.warning(f"Worker {pid} exited with status {status}; restarting.")
+                if time.monotonic() - started_at < RESTART_BACKOFF_SECONDS:
+                    time.sleep(RESTART_BACKOFF_SECONDS)
+                self._spawn()
+
+    def supervise(self):
+        """
+        Blocks until SIGINT/SIGTERM, restarting dead workers and reporting memory periodically.
+        """
+        signal.signal(signal.SIGTERM, lambda *_: self._request_stop())
+        signal.signal(signal.SIGINT, lambda *_: self._request_stop())
+        signal.signal(signal.SIGUSR1, lambda *_: setattr(self, "_report_requested", True))
+        next_report = time.monotonic() + MEMORY_REPORT_INTERVAL
+        while not self._stopping:
+            time.sleep(0.2)
+            self._reap()
+            if self._report_requested or time.monotonic() >= next_report:
+                self._report_requested = False
+                print(format_memory_report(self.report()), flush=True)
+                next_report = time.monotonic() + MEMORY_REPORT_INTERVAL
+        self.stop()
+
+    def _request_stop(self):
+        self._stopping = True
+
+    def stop(self, timeout=10.0):
+        self._stopping = True
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + timeout
+        while self.workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for pid in list(self.workers):
+            logger.warning(f"Worker {pid} did not stop in {timeout}s; killing it.")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.workers.pop(pid, None)
+        logger.info("All workers stopped.")
+
+
+def bind_socket(host, port, backlog=1024):
+    sock = socket.create_server((host, port), backlog=backlog)
+    sock.setblocking(False)
+    return sock
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the HR agent from pre-forked worker processes.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes (default: all cores).")
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, help="Per worker.")
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE, help="Per worker.")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT)
+    parser.add_argument("--vector-store", choices=VECTOR_STORES, default="flat",
+                        help="flat shares the memory-mapped vectors; chroma gives each worker its own client.")
+    parser.add_argument("--offline", action="store_true", help="Use a fake LLM (for local load tests).")
+    args = parser.parse_args()
+
+    timings = load_shared_state(args.vector_store)
+    listener = bind_socket(args.host, args.port)
+    prefork = PreforkServer(args, listener)
+    prefork.start()
+    print(f"Agent server listening on {args.host}:{args.port} with {args.workers} workers "
+          f"(warm-up {json.dumps({k: round(v, 3) for k, v in timings.items()})})", flush=True)
+    time.sleep(1.0)
+    print(format_memory_report(prefork.report()), flush=True)
+    prefork.supervise()
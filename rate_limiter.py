@@ -0,0 +1,106 @@
+import random
+import threading
+import time
+from typing import Any
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+RATE_LIMIT_MARKERS = ("429", "resourceexhausted", "resource exhausted", "rate limit", "ratelimit", "quota")
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `rate` tokens are added per second up to `capacity`;
+    acquire() blocks until enough tokens are available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute, burst=None):
+        return cls(requests_per_minute / 60.0, capacity=burst)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """
+        Takes `tokens` from the bucket, sleeping as needed. Returns the time spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def is_rate_limit_error(error):
+    """
+    Heuristic check for provider rate-limit / quota errors (HTTP 429, ResourceExhausted).
+    """
+    text = f"{type(error).__name__} {error}".lower()
+    return any(marker in text for marker in RATE_LIMIT_MARKERS)
+
+
+def call_with_retry(fn, limiter=None, max_retries=5, base_delay=2.0, max_delay=60.0):
+    """
+    Calls fn() after taking a token from the limiter. Rate-limit errors are retried with
+    exponential backoff and jitter; any other error is raised immediately.
+    """
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_rate_limit_error(e):
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            attempt += 1
+            logger.warning(f"Rate limited (attempt {attempt}/{max_retries}), retrying in {delay:.1f}s: {e}")
+            time.sleep(delay)
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """
+    Chat-model wrapper that takes a limiter token for every model request and retries only that
+    request on rate-limit errors. An agent run makes several model calls (pick a tool, then phrase
+    the answer); each one is paced, and tools never re-run because a later model call hit a 429.
+    """
+
+    llm: Any
+    limiter: Any = None
+    max_retries: int = 5
+
+    @property
+    def _llm_type(self):
+        return f"rate-limited:{getattr(self.llm, '_llm_type', 'chat')}"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.__class__(llm=self.llm.bind_tools(tools, **kwargs), limiter=self.limiter,
+                              max_retries=self.max_retries)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        # No callbacks for the inner call: tracers already see this call through the wrapper.
+        message = call_with_retry(
+            lambda: self.llm.invoke(messages, stop=stop, **kwargs), self.limiter, self.max_retries
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
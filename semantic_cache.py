@@ -0,0 +1,160 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from conversation_memory import is_follow_up
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Tools whose answers depend on who is asking or that have side effects; never cache them.
+BYPASS_TOOLS = frozenset({"check_leave_balance", "create_support_ticket"})
+# Answers are only stored when they came from the policy knowledge base.
+CACHEABLE_TOOLS = frozenset({"lookup_policy"})
+
+PERSONAL_QUERY_PATTERN = re.compile(
+    r"\bEMP[-\s]?\d+\b|\b\d{3,}\b|\bmy (leave|balance|days|vacation|holidays?)\b|\bticket\b",
+    re.IGNORECASE,
+)
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed on the query embedding.
+
+    A lookup hits when the cosine similarity to a stored query reaches `threshold`.
+    Entries expire after `ttl_seconds`, the least recently used entry is evicted past
+    `max_entries`, and everything is dropped when `version_fn()` reports a new index version.
+    """
+
+    def __init__(self, embed_fn, threshold=0.92, max_entries=512, ttl_seconds=3600, version_fn=None):
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version_fn = version_fn
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries = OrderedDict()
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._version = version_fn() if version_fn else None
+        self._stats = {
+            "hits": 0, "misses": 0, "bypasses": 0, "stores": 0,
+            "evictions": 0, "expirations": 0, "invalidations": 0, "saved_seconds": 0.0,
+        }
+
+    def _embed(self, query):
+        vector = np.asarray(self.embed_fn(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_version(self):
+        if self.version_fn is None:
+            return
+        version = self.version_fn()
+        if version != self._version:
+            if self._entries:
+                logger.info(f"Index version changed; dropping {len(self._entries)} cached answers.")
+            self._entries.clear()
+            self._free_slots = list(range(self.max_entries - 1, -1, -1))
+            self._version = version
+            self._stats["invalidations"] += 1
+
+    def _release(self, slot, reason):
+        del self._entries[slot]
+        self._free_slots.append(slot)
+        self._stats[reason] += 1
+
+    def _expire(self, now):
+        expired = [slot for slot, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for slot in expired:
+            self._release(slot, "expirations")
+
+    def lookup(self, query):
+        """
+        Returns the cached answer for a semantically equivalent query, or None.
+        """
+        vector = self._embed(query)
+        with self._lock:
+            self._check_version()
+            self._expire(time.monotonic())
+            if not self._entries:
+                self._stats["misses"] += 1
+                return None
+
+            slots = np.fromiter(self._entries.keys(), dtype=np.int64, count=len(self._entries))
+            similarities = self._vectors[slots] @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            slot = int(slots[best])
+            self._entries.move_to_end(slot)
+            entry = self._entries[slot]
+            self._stats["hits"] += 1
+            self._stats["saved_seconds"] += entry["latency"]
+            logger.info(f"Answer cache hit (similarity={similarities[best]:.3f}) for: {query}")
+            return entry["answer"]
+
+    def store(self, query, answer, latency=0.0):
+        vector = self._embed(query)
+        with self._lock:
+            self._check_version()
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if not self._free_slots:
+                oldest = next(iter(self._entries))
+                self._release(oldest, "evictions")
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = {"query": query, "answer": answer, "latency": latency, "created": time.monotonic()}
+            self._stats["stores"] += 1
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypasses"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+class CachedAgentExecutor:
+    """
+    Wraps an AgentExecutor (built with return_intermediate_steps=True) with a SemanticAnswerCache.
+    Personal or action queries skip the cache, and so do follow-ups that refer back to earlier
+    turns of the conversation (the key is the query alone). Only pure policy answers are stored.
+    """
+
+    def __init__(self, executor, cache):
+        self.executor = executor
+        self.cache = cache
+
+    def invoke(self, inputs, config=None, **kwargs):
+        query = inputs["input"]
+        if PERSONAL_QUERY_PATTERN.search(query) or is_follow_up(query, inputs.get("chat_history")):
+            self.cache.record_bypass()
+            return self.executor.invoke(inputs, config, **kwargs)
+
+        answer = self.cache.lookup(query)
+        if answer is not None:
+            return {**inputs, "output": answer, "cached": True}
+
+        start = time.perf_counter()
+        response = self.executor.invoke(inputs, config, **kwargs)
+        latency = time.perf_counter() - start
+
+        tools_used = {action.tool for action, _ in response.get("intermediate_steps", [])}
+        if tools_used & BYPASS_TOOLS or not tools_used & CACHEABLE_TOOLS:
+            self.cache.record_bypass()
+        else:
+            self.cache.store(query, response["output"], latency)
+        return response
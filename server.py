@@ -0,0 +1,293 @@
+"""
+Asyncio multi-session serving mode for the HR agent.
+
+Protocol: newline-delimited JSON over TCP. Each request line is
+    {"session_id": "...", "message": "..."}            -> {"session_id", "output", "latency_ms"}
+    {"command": "metrics"}                             -> server metrics
+Errors come back as {"error": "..."}; "overloaded" means the request queue is full.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from conversation_memory import ConversationMemory
+from logger import setup_logger
+from ticket_store import current_session
+from tracing import llm_tracer, new_trace, span, stage_summary
+
+load_dotenv()
+logger = setup_logger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("SERVER_MAX_CONCURRENCY", "8"))
+DEFAULT_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "100"))
+DEFAULT_REQUEST_TIMEOUT = float(os.getenv("SERVER_REQUEST_TIMEOUT", "30"))
+DEFAULT_BLOCKING_WORKERS = int(os.getenv("SERVER_BLOCKING_WORKERS", "16"))
+SESSION_IDLE_TTL = float(os.getenv("SERVER_SESSION_IDLE_TTL", "1800"))
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Session:
+    def __init__(self, memory):
+        self.memory = memory
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+
+class AgentServer:
+    """
+    Serves many chat sessions from one process with one shared agent.
+
+    Requests enter a bounded queue (full queue = immediate "overloaded" reply, i.e. backpressure)
+    and are processed by `max_concurrency` workers, which bounds concurrent LLM traffic. Turns of
+    the same session run one at a time so its history stays ordered. Blocking work (BM25,
+    sentence-transformers, SQLite tools, memory compaction) runs on a bounded thread pool set as
+    the loop's default executor, so it never stalls the event loop.
+    """
+
+    def __init__(self, agent, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_queue=DEFAULT_MAX_QUEUE,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT, blocking_workers=DEFAULT_BLOCKING_WORKERS,
+                 memory_factory=ConversationMemory):
+        self.agent = agent
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.request_timeout = request_timeout
+        self.blocking_workers = blocking_workers
+        self.memory_factory = memory_factory
+        self.sessions = {}
+        self._queue = None
+        self._workers = []
+        self._server = None
+        self._executor = None
+        self._clients = set()
+        self.metrics = {
+            "accepted": 0, "completed": 0, "rejected": 0, "timeouts": 0, "errors": 0,
+            "in_flight": 0, "max_queue_depth": 0,
+        }
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(max_workers=self.blocking_workers, thread_name_prefix="blocking")
+        loop.set_default_executor(self._executor)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        logger.info(
+            f"Agent server started: concurrency={self.max_concurrency}, queue={self.max_queue}, "
+            f"timeout={self.request_timeout}s, blocking_workers={self.blocking_workers}"
+        )
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._clients):
+                writer.close()
+            await self._server.wait_closed()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    async def submit(self, session_id, message):
+        """
+        Queues one chat turn and waits for the answer. Raises Overloaded when the queue is full.
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((session_id, message, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.metrics["rejected"] += 1
+            raise Overloaded("overloaded")
+        self.metrics["accepted"] += 1
+        self.metrics["max_queue_depth"] = max(self.metrics["max_queue_depth"], self._queue.qsize())
+        return await future
+
+    def _session(self, session_id):
+        now = time.monotonic()
+        if session_id not in self.sessions:
+            idle = [sid for sid, s in self.sessions.items() if now - s.last_used > SESSION_IDLE_TTL and not s.lock.locked()]
+            for sid in idle:
+                del self.sessions[sid]
+            self.sessions[session_id] = Session(self.memory_factory())
+        session = self.sessions[session_id]
+        session.last_used = now
+        return session
+
+    async def _worker(self):
+        while True:
+            session_id, message, future, enqueued_at = await self._queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                queue_wait = time.perf_counter() - enqueued_at
+                self.metrics["in_flight"] += 1
+                try:
+                    # The deadline runs from submit(), so time spent queued counts against it.
+                    remaining = self.request_timeout - queue_wait
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    result = await asyncio.wait_for(self._handle(session_id, message), remaining)
+                    result["queue_wait_ms"] = queue_wait * 1000.0
+                    self.metrics["completed"] += 1
+                    if not future.done():
+                        future.set_result(result)
+                except asyncio.TimeoutError:
+                    self.metrics["timeouts"] += 1
+                    if not future.done():
+                        future.set_exception(TimeoutError(f"request timed out after {self.request_timeout}s"))
+                except Exception as e:
+                    self.metrics["errors"] += 1
+                    logger.error(f"Request failed for session {session_id}: {e}", exc_info=True)
+                    if not future.done():
+                        future.set_exception(e)
+                finally:
+                    self.metrics["in_flight"] -= 1
+            finally:
+                self._queue.task_done()
+
+    async def _handle(self, session_id, message):
+        session = self._session(session_id)
+        async with session.lock:
+            current_session.set(session_id)
+            start = time.perf_counter()
+            with new_trace() as trace_id, span("server.request", session_id=session_id):
+                response = await self.agent.ainvoke(
+                    {"input": message, "chat_history": session.memory.messages()},
+                    {"callbacks": [llm_tracer]},
+                )
+                output_text = response["output"]
+                # Compaction may call the summarizer LLM synchronously.
+                await asyncio.get_running_loop().run_in_executor(None, session.memory.add_turn, message, output_text)
+            return {
+                "session_id": session_id,
+                "trace_id": trace_id,
+                "output": output_text,
+                "latency_ms": (time.perf_counter() - start) * 1000.0,
+            }
+
+    def snapshot_metrics(self):
+        metrics = dict(self.metrics)
+        metrics["pid"] = os.getpid()
+        metrics["queue_depth"] = self._queue.qsize() if self._queue else 0
+        metrics["sessions"] = len(self.sessions)
+        metrics["stages"] = stage_summary()
+        from agent_tool import faq_stats
+
+        metrics["faq"] = faq_stats()
+        return metrics
+
+    async def _on_client(self, reader, writer):
+        self._clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if request.get("command") == "metrics":
+                        reply = self.snapshot_metrics()
+                    else:
+                        reply = await self.submit(str(request["session_id"]), str(request["message"]))
+                except Overloaded:
+                    reply = {"error": "overloaded"}
+                except Exception as e:
+                    reply = {"error": f"{type(e).__name__}: {e}"}
+                writer.write((json.dumps(reply, default=str) + "\n").encode("utf-8"))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765, sock=None):
+        """
+        Starts the workers and the TCP listener. Pass `sock` to serve an already bound socket.
+        """
+        await self.start()
+        if sock is not None:
+            self._server = await asyncio.start_server(self._on_client, sock=sock)
+        else:
+            self._server = await asyncio.start_server(self._on_client, host, port)
+        logger.info(f"Listening on {', '.join(str(s.getsockname()) for s in self._server.sockets)}")
+        return self._server
+
+
+async def send_chat(reader, writer, payload):
+    """
+    Client helper: sends one request line and returns the decoded reply.
+    """
+    writer.write((json.dumps(payload) + "\n").encode("utf-8"))
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+def build_agent(offline=False, llm_latency=0.5, router=None):
+    """
+    Returns (agent executor, memory factory). Both share one LLM client; the retriever and
+    embedding model are process-wide singletons in agent_tool. `router` defaults to INTENT_ROUTER.
+    """
+    from agent_tool import build_intent_router, build_llm, run_agent_with_refine_prompt
+
+    if offline:
+        from fake_llm import FakeChatModel
+
+        llm = FakeChatModel(latency=llm_latency)
+    else:
+        llm = build_llm()
+
+    def memory_factory():
+        return ConversationMemory(
+            token_budget=int(os.getenv("MEMORY_TOKEN_BUDGET", "1500")),
+            keep_recent_turns=int(os.getenv("MEMORY_RECENT_TURNS", "3")),
+            summarizer_llm=llm,
+        )
+
+    agent = run_agent_with_refine_prompt(llm=llm)
+    if router is None:
+        router = os.getenv("INTENT_ROUTER", "0") == "1"
+    if router:
+        agent = build_intent_router(agent, llm)
+    return agent, memory_factory
+
+
+async def main(args):
+    if not args.no_warm_up:
+        from agent_tool import warm_up
+
+        warm_up()
+    agent, memory_factory = build_agent(offline=args.offline)
+    server = AgentServer(
+        agent,
+        memory_factory=memory_factory,
+        max_concurrency=args.max_concurrency,
+        max_queue=args.max_queue,
+        request_timeout=args.timeout,
+    )
+    tcp_server = await server.serve(args.host, args.port)
+    print(f"Agent server listening on {args.host}:{args.port}")
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the HR agent to many concurrent sessions.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_REQUEST_TIMEOUT)
+    parser.add_argument("--offline", action="store_true", help="Use a fake LLM (for local load tests).")
+    parser.add_argument("--no-warm-up", action="store_true", help="Skip retriever warm-up before listening.")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
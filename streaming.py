@@ -0,0 +1,77 @@
+import sys
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TOOL_PROGRESS = {
+    "lookup_policy": "searching policies…",
+    "check_leave_balance": "checking leave balance…",
+    "create_support_ticket": "creating support ticket…",
+}
+
+
+class StreamingConsoleHandler(BaseCallbackHandler):
+    """
+    Prints LLM tokens as they arrive plus a progress line for every tool call,
+    and records time-to-first-token and total latency for the current turn.
+    """
+
+    def __init__(self, write=None, prefix="Agent: "):
+        self.write = write or self._stdout_write
+        self.prefix = prefix
+        self.start_turn()
+
+    @staticmethod
+    def _stdout_write(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def start_turn(self):
+        self.turn_start = time.perf_counter()
+        self.first_token_at = None
+        self.end_at = None
+        self.streamed = []
+
+    def on_llm_new_token(self, token, **kwargs):
+        if not token:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            self.write(self.prefix)
+        self.streamed.append(token)
+        self.write(token)
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name", "tool")
+        if self.streamed:
+            self.write("\n")
+        self.write(f"[{TOOL_PROGRESS.get(name, f'running {name}…')}]\n")
+
+    def finish_turn(self, output_text):
+        """
+        Completes the turn: prints the answer if nothing was streamed (e.g. a cache hit),
+        logs the timings and returns (ttft_seconds, total_seconds).
+        """
+        self.end_at = time.perf_counter()
+        if self.first_token_at is None:
+            self.first_token_at = self.end_at
+            self.write(f"{self.prefix}{output_text}")
+        self.write("\n")
+
+        ttft = self.first_token_at - self.turn_start
+        total = self.end_at - self.turn_start
+        logger.info(f"Turn latency: time_to_first_token={ttft:.3f}s, total={total:.3f}s")
+        return ttft, total
+
+
+def stream_agent_turn(bot, inputs, handler, callbacks=None):
+    """
+    Runs one agent turn with token streaming to the handler. Returns the agent response dict.
+    Extra callbacks (e.g. the LLM tracer) are attached alongside the handler.
+    """
+    handler.start_turn()
+    response = bot.invoke(inputs, {"callbacks": [handler, *(callbacks or [])]})
+    handler.finish_turn(response["output"])
+    return response
@@ -0,0 +1,30 @@
+from langchain_core.documents import Document
+from chunking import merge_hits
+
+
+def _hit(text, chunk_id, start, page=None, source="policy.pdf"):
+    metadata = {"source": source, "chunk_id": chunk_id, "start_index": start, "end_index": start + len(text)}
+    if page is not None:
+        metadata["page"] = page
+    return Document(page_content=text, metadata=metadata)
+
+
+def test_hits_on_different_pages_are_not_merged():
+    page_one = _hit("Annual leave is 25 days and must be approved by your line manager.", "p1", 0, page=0)
+    page_two = _hit("Escalations follow the grievance procedure.", "p2", 0, page=1)
+
+    blocks = merge_hits([page_one, page_two])
+
+    assert [b.page_content for b in blocks] == [page_one.page_content, page_two.page_content]
+
+
+def test_adjacent_hits_on_the_same_page_are_merged():
+    text = "Core hours are 11:00 to 15:00. Remote work is allowed up to 30 days a year."
+    first = _hit(text[:31], "c1", 0, page=2)
+    second = _hit(text[31:], "c2", 31, page=2)
+
+    blocks = merge_hits([second, first])
+
+    assert len(blocks) == 1
+    assert blocks[0].page_content == text
+    assert blocks[0].metadata["merged_chunks"] == 2
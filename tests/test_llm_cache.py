@@ -0,0 +1,31 @@
+from langchain_core.messages import AIMessage
+from fake_llm import FakeChatModel
+from llm_cache import LLMCallStore, RecordReplayChatModel
+
+
+def _pair(tmp_path, responses):
+    store = LLMCallStore(str(tmp_path / "llm_cache.db"))
+    recorder = RecordReplayChatModel(llm=FakeChatModel(responses=responses), store=store, mode="record")
+    replayer = RecordReplayChatModel(llm=None, store=store, mode="replay")
+    return recorder, replayer
+
+
+def test_call_options_may_repeat_bound_options(tmp_path):
+    recorder, replayer = _pair(tmp_path, ["bound", "overridden"])
+
+    assert recorder.bind_tools([], tool_choice="auto").invoke("hi").content == "bound"
+    assert recorder.bind_tools([], tool_choice="auto").invoke("hi", tool_choice="any").content == "overridden"
+    assert replayer.bind_tools([], tool_choice="auto").invoke("hi", tool_choice="any").content == "overridden"
+
+
+def test_recorded_stream_replays_as_one_chunk(tmp_path):
+    call = {"name": "lookup_policy", "args": {"query": "leave"}, "id": "call-1"}
+    recorder, replayer = _pair(tmp_path, ["Annual leave is 25 days.", AIMessage(content="", tool_calls=[call])])
+
+    assert [c.content for c in recorder.stream("leave?")] == ["Annual ", "leave ", "is ", "25 ", "days."]
+    recorder.invoke("tool please")
+
+    assert [c.content for c in replayer.stream("leave?")] == ["Annual leave is 25 days."]
+    (chunk,) = list(replayer.stream("tool please"))
+    assert chunk.tool_calls[0]["name"] == "lookup_policy"
+    assert chunk.tool_calls[0]["args"] == {"query": "leave"}
@@ -0,0 +1,104 @@
+import time
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import tool
+from fake_llm import FakeChatModel
+from rate_limiter import RateLimitedChatModel, TokenBucket
+
+try:
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+except ImportError:
+    from langchain_classic.agents import AgentExecutor, create_tool_calling_agent
+
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self, tokens=1):
+        self.acquired += tokens
+        return 0.0
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr("rate_limiter.random.uniform", lambda a, b: 0.0)
+
+
+def test_token_bucket_paces_requests_after_the_burst():
+    bucket = TokenBucket(rate=20, capacity=1)
+
+    start = time.monotonic()
+    waits = [bucket.acquire() for _ in range(5)]
+    elapsed = time.monotonic() - start
+
+    assert waits[0] == 0.0
+    assert all(w > 0 for w in waits[1:])
+    assert elapsed >= 4 / 20 * 0.9
+
+
+def test_token_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(rate=0)
+
+
+def test_rate_limit_error_retries_only_the_failed_request(no_backoff):
+    calls = []
+
+    def responder(messages):
+        calls.append(messages)
+        if len(calls) == 1:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        return "ok"
+
+    limiter = CountingLimiter()
+    model = RateLimitedChatModel(llm=FakeChatModel(responder=responder), limiter=limiter, max_retries=2)
+
+    assert model.invoke("hello").content == "ok"
+    assert len(calls) == 2
+    assert limiter.acquired == 2
+
+
+def test_other_errors_are_not_retried(no_backoff):
+    calls = []
+
+    def responder(messages):
+        calls.append(messages)
+        raise ValueError("bad request")
+
+    model = RateLimitedChatModel(llm=FakeChatModel(responder=responder), limiter=CountingLimiter())
+
+    with pytest.raises(ValueError):
+        model.invoke("hello")
+    assert len(calls) == 1
+
+
+def test_agent_run_takes_one_token_per_llm_call():
+    tool_runs = []
+
+    @tool
+    def lookup_policy(query: str) -> str:
+        """Looks up an HR policy."""
+        tool_runs.append(query)
+        return "Annual leave is 25 days."
+
+    replies = [
+        AIMessage(content="", tool_calls=[{"name": "lookup_policy", "args": {"query": "leave"}, "id": "call-1"}]),
+        AIMessage(content="", tool_calls=[{"name": "lookup_policy", "args": {"query": "carry over"}, "id": "call-2"}]),
+        AIMessage(content="You get 25 days."),
+    ]
+    limiter = CountingLimiter()
+    llm = RateLimitedChatModel(llm=FakeChatModel(responses=replies), limiter=limiter)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful HR Assistant."),
+        ("human", "{input}"),
+        ("placeholder", "{agent_scratchpad}"),
+    ])
+    executor = AgentExecutor(agent=create_tool_calling_agent(llm, [lookup_policy], prompt), tools=[lookup_policy])
+
+    result = executor.invoke({"input": "How much leave do I get?"})
+
+    assert result["output"] == "You get 25 days."
+    assert tool_runs == ["leave", "carry over"]
+    assert limiter.acquired == len(replies)
@@ -0,0 +1,140 @@
+import math
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from hybrid_retriever import FusedHybridRetriever, fuse_rankings
+from keyword_index import (
+    BM25_B,
+    BM25_EPSILON,
+    BM25_K1,
+    PersistedBM25Retriever,
+    build_keyword_index,
+    load_keyword_index,
+    save_keyword_index,
+)
+
+CORPUS = [
+    "annual leave is 25 days per year",
+    "remote work is allowed up to 30 days per year",
+    "laptop issues go to IT support",
+    "sick leave needs a doctor note after 3 days",
+]
+
+
+def _doc(chunk_id, text=None):
+    return Document(page_content=text or f"text of {chunk_id}", metadata={"chunk_id": chunk_id})
+
+
+def _chunks():
+    return [Document(page_content=text, metadata={"chunk_id": f"c{i}", "source": "kb.md"}) for i, text in enumerate(CORPUS)]
+
+
+def _reference_bm25(corpus, query):
+    docs = [text.split() for text in corpus]
+    avgdl = sum(len(d) for d in docs) / len(docs)
+    vocab = {token for d in docs for token in d}
+    idf = {}
+    for token in vocab:
+        df = sum(token in d for d in docs)
+        idf[token] = math.log(len(docs) - df + 0.5) - math.log(df + 0.5)
+    floor = BM25_EPSILON * sum(idf.values()) / len(idf)
+    idf = {token: (floor if value < 0 else value) for token, value in idf.items()}
+
+    scores = []
+    for d in docs:
+        score = 0.0
+        for token in query.split():
+            tf = d.count(token)
+            if tf:
+                score += idf[token] * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * len(d) / avgdl))
+        scores.append(score)
+    return scores
+
+
+def test_rrf_orders_by_summed_reciprocal_ranks():
+    keyword = [(_doc("a"), 3.0), (_doc("b"), 2.0), (_doc("c"), 1.0)]
+    vector = [(_doc("b"), 0.9), (_doc("c"), 0.8)]
+
+    docs, fused, ranks, _ = fuse_rankings([keyword, vector], [0.5, 0.5], rrf_c=60)
+
+    assert [d.metadata["chunk_id"] for d in docs] == ["b", "c", "a"]
+    assert fused[0] == pytest.approx(0.5 / 62 + 0.5 / 61)
+    assert fused[2] == pytest.approx(0.5 / 61)
+    assert ranks.tolist() == [[2, 3, 1], [1, 2, 0]]
+
+
+def test_rrf_ties_keep_first_seen_order():
+    keyword = [(_doc("a"), 1.0), (_doc("b"), 0.5)]
+    vector = [(_doc("b"), 0.9), (_doc("a"), 0.1)]
+
+    docs, fused, _, _ = fuse_rankings([keyword, vector], [0.5, 0.5])
+
+    assert fused[0] == pytest.approx(fused[1])
+    assert [d.metadata["chunk_id"] for d in docs] == ["a", "b"]
+
+
+def test_fusion_dedupes_by_chunk_id():
+    keyword = [(_doc("a", "short text"), 2.0), (_doc("a", "short text"), 1.0)]
+    vector = [(_doc("a", "short text"), 0.7), (_doc("b"), 0.6)]
+
+    docs, fused, ranks, scores = fuse_rankings([keyword, vector], [0.5, 0.5])
+
+    assert [d.metadata["chunk_id"] for d in docs] == ["a", "b"]
+    assert ranks[:, 0].tolist() == [1, 1]
+    assert scores[0, 0] == 2.0
+
+
+def test_fusion_of_empty_legs():
+    docs, fused, _, _ = fuse_rankings([[], []], [0.5, 0.5])
+
+    assert docs == [] and len(fused) == 0
+
+
+@pytest.mark.parametrize("query", ["leave days", "remote work per year", "laptop", "days days is"])
+def test_keyword_index_matches_hand_computed_bm25(query):
+    index = build_keyword_index(_chunks())
+
+    np.testing.assert_allclose(index.get_scores(query), _reference_bm25(CORPUS, query), rtol=1e-5)
+
+
+def test_saved_keyword_index_round_trips(tmp_path):
+    index = build_keyword_index(_chunks(), fingerprint="kb-v1")
+    path = str(tmp_path / "keyword_index")
+    save_keyword_index(index, path)
+
+    loaded = load_keyword_index(path, expected_fingerprint="kb-v1")
+
+    assert loaded is not None and len(loaded) == len(CORPUS)
+    assert loaded.search("sick leave", 2) == index.search("sick leave", 2)
+    assert loaded.document(3).page_content == CORPUS[3]
+    assert loaded.document(3).metadata == {"chunk_id": "c3", "source": "kb.md"}
+
+
+def test_stale_keyword_index_is_rejected(tmp_path):
+    path = str(tmp_path / "keyword_index")
+    save_keyword_index(build_keyword_index(_chunks(), fingerprint="kb-v1"), path)
+
+    assert load_keyword_index(path, expected_fingerprint="kb-v2") is None
+
+
+class _StaticVectorStore:
+    def __init__(self, hits):
+        self.hits = hits
+
+    def similarity_search_with_relevance_scores(self, query, k=4):
+        return self.hits[:k]
+
+
+def test_hybrid_search_returns_its_own_timings():
+    chunks = _chunks()
+    retriever = FusedHybridRetriever(
+        keyword_retriever=PersistedBM25Retriever(index=build_keyword_index(chunks)),
+        vector_store=_StaticVectorStore([(chunks[3], 0.9), (chunks[0], 0.8)]),
+        k=2,
+    )
+
+    results, timings = retriever.search_with_timings("sick leave")
+
+    assert results[0][0].metadata["chunk_id"] == "c3"
+    assert set(timings) == {"keyword", "vector", "fusion", "total"}
+    assert [d for d, _ in retriever.search_with_scores("sick leave")] == [d for d, _ in results]
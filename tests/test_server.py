@@ -0,0 +1,90 @@
+import asyncio
+import time
+import pytest
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from conversation_memory import ConversationMemory
+from fake_llm import FakeChatModel
+
+pytest.importorskip("dotenv")
+from server import AgentServer, Overloaded
+
+try:
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+except ImportError:
+    from langchain_classic.agents import AgentExecutor, create_tool_calling_agent
+
+
+def _agent(latency=0.0):
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", "You are a helpful HR Assistant."),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", "{input}"),
+        ("placeholder", "{agent_scratchpad}"),
+    ])
+    llm = FakeChatModel(latency=latency)
+    return AgentExecutor(agent=create_tool_calling_agent(llm, [], prompt), tools=[])
+
+
+def _run(server, scenario):
+    async def main():
+        await server.start()
+        try:
+            return await scenario()
+        finally:
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+def test_request_is_answered_by_the_fake_llm():
+    server = AgentServer(_agent(), max_concurrency=2, memory_factory=ConversationMemory)
+
+    result = _run(server, lambda: server.submit("s1", "How many leave days do I get?"))
+
+    assert result["output"] == "This is an offline answer to: How many leave days do I get?"
+    assert result["session_id"] == "s1" and result["queue_wait_ms"] >= 0
+    assert server.metrics["completed"] == 1
+    assert len(server.sessions["s1"].memory.turns) == 1
+
+
+def test_full_queue_rejects_with_overloaded():
+    server = AgentServer(_agent(latency=0.2), max_concurrency=1, max_queue=1, memory_factory=ConversationMemory)
+
+    async def scenario():
+        return await asyncio.gather(*(server.submit(f"s{i}", "hi") for i in range(3)), return_exceptions=True)
+
+    results = _run(server, scenario)
+
+    assert any(isinstance(r, Overloaded) for r in results)
+    assert any(isinstance(r, dict) for r in results)
+    assert server.metrics["rejected"] == sum(isinstance(r, Overloaded) for r in results)
+
+
+def test_queue_wait_counts_against_the_timeout():
+    # One worker and a 0.35s LLM: the second request waits ~0.35s in the queue, so it cannot
+    # finish within its 0.5s budget even though its own run would take only 0.35s.
+    server = AgentServer(_agent(latency=0.35), max_concurrency=1, request_timeout=0.5, memory_factory=ConversationMemory)
+
+    async def scenario():
+        return await asyncio.gather(server.submit("s1", "first"), server.submit("s2", "second"), return_exceptions=True)
+
+    first, second = _run(server, scenario)
+
+    assert first["output"].endswith("first")
+    assert isinstance(second, TimeoutError)
+    assert server.metrics["timeouts"] == 1
+
+
+def test_request_that_expired_in_the_queue_is_not_started():
+    server = AgentServer(_agent(), max_concurrency=1, request_timeout=0.5, memory_factory=ConversationMemory)
+
+    async def scenario():
+        future = asyncio.get_running_loop().create_future()
+        # Queued a second ago, past its 0.5s deadline by the time a worker picks it up.
+        server._queue.put_nowait(("s1", "late", future, time.perf_counter() - 1.0))
+        return await asyncio.gather(future, return_exceptions=True)
+
+    (result,) = _run(server, scenario)
+
+    assert isinstance(result, TimeoutError)
+    assert "s1" not in server.sessions
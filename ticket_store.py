@@ -0,0 +1,173 @@
+import contextvars
+import hashlib
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+TICKET_DB_PATH = os.getenv("TICKET_DB_PATH", "./data/tickets.db")
+IDEMPOTENCY_WINDOW_SECONDS = float(os.getenv("TICKET_IDEMPOTENCY_WINDOW_SECONDS", "600"))
+
+# Conversation/session the current request belongs to; set by the chat loop or server.
+current_session = contextvars.ContextVar("current_session", default="default")
+
+_STOP = object()
+
+
+def normalize_description(description):
+    """
+    Lower-cases, drops punctuation and collapses whitespace so retries with cosmetic
+    differences map to the same idempotency key.
+    """
+    text = re.sub(r"[^\w\s]", " ", description.lower())
+    return " ".join(text.split())
+
+
+def idempotency_key(session_id, description):
+    return hashlib.sha256(f"{session_id}\0{normalize_description(description)}".encode("utf-8")).hexdigest()
+
+
+def format_ticket_id(number):
+    return f"INC-{number:06d}"
+
+
+class TicketStore:
+    """
+    Durable SQLite ticket store with group commit.
+
+    Callers enqueue requests and wait on a future; a single writer thread drains the queue
+    and commits each batch in one transaction, so a burst of tickets costs one fsync per batch
+    rather than per ticket. Ids come from an AUTOINCREMENT key, so they are monotonic and never
+    reused. A request with the same (session, normalized description) as a ticket created within
+    the idempotency window returns that ticket instead of creating a duplicate.
+    """
+
+    def __init__(self, path=TICKET_DB_PATH, window_seconds=IDEMPOTENCY_WINDOW_SECONDS,
+                 max_batch=256, max_wait=0.002):
+        self.path = path
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.stats = {"created": 0, "deduplicated": 0, "commits": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Opened here so a bad path or permission error is raised to the caller instead of killing
+        # the writer thread; from then on only the writer thread uses the connection.
+        conn = self._open()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, args=(conn,), name="ticket-writer", daemon=True)
+        self._writer.start()
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tickets ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "idempotency_key TEXT NOT NULL, "
+            "session_id TEXT NOT NULL, "
+            "description TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_key_time ON tickets (idempotency_key, created_at)")
+        conn.commit()
+        return conn
+
+    def create_ticket(self, description, session_id=None, timeout=10.0):
+        """
+        Returns (ticket_id, created). created is False when an existing ticket was reused.
+        """
+        session_id = session_id or current_session.get()
+        future = Future()
+        self._queue.put((session_id, description, idempotency_key(session_id, description), future))
+        return future.result(timeout=timeout)
+
+    def _drain(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                timeout = max(0.0, deadline - time.monotonic())
+                item = self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _commit_batch(self, conn, batch):
+        now = time.time()
+        cutoff = now - self.window_seconds
+        seen = {}
+        results = []
+        with conn:
+            for session_id, description, key, future in batch:
+                if key in seen:
+                    results.append((future, (seen[key], False)))
+                    continue
+                row = conn.execute(
+                    "SELECT id FROM tickets WHERE idempotency_key = ? AND created_at >= ? ORDER BY id DESC LIMIT 1",
+                    (key, cutoff),
+                ).fetchone()
+                if row:
+                    seen[key] = format_ticket_id(row[0])
+                    results.append((future, (seen[key], False)))
+                    continue
+                cursor = conn.execute(
+                    "INSERT INTO tickets (idempotency_key, session_id, description, created_at) VALUES (?, ?, ?, ?)",
+                    (key, session_id, description, now),
+                )
+                seen[key] = format_ticket_id(cursor.lastrowid)
+                results.append((future, (seen[key], True)))
+        self.stats["commits"] += 1
+        return results
+
+    def _writer_loop(self, conn):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = self._drain(item)
+            try:
+                results = self._commit_batch(conn, batch)
+            except Exception as e:
+                logger.error(f"Ticket batch of {len(batch)} failed: {e}", exc_info=True)
+                for *_, future in batch:
+                    future.set_exception(e)
+                continue
+            # Futures resolve only after the commit, so callers never see an undurable ticket.
+            for future, result in results:
+                self.stats["created" if result[1] else "deduplicated"] += 1
+                future.set_result(result)
+        conn.close()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._writer.join()
+
+
+_store = None
+_store_pid = None
+_store_lock = threading.Lock()
+
+
+def get_ticket_store():
+    """
+    Process-wide TicketStore, recreated after a fork because the writer thread is not inherited.
+    """
+    global _store, _store_pid
+    if _store is None or _store_pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store_pid != os.getpid():
+                _store = TicketStore()
+                _store_pid = os.getpid()
+    return _store
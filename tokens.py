@@ -0,0 +1,23 @@
+_encoder = None
+
+
+def count_tokens(text):
+    """
+    Token count with tiktoken's cl100k_base when available, otherwise a 4-chars-per-token estimate.
+    """
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(messages):
+    # ~4 tokens of per-message framing, as in OpenAI's accounting.
+    return sum(count_tokens(str(m.content)) + 4 for m in messages)
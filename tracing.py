@@ -0,0 +1,212 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from logger import LOG_DIR, setup_line_logger, setup_logger
+
+logger = setup_logger(__name__)
+
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(LOG_DIR, "traces.jsonl"))
+# Percentiles are computed over the most recent spans per stage.
+TRACE_STAGE_WINDOW = int(os.getenv("TRACE_STAGE_WINDOW", "1000"))
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_span_id = contextvars.ContextVar("span_id", default=None)
+
+
+class SpanRecorder:
+    """
+    Collects finished spans: hands each one as a JSON line to the trace file's queue listener
+    (rotated like the application log) and keeps the most recent per-stage durations in memory
+    for percentile summaries.
+    """
+
+    def __init__(self, path=TRACE_FILE, window=TRACE_STAGE_WINDOW):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._durations = {}
+        self._counts = {}
+        self._trace_logger = None
+
+    def record(self, span):
+        with self._lock:
+            name = span["name"]
+            self._durations.setdefault(name, deque(maxlen=self.window)).append(span["duration_ms"])
+            self._counts[name] = self._counts.get(name, 0) + 1
+            if not self.path:
+                return
+            if self._trace_logger is None:
+                try:
+                    self._trace_logger = setup_line_logger(self.path)
+                except OSError as e:
+                    logger.warning(f"Could not export spans to {self.path}: {e}")
+                    self.path = None
+                    return
+        self._trace_logger.info(json.dumps(span, default=str))
+
+    def summary(self):
+        """
+        Returns {stage: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}; count is every span
+        seen, the other figures cover the last `window` spans of the stage.
+        """
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+            counts = dict(self._counts)
+        return {
+            name: {
+                "count": counts[name],
+                "mean_ms": sum(values) / len(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "max_ms": values[-1],
+            }
+            for name, values in durations.items()
+        }
+
+    def reset(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+recorder = SpanRecorder()
+
+
+def _reset_recorder_lock():
+    # A span may have been recording on another thread when the process forked.
+    recorder._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_recorder_lock)
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def new_trace(trace_id=None):
+    """
+    Starts a request-level trace; spans opened inside it share the trace id.
+    """
+    token = _trace_id.set(trace_id or uuid.uuid4().hex[:16])
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+def _finish(name, trace_id, span_id, parent_id, started_at, duration, status, attributes):
+    recorder.record({
+        "trace_id": trace_id,
+        "span_id": span_id,
+        "parent_id": parent_id,
+        "name": name,
+        "start": started_at,
+        "duration_ms": duration * 1000.0,
+        "status": status,
+        "attributes": attributes,
+    })
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Times a block as a span of the current trace. Yields the attribute dict so callers can
+    add details. Exceptions are recorded as status=error and re-raised.
+    """
+    trace_id = _trace_id.get() or uuid.uuid4().hex[:16]
+    parent_id = _span_id.get()
+    span_id = uuid.uuid4().hex[:8]
+    token = _span_id.set(span_id)
+    started_at = time.time()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException as e:
+        status = "error"
+        attributes["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _span_id.reset(token)
+        _finish(name, trace_id, span_id, parent_id, started_at, time.perf_counter() - start, status, attributes)
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """
+    Records every LLM / chat model invocation as an "llm.<model>" span of the active trace.
+    Pass it in the invoke config: {"callbacks": [llm_tracer]}.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+
+    def _start(self, serialized, run_id, kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (serialized or {}).get("name") or "unknown"
+        with self._lock:
+            self._runs[run_id] = (
+                f"llm.{model}", _trace_id.get() or uuid.uuid4().hex[:16], _span_id.get(), time.time(), time.perf_counter()
+            )
+
+    def _end(self, run_id, status, attributes):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        name, trace_id, parent_id, started_at, start = run
+        _finish(name, trace_id, uuid.uuid4().hex[:8], parent_id, started_at, time.perf_counter() - start, status, attributes)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(serialized, run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        attributes = {}
+        usage = (response.llm_output or {}).get("usage_metadata") or (response.llm_output or {}).get("token_usage")
+        if usage:
+            attributes["usage"] = usage
+        self._end(run_id, "ok", attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, "error", {"error": f"{type(error).__name__}: {error}"})
+
+
+llm_tracer = TracingCallbackHandler()
+
+
+def stage_summary():
+    return recorder.summary()
+
+
+def log_stage_summary():
+    for name, stats in sorted(stage_summary().items()):
+        logger.info(
+            f"Stage {name}: n={stats['count']} p50={stats['p50_ms']:.1f}ms "
+            f"p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms"
+        )